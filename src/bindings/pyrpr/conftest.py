@@ -3,9 +3,9 @@
 # Licensed under the Apache License, Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
 # You may obtain a copy of the License at
-# 
+#
 #     http://www.apache.org/licenses/LICENSE-2.0
-# 
+#
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
@@ -14,10 +14,140 @@
 #********************************************************************
 """
 configuration for pytest-based tests
-""" 
+
+Addon modules are tested without Blender and RPR libraries: fixture addon installs stub
+bindings (pyrpr, pyrpr2, pyhybrid, pyhybridpro) and bpy if it isn't available, then addon
+modules are imported from src/rprblender without running addon registration.
+"""
+import importlib
+import importlib.util
+import itertools
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+
+ADDON_DIR = Path(__file__).parents[2] / 'rprblender'
+
+_constant_values = itertools.count(1)
+
 
 def pytest_addoption(parser):
     parser.addoption("--enable-cpu", action='store_true')
     parser.addoption("--enable-gpu", nargs='*', choices=range(8), type=int)
     parser.addoption("--pyrpr-log", action='store_true')
 
+
+class StubObject:
+    """ Object of stub bindings, its methods do nothing """
+
+    def __init__(self, *args, **kwargs):
+        self.args = args
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        return lambda *args, **kwargs: None
+
+
+class StubModule(types.ModuleType):
+    """
+    Module of stub bindings: CONSTANTS are unique ints, Classes are subclasses of StubObject,
+    functions do nothing. Attributes are created on first access
+    """
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+
+        if name.isupper():
+            value = next(_constant_values)
+        elif name[0].isupper():
+            value = type(name, (StubObject,), {'__module__': self.__name__})
+        else:
+            value = lambda *args, **kwargs: None
+
+        setattr(self, name, value)
+        return value
+
+
+class Mesh(StubObject):
+    pass
+
+
+class Instance(StubObject):
+    def __init__(self, context, mesh):
+        super().__init__(context, mesh)
+        self.mesh = mesh
+
+
+class MaterialNode(StubObject):
+    # number of created nodes
+    created_count = 0
+
+    def __init__(self, material_system, material_type):
+        super().__init__(material_system, material_type)
+        self.type = material_type
+        self.inputs = {}
+        MaterialNode.created_count += 1
+
+    def set_input(self, name, value):
+        self.inputs[name] = value
+
+
+def create_stub_pyrpr(name='pyrpr'):
+    module = StubModule(name)
+    module.Mesh = Mesh
+    module.Instance = Instance
+    module.MaterialNode = MaterialNode
+    return module
+
+
+def create_stub_bpy():
+    bpy = StubModule('bpy')
+    bpy.app = types.SimpleNamespace(version=(2, 93, 0), version_string="2.93.0")
+    bpy.types = StubModule('bpy.types')
+    bpy.utils = StubModule('bpy.utils')
+    bpy.props = StubModule('bpy.props')
+    return bpy
+
+
+def create_addon_package(name, path, **attrs):
+    """ Creates package module from addon directory without running its __init__.py """
+    package = types.ModuleType(name)
+    package.__path__ = [str(path)]
+    package.__file__ = str(path / '__init__.py')
+    package.__dict__.update(attrs)
+    return package
+
+
+@pytest.fixture(scope='session')
+def addon(tmp_path_factory):
+    """ Returns function which imports addon module by name, for example addon('engine.context') """
+    modules = {
+        'pyrpr': create_stub_pyrpr(),
+        'pyrpr2': StubModule('pyrpr2'),
+        'pyhybrid': StubModule('pyhybrid'),
+        'pyhybridpro': StubModule('pyhybridpro'),
+    }
+    if importlib.util.find_spec('bpy') is None:
+        modules['bpy'] = create_stub_bpy()
+
+    # log file and caches are written to temporary dir instead of addon dir
+    root_dir = tmp_path_factory.mktemp('rprblender')
+    modules['rprblender'] = create_addon_package('rprblender', ADDON_DIR,
+                                                 __file__=str(root_dir / '__init__.py'))
+    modules['rprblender.engine'] = create_addon_package('rprblender.engine', ADDON_DIR / 'engine',
+                                                        register_plugin=lambda *args: None)
+    modules['rprblender.nodes'] = create_addon_package('rprblender.nodes', ADDON_DIR / 'nodes')
+
+    saved_modules = dict(sys.modules)
+    sys.modules.update(modules)
+
+    yield lambda name: importlib.import_module(f'rprblender.{name}')
+
+    sys.modules.clear()
+    sys.modules.update(saved_modules)
@@ -80,6 +80,8 @@ for name, t in api.types.items():
 print('_types_names =', repr(types_names))
 
 functions_names = []
+# lib call expression of each function, used by pyrpr.init() to generate checking wrappers
+functions_calls = {}
 
 for name, t in api.functions.items():
     # print(name, [(arg.name, arg.type) for arg in t.args])
@@ -146,14 +148,14 @@ for name, t in api.functions.items():
         for n in names:
             functions_names.append(n)
             print_function_header(n, args_names, args_defaults, t.docs if t.docs else api.functions[name].docs)
-            if any(replace_args):
-                print('    return lib.' + name + '(' + ', '.join(
-                    get_arg(arg, replaced) for arg, replaced in zip(args_names, replace_args)) + ')')
-                print()
-            else:
+            call = 'lib.' + name + '(' + ', '.join(
+                get_arg(arg, replaced) for arg, replaced in zip(args_names, replace_args)) + ')'
+            functions_calls[n] = call
+            if not any(replace_args):
                 # functions with dummy wrapper(so that we have intellisense
                 print(n, file=sys.stderr)
-                print('    return lib.' + name + '(' + ', '.join(args_names) + ')')
-                print()
+            print('    return ' + call)
+            print()
 
 print('_functions_names =', repr(functions_names))
+print('_functions_calls =', repr(functions_calls))
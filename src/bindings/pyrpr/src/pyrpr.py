@@ -66,26 +66,62 @@ class CoreError(Exception):
         return ""
 
 
-def wrap_core_check_success(f, module_name):
-    @functools.wraps(f)
-    def wrapped(*argv):
-        status = f(*argv)
-        if SUCCESS != status:
-            raise CoreError(status, f.__name__, argv, module_name)
-        return status
+def wrap_core_check_success(f, module_name, call=None, namespace=None):
+    """
+    Returns function with the same signature as f which raises CoreError if f returns not SUCCESS.
+    The function is compiled once per core function, so its call costs a single Python frame:
+    arguments aren't packed to *argv and status check is inlined.
+    call is optional source expression which is used instead of f(...) call, for example
+    'lib.rprShapeSetTransform(...)' generated in pyrprwrap._functions_calls, then also
+    generated pyrprwrap function frame is skipped. namespace provides names used in call.
+    """
+    try:
+        params = tuple(inspect.signature(f).parameters.values())
+    except (TypeError, ValueError):
+        params = None
+
+    if params is None or any(p.kind != inspect.Parameter.POSITIONAL_OR_KEYWORD for p in params):
+        # not a plain generated function, using generic wrapper
+        @functools.wraps(f)
+        def wrapped(*argv):
+            status = f(*argv)
+            if SUCCESS != status:
+                raise CoreError(status, f.__name__, argv, module_name)
+            return status
+        return wrapped
+
+    name = f.__name__
+    args = ', '.join(p.name for p in params)
+    argv = '(' + args + (',)' if len(params) == 1 else ')')
+    source = (
+        f"def {name}({args}):\n"
+        f"    __status = {call or '__f(' + args + ')'}\n"
+        f"    if __status != __SUCCESS:\n"
+        f"        raise __CoreError(__status, {name!r}, {argv}, {module_name!r})\n"
+        f"    return __status\n"
+    )
+
+    scope = dict(namespace or {})
+    scope.update(__f=f, __SUCCESS=SUCCESS, __CoreError=CoreError)
+    exec(compile(source, f"<{module_name} {name}>", 'exec'), scope)
+
+    wrapped = functools.update_wrapper(scope[name], f)
+    defaults = tuple(p.default for p in params if p.default is not inspect.Parameter.empty)
+    wrapped.__defaults__ = defaults or None
     return wrapped
 
 
 def wrap_core_log_call(f, log_fun, module_name):
-    signature = inspect.signature(f)
+    args_names = tuple(inspect.signature(f).parameters)
+    func_name = module_name + '::' + f.__name__
 
     @functools.wraps(f)
     def wrapped(*argv):
-        log_fun(module_name+'::'+f.__name__, ', '.join(p.name+': '+str(value) for p, value in zip(signature.parameters.values(), argv)))
+        log_fun(func_name, ', '.join(name + ': ' + str(value) for name, value in zip(args_names, argv)))
         time_begin = time.perf_counter()
         result = f(*argv)
         time_end = time.perf_counter()
-        log_fun(module_name+'::'+f.__name__, "done in ", time_end-time_begin)
+        log_fun(func_name, "done in ", time_end-time_begin)
         return result
     return wrapped
 
@@ -122,6 +158,10 @@ def init(lib_dir, log_fun, lib_wrapped_log_calls):
     for name in pyrprwrap._constants_names:
         setattr(_module, name, getattr(pyrprwrap, name))
     
+    # lib calls generated by pyrprwrap_make.py, could be absent in pyrprwrap of older builds
+    functions_calls = getattr(pyrprwrap, '_functions_calls', {})
+    namespace = {'lib': lib, 'ffi': ffi}
+
     for name in pyrprwrap._functions_names:
     
         wrapped = getattr(pyrprwrap, name)
@@ -129,8 +169,11 @@ def init(lib_dir, log_fun, lib_wrapped_log_calls):
         # and to assert that SUCCESS is returned from them
         if lib_wrapped_log_calls:
             wrapped = wrap_core_log_call(wrapped, log_fun, 'RPR')
-        if wrapped.__name__ != 'RegisterPlugin':
-            wrapped = wrap_core_check_success(wrapped, 'RPR')
+            if name != 'RegisterPlugin':
+                wrapped = wrap_core_check_success(wrapped, 'RPR')
+        elif name != 'RegisterPlugin':
+            # calling lib directly from checking function
+            wrapped = wrap_core_check_success(wrapped, 'RPR', functions_calls.get(name, None), namespace)
         setattr(_module, name, wrapped)
 
     del _module
@@ -582,68 +625,48 @@ class Curve(Object):
 
     def __init__(self, context, control_points, points_radii, uvs):
         def to_segments(n):
-            """Index iterator which splits curve with n points to segments by 4"""
+            """Indices which split curve with n points to segments by 4"""
             m = n - 1
-            for s in range(0, m, 3):
-                yield s
-                yield s + 1
-                yield min(s + 2, m)
-                yield min(s + 3, m)
-
-        def iter_segments_radii():
-            """ Get root and tip radii for each curve segment """
-            for e in range(0, curve_length, 4):
-                yield points_radii[segment_steps[e]]
-                yield points_radii[segment_steps[e + 3]]
-
-        def iter_all_segments_radii():
-            """ Get root and tip radii for each curve segment for all curves"""
-            for i in range(num_curves):
-                for e in range(0, curve_length, 4):
-                    yield points_radii[i][segment_steps[e]]
-                    yield points_radii[i][segment_steps[e + 3]]
+            s = np.arange(0, m, 3, dtype=np.int32)
+            return np.stack((s, s + 1, np.minimum(s + 2, m), np.minimum(s + 3, m)), axis=1).ravel()
 
         super().__init__()
         self.context = context
         self.material = None
 
         num_curves = control_points.shape[0]
-        segment_steps = np.fromiter(to_segments(control_points.shape[1]), dtype=np.int32)
+        segment_steps = to_segments(control_points.shape[1])
         curve_length = len(segment_steps)
 
         # converting control_points to points splitted by segments
-        points = np.fromiter(
-            (elem for i in range(num_curves)
-                  for step in segment_steps
-                  for elem in control_points[i, step]),
-            dtype=np.float32
-        ).reshape(-1, 3)
+        points = np.ascontiguousarray(control_points[:, segment_steps], dtype=np.float32).reshape(-1, 3)
 
         if uvs is None:
             uvs_ptr = ffi.NULL
         else:
             uvs_ptr = ffi.cast("float *", uvs.ctypes.data)
-       
+
         segments_per_curve = curve_length // 4
         # create list of indices 0-control_points length
         indices = np.arange(len(points), dtype=np.uint32)
 
+        # root and tip point indices of each curve segment
+        radii_steps = segment_steps.reshape(-1, 4)[:, (0, 3)].ravel()
+
         # list full radius values for each curve
         if len(points_radii.shape) > 1:
             # radius is not the same for all curves, it can be achieved using geometry nodes
-            curve_radii = np.fromiter(iter_all_segments_radii(), dtype=np.float32)
-            radii = np.reshape(curve_radii, (num_curves, -1))
+            radii = np.ascontiguousarray(points_radii[:, radii_steps], dtype=np.float32)
 
         # usual case for hair particles, a radius the same for all curves
         else:
-            curve_radii = np.fromiter(iter_segments_radii(), dtype=np.float32)
-            radii = np.full((num_curves, len(curve_radii)), curve_radii, dtype=np.float32)
+            radii = np.tile(np.asarray(points_radii[radii_steps], dtype=np.float32), (num_curves, 1))
 
-        is_tapered = not np.all(radii == curve_radii[0])
+        is_tapered = not np.all(radii == radii.flat[0])
 
         # create list of segments per curve num_segments = length / 4
         segments = np.full(num_curves, segments_per_curve, dtype=np.int32)
-        
+
         ContextCreateCurve(self.context, self,
             len(points), ffi.cast("float *", points.ctypes.data), points[0].nbytes,
             len(indices), num_curves,
@@ -946,6 +969,12 @@ class FrameBuffer(Object):
         ContextResolveFrameBuffer(self.context, self, resolved_fb, normalize_only)
         
     def get_data(self, buf=None):
+        if isinstance(buf, np.ndarray):
+            # filling preallocated contiguous float32 array in place
+            assert buf.dtype == np.float32 and buf.flags.c_contiguous and buf.nbytes == self.size()
+            FrameBufferGetInfo(self, FRAMEBUFFER_DATA, self.size(), ffi.cast('float*', buf.ctypes.data), ffi.NULL)
+            return buf
+
         if buf:
             FrameBufferGetInfo(self, FRAMEBUFFER_DATA, self.size(), ffi.cast('float*', buf), ffi.NULL)
             return buf
@@ -0,0 +1,96 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Benchmark of RPRContext object removal: cost of removing an object shouldn't depend on
+number of objects in scene, because child objects, instances and curves are indexed by parent key
+"""
+import time
+
+import numpy as np
+import pytest
+
+
+# number of removed objects per measurement
+REMOVED_COUNT = 1000
+
+
+def create_scene(context_module, count):
+    rpr_context = context_module.RPRContext()
+    rpr_context.scene = context_module.pyrpr.Scene(None)
+
+    for i in range(count):
+        key = f"object_{i}"
+        mesh = rpr_context.create_mesh(key, None, None, None, None, None, None, None)
+        rpr_context.create_instance((key, 'instance'), mesh)
+        rpr_context.create_curve((key, 'hair'), None, None, None)
+
+    return rpr_context
+
+
+def measure_removal(context_module, count):
+    """ Returns time of removing one object with its instance and curve, in seconds """
+    rpr_context = create_scene(context_module, count)
+    keys = [f"object_{i}" for i in np.linspace(0, count - 1, REMOVED_COUNT, dtype=int)]
+
+    time_begin = time.perf_counter()
+    for key in keys:
+        rpr_context.remove_object(key)
+    removal_time = (time.perf_counter() - time_begin) / REMOVED_COUNT
+
+    assert len(rpr_context.objects) == 2 * (count - REMOVED_COUNT)
+    assert len(rpr_context.curves) == count - REMOVED_COUNT
+    return removal_time
+
+
+def test_remove_object(addon):
+    context_module = addon('engine.context')
+    rpr_context = create_scene(context_module, 10)
+
+    rpr_context.remove_object("object_3")
+    assert "object_3" not in rpr_context.objects
+    assert ("object_3", 'instance') not in rpr_context.objects
+    assert ("object_3", 'hair') not in rpr_context.curves
+    assert "object_3" not in rpr_context.child_object_keys
+    assert "object_3" not in rpr_context.curve_keys
+    assert len(rpr_context.objects) == 18
+    assert len(rpr_context.mesh_instance_keys) == 9
+
+
+def test_remove_instanced_mesh(addon):
+    context_module = addon('engine.context')
+    rpr_context = create_scene(context_module, 10)
+    mesh = rpr_context.objects["object_3"]
+    rpr_context.create_instance(("object_4", 'instance'), mesh)
+
+    # mesh with instances of other objects is kept and hidden
+    rpr_context.remove_object("object_3")
+    assert rpr_context.objects["object_3"] is mesh
+
+    rpr_context.remove_object("object_4")
+    assert id(mesh) not in rpr_context.mesh_instance_keys
+
+
+@pytest.mark.parametrize('count', (10_000, 100_000))
+def test_removal_cost_is_flat(addon, count):
+    context_module = addon('engine.context')
+
+    # the best of several runs is compared to reduce timer noise
+    base_time = min(measure_removal(context_module, 1000) for _ in range(3))
+    scene_time = min(measure_removal(context_module, count) for _ in range(2))
+    print(f"Removal of object from {count} objects: {scene_time * 1e6:.2f} us, "
+          f"from 1000 objects: {base_time * 1e6:.2f} us")
+
+    # scan of all objects would be 10x and 100x slower
+    assert scene_time < base_time * 3
@@ -0,0 +1,164 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Status-checking wrappers of core functions, tested with fake cffi lib: wrapper compiled by
+wrap_core_check_success() is compared to generic *argv wrapper of generated pyrprwrap function
+"""
+import importlib.util
+import inspect
+import sys
+import timeit
+import types
+from pathlib import Path
+
+import pytest
+
+
+SUCCESS = 0
+ERROR_INVALID_PARAMETER = -12
+
+
+class FakeLib:
+    """ cffi lib of core: functions return status without doing anything """
+
+    @staticmethod
+    def rprShapeSetTransform(shape, transpose, transform):
+        return SUCCESS
+
+    @staticmethod
+    def rprShapeSetVisibility(shape, visible):
+        return ERROR_INVALID_PARAMETER
+
+    @staticmethod
+    def rprContextGetInfo(context, info, size, data, size_ret):
+        return ERROR_INVALID_PARAMETER
+
+
+class FakeFFI:
+    NULL = None
+
+    @staticmethod
+    def new(cdecl, init=None):
+        return [init]
+
+
+def create_pyrprwrap():
+    """ Returns module like generated by pyrprwrap_make.py for two functions """
+    pyrprwrap = types.ModuleType('pyrprwrap')
+    pyrprwrap.lib = FakeLib()
+    pyrprwrap.ffi = FakeFFI()
+    pyrprwrap.SUCCESS = SUCCESS
+    pyrprwrap.ERROR_INVALID_PARAMETER = ERROR_INVALID_PARAMETER
+    pyrprwrap.CONTEXT_LAST_ERROR_MESSAGE = 1
+    pyrprwrap._constants_names = ['SUCCESS', 'ERROR_INVALID_PARAMETER', 'CONTEXT_LAST_ERROR_MESSAGE']
+    pyrprwrap._functions_calls = {
+        'ShapeSetTransform': 'lib.rprShapeSetTransform(shape, transpose, transform)',
+        'ShapeSetVisibility': 'lib.rprShapeSetVisibility(shape, visible)',
+    }
+
+    source = "\n".join(
+        f"def {name}({call[call.index('(') + 1:-1]}):\n    return {call}\n"
+        for name, call in pyrprwrap._functions_calls.items())
+    exec(source, pyrprwrap.__dict__)
+    pyrprwrap._functions_names = list(pyrprwrap._functions_calls)
+
+    # functions referenced by pyrpr classes definitions
+    for name in ('Grid', 'Lookup'):
+        for grid in ('Density', 'Albedo', 'Emission'):
+            setattr(pyrprwrap, f'HeteroVolumeSet{grid}{name}', lambda *argv: SUCCESS)
+
+    return pyrprwrap
+
+
+@pytest.fixture
+def pyrpr(monkeypatch):
+    """ pyrpr module imported with fake pyrprwrap """
+    monkeypatch.setitem(sys.modules, 'bgl', types.ModuleType('bgl'))
+    monkeypatch.setitem(sys.modules, 'pyrprwrap', create_pyrprwrap())
+
+    spec = importlib.util.spec_from_file_location('pyrpr', Path(__file__).parent / 'src/pyrpr.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def generic_wrapper(pyrpr, f):
+    """ Wrapper of function with *argv, as it was before wrappers compilation """
+    def wrapped(*argv):
+        status = f(*argv)
+        if pyrpr.SUCCESS != status:
+            raise pyrpr.CoreError(status, f.__name__, argv, 'RPR')
+        return status
+
+    return wrapped
+
+
+def compiled_wrapper(pyrpr, name):
+    pyrprwrap = sys.modules['pyrprwrap']
+    return pyrpr.wrap_core_check_success(getattr(pyrprwrap, name), 'RPR',
+                                         pyrprwrap._functions_calls[name],
+                                         {'lib': pyrprwrap.lib, 'ffi': pyrprwrap.ffi})
+
+
+def test_compiled_wrapper(pyrpr):
+    set_transform = compiled_wrapper(pyrpr, 'ShapeSetTransform')
+    assert set_transform.__name__ == 'ShapeSetTransform'
+    assert tuple(inspect.signature(set_transform).parameters) == ('shape', 'transpose', 'transform')
+    assert set_transform(None, True, None) == SUCCESS
+
+    set_visibility = compiled_wrapper(pyrpr, 'ShapeSetVisibility')
+    with pytest.raises(pyrpr.CoreError) as error:
+        set_visibility("shape", False)
+
+    assert error.value.status == ERROR_INVALID_PARAMETER
+    assert error.value.func_name == 'ShapeSetVisibility'
+    assert error.value.argv == ("shape", False)
+
+
+def test_compiled_wrapper_without_call(pyrpr):
+    pyrprwrap = sys.modules['pyrprwrap']
+
+    def ShapeSetVisibility(shape, visible=True):
+        return pyrprwrap.lib.rprShapeSetVisibility(shape, visible)
+
+    # function is called by wrapper if lib call expression is absent, defaults are kept
+    set_visibility = pyrpr.wrap_core_check_success(ShapeSetVisibility, 'RPR')
+    assert set_visibility.__defaults__ == (True,)
+    with pytest.raises(pyrpr.CoreError) as error:
+        set_visibility("shape")
+
+    assert error.value.argv == ("shape", True)
+
+
+def test_generic_wrapper_fallback(pyrpr):
+    def ShapeSetTransform(*argv):
+        return SUCCESS
+
+    set_transform = pyrpr.wrap_core_check_success(ShapeSetTransform, 'RPR')
+    assert set_transform(None, True, None) == SUCCESS
+
+
+def test_wrapper_call_overhead(pyrpr):
+    pyrprwrap = sys.modules['pyrprwrap']
+    generic = generic_wrapper(pyrpr, pyrprwrap.ShapeSetTransform)
+    compiled = compiled_wrapper(pyrpr, 'ShapeSetTransform')
+
+    number = 100_000
+    generic_time = min(timeit.repeat(lambda: generic(None, True, None), number=number, repeat=5)) / number
+    compiled_time = min(timeit.repeat(lambda: compiled(None, True, None), number=number, repeat=5)) / number
+    print(f"ShapeSetTransform call: generic wrapper {generic_time * 1e9:.0f} ns, "
+          f"compiled wrapper {compiled_time * 1e9:.0f} ns")
+
+    assert compiled_time < generic_time
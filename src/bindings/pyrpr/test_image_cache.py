@@ -0,0 +1,78 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Image cache eviction: cache dir is scanned only when estimated cache size exceeds the limit
+"""
+import os
+from pathlib import Path
+
+import pytest
+
+
+FILE_SIZE = 1000
+
+
+@pytest.fixture
+def image_cache(addon, monkeypatch, tmp_path):
+    config = addon('config')
+    module = addon('utils.image_cache')
+    monkeypatch.setattr(config, 'image_cache_dir', str(tmp_path))
+    monkeypatch.setattr(config, 'image_cache_size_limit', 10 * FILE_SIZE)
+    monkeypatch.setattr(module, '_cache_sizes', {})
+    monkeypatch.setattr(module, '_used_paths', set())
+
+    # counting scans of cache dir
+    module.scan_count = 0
+    scandir = os.scandir
+
+    def counting_scandir(path):
+        module.scan_count += 1
+        return scandir(path)
+
+    monkeypatch.setattr(module.os, 'scandir', counting_scandir)
+    return module
+
+
+def write_file(path):
+    Path(path).write_bytes(b'\0' * FILE_SIZE)
+
+
+def test_evict_scans_on_limit(image_cache, tmp_path):
+    for i in range(10):
+        image_cache.get_cached_file(f"key{i}", "png", write_file)
+
+    # the first write scans cache dir, next writes are counted
+    assert image_cache.scan_count == 1
+    assert len(list(tmp_path.iterdir())) == 10
+
+    # files used by current process aren't evicted
+    image_cache._used_paths.clear()
+    image_cache.get_cached_file("key10", "png", write_file)
+    assert image_cache.scan_count == 2
+    assert len(list(tmp_path.iterdir())) == 10
+    assert (tmp_path / "key10.png").is_file()
+
+    image_cache.get_cached_file("key10", "png", write_file)
+    assert image_cache.scan_count == 2
+
+
+def test_evict_counts_files_of_other_processes(image_cache, tmp_path):
+    for i in range(10):
+        write_file(tmp_path / f"other{i}.png")
+
+    image_cache.get_cached_file("key", "png", write_file)
+    assert image_cache.scan_count == 1
+    assert image_cache._cache_sizes[tmp_path] == 10 * FILE_SIZE
+    assert (tmp_path / "key.png").is_file()
@@ -0,0 +1,135 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Image filter graph with fake RIF context: binding of frame buffers to inputs recreates images
+once, resize() recreates temporal accumulators and reuses other filters
+"""
+import sys
+import types
+
+import pytest
+
+
+EAW_INPUTS = ('color', 'normal', 'depth', 'trans', 'world_coordinate', 'object_id')
+
+
+class FrameBuffer:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+
+class Image:
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def set_data(self, data, pos):
+        pass
+
+
+class FrameBufferImage:
+    def __init__(self, frame_buffer):
+        self.frame_buffer = frame_buffer
+        self.width = frame_buffer.width
+        self.height = frame_buffer.height
+
+    def update(self):
+        pass
+
+
+class Filter:
+    def __init__(self, filter_type):
+        self.filter_type = filter_type
+
+    def set_parameter(self, name, value):
+        pass
+
+
+class CommandQueue:
+    def __init__(self):
+        self.detach_count = 0
+
+    def attach_image_filter(self, image_filter, input_image, output_image):
+        pass
+
+    def detach_image_filters(self):
+        self.detach_count += 1
+
+
+class RifContext:
+    def create_command_queue(self):
+        return CommandQueue()
+
+    def create_image(self, width, height, components=4):
+        return Image(width, height)
+
+    def create_frame_buffer_image(self, frame_buffer):
+        return FrameBufferImage(frame_buffer)
+
+    def create_filter(self, filter_type):
+        return Filter(filter_type)
+
+
+@pytest.fixture
+def image_filter(addon, monkeypatch):
+    rif = types.ModuleType('pyrprimagefilters')
+    rif.FrameBufferImage = FrameBufferImage
+    rif.IMAGE_FILTER_EAW_DENOISE, rif.IMAGE_FILTER_TEMPORAL_ACCUMULATOR, \
+        rif.IMAGE_FILTER_MLAA, rif.IMAGE_FILTER_NORMALIZATION = range(1, 5)
+    monkeypatch.setitem(sys.modules, 'pyrprimagefilters', rif)
+    monkeypatch.setattr(sys.modules['rprblender.engine'], 'init_rif', lambda: None, raising=False)
+    monkeypatch.delitem(sys.modules, 'rprblender.engine.image_filter', raising=False)
+    return addon('engine.image_filter')
+
+
+def create_eaw(image_filter, width=64, height=32):
+    return image_filter.ImageFilterEaw(None, set(EAW_INPUTS), {}, {}, width, height,
+                                       rif_context=RifContext())
+
+
+def test_bind_inputs_rebuilds_once(image_filter):
+    eaw = create_eaw(image_filter)
+    frame_buffers = {input_id: FrameBuffer(64, 32) for input_id in EAW_INPUTS}
+
+    eaw.bind_inputs(frame_buffers)
+    assert eaw.command_queue.detach_count == 1
+    assert all(eaw.inputs[input_id].frame_buffer is fb for input_id, fb in frame_buffers.items())
+
+    # the same frame buffers are already bound
+    eaw.bind_inputs(frame_buffers)
+    assert eaw.command_queue.detach_count == 1
+
+    # unbound input is filled by update_input() without rebuild
+    eaw.bind_inputs({'color': None})
+    assert eaw.command_queue.detach_count == 2
+    eaw.update_input('color', None)
+    assert eaw.command_queue.detach_count == 2
+
+
+def test_resize_resets_temporal_accumulator(image_filter):
+    eaw = create_eaw(image_filter)
+    filters = dict(eaw.filters)
+
+    eaw.resize(64, 32)
+    assert eaw.command_queue.detach_count == 0
+
+    eaw.resize(128, 64)
+    assert eaw.command_queue.detach_count == 1
+    for key, rif_filter in eaw.filters.items():
+        if key[0] == 'color_variance':
+            assert rif_filter is not filters[key]
+        else:
+            assert rif_filter is filters[key]
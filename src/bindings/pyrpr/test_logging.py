@@ -0,0 +1,91 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Addon logging: level gate, queue handler listener thread is started by the first record and
+stopped by closing handler at exit or on addon reload, it doesn't register anything on reload
+"""
+import atexit
+import importlib.util
+import logging
+import sys
+
+import pytest
+
+
+@pytest.fixture
+def addon_logging(addon):
+    return addon('utils.logging')
+
+
+def test_is_enabled(addon_logging, monkeypatch):
+    monkeypatch.setattr(addon_logging, 'min_level', logging.WARN)
+    assert addon_logging.is_enabled(logging.WARN)
+    assert not addon_logging.is_enabled(logging.INFO)
+
+    log = addon_logging.Log(tag='test_logging', level='debug')
+    assert not log.is_enabled()
+    assert log.is_enabled(logging.ERROR)
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+def test_listener_started_on_first_record(addon_logging):
+    target = ListHandler()
+    handler = addon_logging.QueueHandler(target)
+    assert not handler.is_listening
+
+    logger = logging.getLogger('rpr.test_logging')
+    logger.addHandler(handler)
+    try:
+        logger.warning("message")
+        assert handler.is_listening
+    finally:
+        logger.removeHandler(handler)
+
+    # closing writes records left in queue
+    handler.close()
+    assert not handler.is_listening
+    assert target.messages == ["message"]
+
+
+def test_reload_replaces_handler(addon_logging, monkeypatch):
+    old_handler = addon_logging.QueueHandler(ListHandler())
+    old_handler.handle(logging.makeLogRecord({'msg': "message", 'levelno': logging.INFO}))
+    logging.root.addHandler(old_handler)
+
+    registered = []
+    monkeypatch.setattr(atexit, 'register', lambda *args: registered.append(args))
+
+    name = addon_logging.__name__
+    spec = importlib.util.spec_from_file_location(name, addon_logging.__file__)
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, name, module)
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        logging.root.removeHandler(old_handler)
+        if module.__dict__.get('queue_handler') in logging.root.handlers:
+            logging.root.removeHandler(module.queue_handler)
+
+    assert old_handler.is_closed and not old_handler.is_listening
+    assert not module.queue_handler.is_listening
+    assert registered == []
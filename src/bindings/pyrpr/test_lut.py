@@ -0,0 +1,140 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Lookup tables of curve mappings and color ramps: curve tables are built from curve points
+like Blender does. With Blender Python module results are compared to Blender evaluate()
+"""
+import importlib.util
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+
+# checked before addon fixture installs stub bpy
+blender = pytest.mark.skipif(importlib.util.find_spec('bpy') is None, reason="requires Blender Python module")
+
+TOLERANCE = 1e-5
+
+
+@pytest.fixture
+def lut(addon):
+    return addon('nodes.lut')
+
+
+def curve_mapping(points, extend='HORIZONTAL', use_clip=False):
+    """ Mapping with single curve, points are (location, handle_type) """
+    curve = SimpleNamespace(points=[SimpleNamespace(location=location, handle_type=handle_type)
+                                    for location, handle_type in points])
+    return SimpleNamespace(curves=[curve], extend=extend, use_clip=use_clip,
+                           clip_min_x=0.0, clip_max_x=1.0, clip_min_y=0.0, clip_max_y=1.0)
+
+
+@pytest.mark.parametrize('handle_type', ('AUTO', 'AUTO_CLAMPED', 'VECTOR'))
+def test_identity_curve(lut, handle_type):
+    mapping = curve_mapping((((0.0, 0.0), handle_type), ((1.0, 1.0), handle_type)))
+    values = np.linspace(0.0, 1.0, 1001, dtype=np.float32)
+    assert np.abs(lut.eval_curve_array(mapping, 0, values) - values).max() < TOLERANCE
+
+
+def test_curve_extend(lut):
+    points = (((0.2, 0.3), 'VECTOR'), ((0.8, 0.6), 'VECTOR'))
+    values = np.array((-1.0, 0.0, 0.5, 1.0, 2.0), dtype=np.float32)
+
+    res = lut.eval_curve_array(curve_mapping(points), 0, values)
+    assert np.allclose(res, (0.3, 0.3, 0.45, 0.6, 0.6), atol=TOLERANCE)
+
+    res = lut.eval_curve_array(curve_mapping(points, 'EXTRAPOLATED'), 0, values)
+    assert np.allclose(res, (-0.3, 0.2, 0.45, 0.7, 1.2), atol=TOLERANCE)
+
+    # clipping limits input and output
+    res = lut.eval_curve_array(curve_mapping(points, 'EXTRAPOLATED', use_clip=True), 0, values)
+    assert np.allclose(res, (0.2, 0.2, 0.45, 0.7, 0.7), atol=TOLERANCE)
+
+
+def test_auto_clamped_extremum(lut):
+    values = np.linspace(0.0, 1.0, 1001, dtype=np.float32)
+
+    def eval_max(handle_type):
+        mapping = curve_mapping((((0.0, 0.0), 'AUTO'), ((0.3, 1.0), handle_type), ((1.0, 0.9), 'AUTO')))
+        return lut.eval_curve_array(mapping, 0, values).max()
+
+    # auto handles overshoot the point, clamped ones are horizontal in extremum
+    assert eval_max('AUTO') > 1.0 + 0.01
+    assert eval_max('AUTO_CLAMPED') < 1.0 + TOLERANCE
+
+
+def test_float_curve_lut(lut):
+    mapping = curve_mapping((((0.0, 1.0), 'VECTOR'), ((1.0, 0.0), 'VECTOR')))
+    table = lut.float_curve_lut(mapping)
+    assert not table.flags.writeable
+    assert np.allclose(table.ravel(), 1.0 - np.linspace(0.0, 1.0, lut.LUT_SIZE), atol=TOLERANCE)
+    assert lut.float_curve_lut(mapping) is table
+
+
+@pytest.fixture
+def node_tree():
+    import bpy
+
+    tree = bpy.data.node_groups.new("lut_test", 'ShaderNodeTree')
+    yield tree
+    bpy.data.node_groups.remove(tree)
+
+
+CURVES = (
+    ((0.0, 0.0, 'AUTO'), (1.0, 1.0, 'AUTO')),
+    ((0.0, 0.2, 'AUTO'), (0.3, 0.8, 'AUTO'), (0.6, 0.1, 'AUTO'), (1.0, 0.9, 'AUTO')),
+    ((0.1, 0.2, 'AUTO'), (0.3, 0.8, 'AUTO_CLAMPED'), (0.6, 0.1, 'VECTOR'), (0.9, 0.9, 'AUTO')),
+    ((-0.2, 0.5, 'VECTOR'), (0.25, 1.1, 'AUTO_CLAMPED'), (0.3, -0.1, 'AUTO'), (1.2, 0.4, 'AUTO_CLAMPED')),
+)
+
+
+@blender
+@pytest.mark.parametrize('extend', ('HORIZONTAL', 'EXTRAPOLATED'))
+@pytest.mark.parametrize('points', CURVES)
+def test_curve_matches_blender(lut, node_tree, points, extend):
+    mapping = node_tree.nodes.new('ShaderNodeRGBCurve').mapping
+    curve = mapping.curves[0]
+    while len(curve.points) < len(points):
+        curve.points.new(0.5, 0.5)
+
+    # points are set in order of x, so they stay sorted
+    for point, (x, y, handle_type) in zip(curve.points, points):
+        point.location = (x, y)
+        point.handle_type = handle_type
+
+    mapping.extend = extend
+    mapping.use_clip = False
+    mapping.update()
+
+    values = np.linspace(-0.5, 1.5, 2001, dtype=np.float32)
+    expected = np.array([mapping.evaluate(curve, val) for val in values.tolist()])
+    assert np.abs(lut.eval_curve_array(mapping, 0, values) - expected).max() < TOLERANCE
+
+
+@blender
+@pytest.mark.parametrize('interpolation', ('CONSTANT', 'LINEAR', 'EASE', 'B_SPLINE', 'CARDINAL'))
+def test_color_ramp_matches_blender(lut, node_tree, interpolation):
+    color_ramp = node_tree.nodes.new('ShaderNodeValToRGB').color_ramp
+    color_ramp.interpolation = interpolation
+    color_ramp.elements[0].position = 0.1
+    color_ramp.elements[0].color = (0.9, 0.1, 0.2, 1.0)
+    color_ramp.elements[1].position = 0.8
+    color_ramp.elements[1].color = (0.0, 0.5, 1.0, 0.5)
+    color_ramp.elements.new(0.35).color = (0.2, 1.0, 0.3, 0.8)
+
+    values = np.linspace(-0.2, 1.2, 1401, dtype=np.float32)
+    expected = np.array([tuple(color_ramp.evaluate(val)) for val in values.tolist()])
+    assert np.abs(lut.eval_color_ramp(color_ramp, values) - expected).max() < TOLERANCE
@@ -0,0 +1,130 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Number of material nodes created by NodeItem operations: identical arithmetic nodes are reused
+and trivial operations don't create nodes. Counts are compared to export without node reuse
+"""
+import pytest
+
+
+class NoReuse(dict):
+    """ arithmetic_nodes which never keeps nodes, every operation creates a new node """
+
+    def __setitem__(self, key, value):
+        pass
+
+
+@pytest.fixture
+def node_item(addon):
+    return addon('nodes.node_item')
+
+
+def count_nodes(node_item, build, reuse=True):
+    """ Returns number of nodes created by build(rpr_context, input_node) """
+    pyrpr = node_item.pyrpr
+    rpr_context = node_item.context_hybrid.context.RPRContext()
+    if not reuse:
+        rpr_context.arithmetic_nodes = NoReuse()
+
+    input_data = rpr_context.create_material_node(pyrpr.MATERIAL_NODE_INPUT_LOOKUP)
+    input_node = node_item.NodeItem(rpr_context, input_data)
+    created_count = pyrpr.MaterialNode.created_count
+    build(rpr_context, input_node)
+    return pyrpr.MaterialNode.created_count - created_count
+
+
+def rgb_to_hsv_twice(rpr_context, color):
+    # color is converted in two places of material, e.g. Hue Saturation Value and Separate HSV nodes
+    return color.rgb_to_hsv(), color.rgb_to_hsv()
+
+
+def to_bw_and_channels(rpr_context, color):
+    # to_bw selects channels which are also used by Separate RGB
+    return color.to_bw(), color.get_channel(0), color.get_channel(1), color.get_channel(2)
+
+
+def commutative_operands(rpr_context, color):
+    r = color.get_channel(0)
+    g = color.get_channel(1)
+    return r * g, g * r, r + g, g + r, r.max(g), g.max(r)
+
+
+@pytest.mark.parametrize('build, expected_count', (
+    (rgb_to_hsv_twice, None),
+    (to_bw_and_channels, None),
+    (commutative_operands, 5),
+))
+def test_node_count(node_item, build, expected_count):
+    count = count_nodes(node_item, build)
+    count_without_reuse = count_nodes(node_item, build, reuse=False)
+    print(f"{build.__name__}: {count_without_reuse} -> {count} nodes")
+
+    assert count < count_without_reuse
+    if expected_count is not None:
+        assert count == expected_count
+
+
+def test_rgb_to_hsv_reuse(node_item):
+    single_count = count_nodes(node_item, lambda rpr_context, color: color.rgb_to_hsv())
+    assert count_nodes(node_item, rgb_to_hsv_twice) == single_count
+
+
+def test_to_bw_reuse(node_item):
+    bw_count = count_nodes(node_item, lambda rpr_context, color: color.to_bw())
+    assert count_nodes(node_item, to_bw_and_channels) == bw_count
+
+
+def test_trivial_operations(node_item):
+    def build(rpr_context, color):
+        assert (color + 0.0).data is color.data
+        assert (color * 1.0).data is color.data
+        assert (color / 1.0).data is color.data
+        assert (color ** 1.0).data is color.data
+        assert (-(-color)).data is color.data
+
+        clamped = color.clamp()
+        assert clamped.clamp().data is clamped.data
+        assert clamped.clamp(-1.0, 2.0).data is clamped.data
+
+    # nodes of -color and clamp() min and max
+    assert count_nodes(node_item, build) == 3
+
+
+def test_constants_dont_create_nodes(node_item):
+    NodeItem = node_item.NodeItem
+
+    def build(rpr_context, color):
+        value = NodeItem(rpr_context, (0.5, 0.25, 1.0)) * 2.0 + 1.0
+        assert value.data == (2.0, 1.5, 3.0)
+        return value.clamp(), value.rgb_to_hsv(), value.to_bw()
+
+    assert count_nodes(node_item, build) == 0
+
+
+def test_reused_node_inputs(node_item):
+    NodeItem = node_item.NodeItem
+    pyrpr = node_item.pyrpr
+
+    def build(rpr_context, color):
+        r = color.get_channel(0)
+        other_r = color.get_channel(0)
+        assert other_r.data is r.data
+        assert r.data.inputs[pyrpr.MATERIAL_INPUT_COLOR0] is color.data
+
+        # the same operation with other operands creates new node
+        assert (r * 2.0).data is not (r * 3.0).data
+        assert (r - 2.0).data is not (NodeItem(rpr_context, 2.0) - r).data
+
+    count_nodes(node_item, build)
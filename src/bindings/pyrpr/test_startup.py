@@ -0,0 +1,198 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Addon startup with stub bindings: only core library is loaded by engine package import,
+other libraries and render plugins are loaded on first use, devices are read from cache
+"""
+import ctypes
+import importlib.util
+import os
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+import pytest
+
+
+class Calls(list):
+    """ Records calls of stub functions """
+
+    def recorder(self, name, result=None):
+        def record(*args):
+            self.append(name)
+            return result
+
+        return record
+
+
+class PluginContext:
+    """ Context class of render plugin binding """
+    plugin_id = -1
+    calls = None
+
+    @classmethod
+    def register_plugin(cls, lib_path, cache_path):
+        cls.calls.append(f'register {cls.__module__}')
+        cls.plugin_id = 1
+
+    @classmethod
+    def load_devices(cls):
+        # pyrpr2 sets devices of pyrpr.Context
+        cls.calls.append('load_devices')
+        core_context = sys.modules['pyrpr'].Context
+        core_context.cpu_device = {'name': "CPU", 'threads': 8}
+        core_context.gpu_devices = [{'name': "GPU"}]
+
+
+def plugin_context(module_name, calls):
+    return type('Context', (PluginContext,), {'__module__': module_name, 'calls': calls})
+
+
+@pytest.fixture
+def startup(addon, monkeypatch):
+    """ Imports engine package with stub bindings, returns (engine module, calls) """
+    utils = addon('utils')
+    calls = Calls()
+
+    # engine package import changes libraries paths
+    monkeypatch.setattr(sys, 'path', list(sys.path))
+    monkeypatch.setattr(os, 'environ', dict(os.environ))
+
+    pyrpr = sys.modules['pyrpr']
+    monkeypatch.setattr(pyrpr, 'init', calls.recorder('init core'), raising=False)
+    monkeypatch.setattr(pyrpr, 'Context', plugin_context('pyrpr', calls), raising=False)
+    for name in ('pyrpr2', 'pyhybrid', 'pyhybridpro'):
+        monkeypatch.setattr(sys.modules[name], 'Context', plugin_context(name, calls), raising=False)
+
+    for name, title in (('pyrprimagefilters', 'rif'), ('pyrpr_load_store', 'load_store')):
+        module = types.ModuleType(name)
+        module.init = calls.recorder(f'init {title}')
+        module.VERSION_MAJOR, module.VERSION_MINOR, module.VERSION_REVISION, module.COMMIT_INFO = 1, 2, 3, 0
+        monkeypatch.setitem(sys.modules, name, module)
+
+    engine_dir = Path(utils.__file__).parents[1] / 'engine'
+    spec = importlib.util.spec_from_file_location('rprblender.engine', engine_dir / '__init__.py',
+                                                  submodule_search_locations=[str(engine_dir)])
+    engine = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, 'rprblender.engine', engine)
+    spec.loader.exec_module(engine)
+
+    yield engine, calls
+
+    for path in (utils.core_cache_dir() / engine.DEVICES_CACHE_FILE,
+                 engine.get_plugin_lib_path(sys.modules['pyrpr2'].Context)):
+        if path and path.is_file():
+            path.unlink()
+
+
+def create_northstar_lib(engine):
+    lib_path = engine.get_plugin_lib_path(sys.modules['pyrpr2'].Context)
+    lib_path.parent.mkdir(parents=True, exist_ok=True)
+    lib_path.write_bytes(b'')
+
+
+def test_startup_loads_core_only(startup):
+    engine, calls = startup
+
+    # Northstar library is absent, devices aren't loaded
+    assert calls == ['init core']
+    assert not engine._initialized_libs
+
+
+def test_libraries_loaded_once(startup):
+    engine, calls = startup
+    calls.clear()
+
+    for _ in range(2):
+        engine.init_rif()
+        engine.init_load_store()
+
+    assert calls == ['init rif', 'init load_store']
+
+
+def test_plugin_registered_on_first_use(startup):
+    engine, calls = startup
+    pyrpr2 = sys.modules['pyrpr2']
+    calls.clear()
+
+    assert not engine.is_plugin_available(pyrpr2.Context)
+    create_northstar_lib(engine)
+    assert engine.is_plugin_available(pyrpr2.Context)
+    assert calls == []
+
+    engine.register_plugin(pyrpr2.Context)
+    engine.register_plugin(pyrpr2.Context)
+    assert calls == ['register pyrpr2']
+
+
+def test_devices_cache(startup):
+    engine, calls = startup
+    pyrpr, pyrpr2 = sys.modules['pyrpr'], sys.modules['pyrpr2']
+    create_northstar_lib(engine)
+    calls.clear()
+
+    engine.load_devices()
+    assert calls == ['register pyrpr2', 'load_devices']
+    assert pyrpr.Context.gpu_devices == [{'name': "GPU"}]
+
+    # next startup reads devices from cache without plugin registration
+    pyrpr2.Context.plugin_id = -1
+    pyrpr.Context.gpu_devices = None
+    calls.clear()
+
+    engine.load_devices()
+    assert calls == []
+    assert pyrpr.Context.gpu_devices == [{'name': "GPU"}]
+    assert pyrpr.Context.cpu_device == {'name': "CPU", 'threads': 8}
+
+
+class FakeCDLL:
+    """ Helper library, its functions are set up slowly to make race of threads more likely """
+    loaded_count = 0
+
+    def __init__(self, path):
+        FakeCDLL.loaded_count += 1
+
+    def __getattr__(self, name):
+        time.sleep(0.001)
+        function = types.SimpleNamespace(argtypes=None, restype=ctypes.c_int)
+        setattr(self, name, function)
+        return function
+
+
+def test_helper_lib_init_race(addon, monkeypatch):
+    helper_lib = addon('utils.helper_lib')
+    monkeypatch.setattr(helper_lib, 'lib', None)
+    monkeypatch.setattr(helper_lib.ctypes, 'CDLL', FakeCDLL)
+    FakeCDLL.loaded_count = 0
+
+    barrier = threading.Barrier(8)
+    restypes = []
+
+    def use_lib():
+        barrier.wait()
+        restypes.append(helper_lib.get_lib().get_sun_azimuth.restype)
+
+    threads = [threading.Thread(target=use_lib) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # every thread gets library with functions already set up
+    assert FakeCDLL.loaded_count == 1
+    assert restypes == [ctypes.c_float] * 8
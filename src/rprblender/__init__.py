@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #********************************************************************
+import importlib
 import traceback
 
 import bpy
@@ -46,49 +47,42 @@ from . import (
     material_library,
 )
 
-from .engine.render_engine import RenderEngine
-from .engine.render_engine_2 import RenderEngine2
-from .engine.preview_engine import PreviewEngine
-from .engine.viewport_engine import ViewportEngine
-from .engine.viewport_engine_2 import ViewportEngine2
-from .engine.animation_engine import AnimationEngine, AnimationEngine2
-
-from .engine.render_engine_hybrid import RenderEngine as RenderEngineHybrid
-from .engine.viewport_engine_hybrid import ViewportEngine as ViewportEngineHybrid
-from .engine.animation_engine_hybrid import AnimationEngine as AnimationEngineHybrid
-
-from .engine.render_engine_hybridpro import RenderEngine as RenderEngineHybridPro
-from .engine.viewport_engine_hybridpro import ViewportEngine as ViewportEngineHybridPro
-from .engine.animation_engine_hybridpro import AnimationEngine as AnimationEngineHybridPro
-
 log = logging.Log(tag='init')
 log("Loading RPR addon {}".format(bl_info['version']))
 
 
+# engine classes by render mode: (module in rprblender.engine, class name),
+# engine modules are imported when engine is created first time
 render_engine_cls = {
-    'FULL': RenderEngine,
-    'HIGH': RenderEngineHybrid,
-    'MEDIUM': RenderEngineHybrid,
-    'LOW': RenderEngineHybrid,
-    'FULL2': RenderEngine2,
-    'HYBRIDPRO': RenderEngineHybridPro,
+    'FULL': ('render_engine', 'RenderEngine'),
+    'HIGH': ('render_engine_hybrid', 'RenderEngine'),
+    'MEDIUM': ('render_engine_hybrid', 'RenderEngine'),
+    'LOW': ('render_engine_hybrid', 'RenderEngine'),
+    'FULL2': ('render_engine_2', 'RenderEngine2'),
+    'HYBRIDPRO': ('render_engine_hybridpro', 'RenderEngine'),
 }
 animation_engine_cls = {
-    'FULL': AnimationEngine,
-    'HIGH': AnimationEngineHybrid,
-    'MEDIUM': AnimationEngineHybrid,
-    'LOW': AnimationEngineHybrid,
-    'FULL2': AnimationEngine2,
-    'HYBRIDPRO': AnimationEngineHybridPro,
+    'FULL': ('animation_engine', 'AnimationEngine'),
+    'HIGH': ('animation_engine_hybrid', 'AnimationEngine'),
+    'MEDIUM': ('animation_engine_hybrid', 'AnimationEngine'),
+    'LOW': ('animation_engine_hybrid', 'AnimationEngine'),
+    'FULL2': ('animation_engine', 'AnimationEngine2'),
+    'HYBRIDPRO': ('animation_engine_hybridpro', 'AnimationEngine'),
 }
 viewport_engine_cls = {
-    'FULL': ViewportEngine,
-    'HIGH': ViewportEngineHybrid,
-    'MEDIUM': ViewportEngineHybrid,
-    'LOW': ViewportEngineHybrid,
-    'FULL2': ViewportEngine2,
-    'HYBRIDPRO': ViewportEngineHybridPro,
+    'FULL': ('viewport_engine', 'ViewportEngine'),
+    'HIGH': ('viewport_engine_hybrid', 'ViewportEngine'),
+    'MEDIUM': ('viewport_engine_hybrid', 'ViewportEngine'),
+    'LOW': ('viewport_engine_hybrid', 'ViewportEngine'),
+    'FULL2': ('viewport_engine_2', 'ViewportEngine2'),
+    'HYBRIDPRO': ('viewport_engine_hybridpro', 'ViewportEngine'),
 }
+preview_engine_cls = ('preview_engine', 'PreviewEngine')
+
+
+def get_engine_cls(engine_cls_info):
+    module_name, cls_name = engine_cls_info
+    return getattr(importlib.import_module(f".engine.{module_name}", __name__), cls_name)
 
 
 class RPREngine(bpy.types.RenderEngine):
@@ -105,8 +99,10 @@ class RPREngine(bpy.types.RenderEngine):
     engine: Engine = None
 
     def __del__(self):
-        if isinstance(self.engine, ViewportEngine):
-            self.engine.stop_render()
+        if self.engine:
+            from .engine.viewport_engine import ViewportEngine
+            if isinstance(self.engine, ViewportEngine):
+                self.engine.stop_render()
 
         log('__del__', self.as_pointer())
 
@@ -116,16 +112,23 @@ class RPREngine(bpy.types.RenderEngine):
         """ Called for final render """
         log('update', self.as_pointer())
 
-        # TODO: We create for every view layer separate Engine. We should improve this by implementing sync_update()
+        # TODO: We create for every view layer separate Engine. Only animation frames with Persistent Data
+        #  are updated by sync_update(), view layers and other renders could be updated the same way
         try:
             if self.is_preview:
-                engine_cls = PreviewEngine
+                engine_cls = get_engine_cls(preview_engine_cls)
 
             elif self.is_animation:
-                engine_cls = animation_engine_cls[depsgraph.scene.rpr.final_render_mode]
+                engine_cls = get_engine_cls(animation_engine_cls[depsgraph.scene.rpr.final_render_mode])
+
+                # with enabled Persistent Data Blender keeps this render engine and depsgraph between frames,
+                # in this case scene of previous frame is updated instead of full sync
+                if type(self.engine) == engine_cls and self.engine.can_sync_update(depsgraph):
+                    self.engine.sync_update(depsgraph)
+                    return
 
             else:
-                engine_cls = render_engine_cls[depsgraph.scene.rpr.final_render_mode]
+                engine_cls = get_engine_cls(render_engine_cls[depsgraph.scene.rpr.final_render_mode])
 
             self.engine = engine_cls(self)
             self.engine.sync(depsgraph)
@@ -155,7 +158,7 @@ class RPREngine(bpy.types.RenderEngine):
 
         try:
             # if there is no engine set, create it and do the initial sync
-            engine_cls = viewport_engine_cls[depsgraph.scene.rpr.viewport_render_mode]
+            engine_cls = get_engine_cls(viewport_engine_cls[depsgraph.scene.rpr.viewport_render_mode])
 
             if self.engine and type(self.engine) == engine_cls:
                 self.engine.sync_update(context, depsgraph)
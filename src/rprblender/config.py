@@ -15,6 +15,8 @@
 from .utils import logging
 
 logging.limit_log('', level_show_min=logging.INFO)
+# minimal level of records written to rprblender.log, logging.WARN skips formatting of info records
+logging.set_file_level(logging.INFO)
 
 pyrpr_log_calls = False
 pyrprimagefilters_log_calls = False
@@ -28,6 +30,38 @@ use_opencl = False
 enable_hybrid = True
 enable_hybridpro = True
 
+# available devices are cached in core cache dir and enumerated again only
+# when core, Northstar libraries or GPU drivers are changed
+device_cache = True
+
+# persistent cache of converted images, shared between processes,
+# None dir means $TEMP/rprblender_cache/images, None size limit means unlimited cache
+image_cache_dir = None
+image_cache_size_limit = 4 * 1024 ** 3
+
+# generated Sun & Sky images shared by all engines, size limit in bytes
+sky_image_cache_size = 512 * 1024 ** 2
+
+# viewport texture upload: 'FLOAT', 'HALF_FLOAT' or 'BYTE' (sRGB encoded, clamped to [0, 1]),
+# use_pbo streams uploads through double buffered pixel unpack buffers
+viewport_texture_format = 'FLOAT'
+viewport_use_pbo = False
+
+# materials with the same node subgraphs share exported material nodes
+material_node_cache = True
+
+# number of cached lookup tables of color ramps and curves, shared by all engines
+lut_cache_size = 256
+
+# number of threads processing mesh data in final render sync, 0 means number of CPU cores
+sync_threads = 0
+
+# sync profiler writes JSON report and Chrome trace of every final render sync,
+# None dir means $TEMP/rprblender_profiler
+sync_profiler = False
+sync_profiler_dir = None
+sync_profiler_max_trace_events = 1000000
+
 disable_athena_report = False
 clean_athena_files = True
 
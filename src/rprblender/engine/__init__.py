@@ -12,8 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #********************************************************************
+import json
 import os
+import platform
 import sys
+import time
+from pathlib import Path
 
 from rprblender import config
 from rprblender import utils
@@ -52,69 +56,232 @@ import pyhybrid
 import pyhybridpro
 import pyrpr2
 
+# Core library is loaded at startup, its constants are used by addon properties and nodes.
+# Other libraries and render plugins are loaded on first use, devices are read from cache
 pyrpr.init(rpr_lib_dir, logging.Log(tag='core'), config.pyrpr_log_calls)
 log.info("Core version:", utils.core_ver_str(full=True))
 
-import pyrpr_load_store
-pyrpr_load_store.init(rpr_lib_dir)
 
-import pyrprimagefilters
-pyrprimagefilters.init(rif_lib_dir, logging.Log(tag='rif'), config.pyrprimagefilters_log_calls)
-log.info("RIF version:", utils.rif_ver_str(full=True))
+# render plugins: ContextCls -> (library names by OS, cache dir suffix)
+PLUGINS = {
+    pyrpr2.Context: ({'Windows': 'Northstar64.dll',
+                      'Linux': 'libNorthstar64.so',
+                      'Darwin': 'libNorthstar64.dylib'}, 'rpr2'),
+    pyhybridpro.Context: ({'Windows': 'HybridPro.dll',
+                           'Linux': 'HybridPro.so'}, 'hybridpro'),
+    pyhybrid.Context: ({'Windows': 'Hybrid.dll',
+                        'Linux': 'Hybrid.so'}, 'hybrid'),
+}
 
-from rprblender.utils import helper_lib
-helper_lib.init()
+DEVICES_CACHE_FILE = "devices.json"
 
+# names of initialized libraries
+_initialized_libs = set()
+# plugins which failed to register
+_failed_plugins = set()
+
+
+def init_rif():
+    """ Loads RadeonImageFilters library on first call, returns pyrprimagefilters module """
+    import pyrprimagefilters
+    if 'rif' in _initialized_libs:
+        return pyrprimagefilters
+
+    time_begin = time.perf_counter()
+    pyrprimagefilters.init(rif_lib_dir, logging.Log(tag='rif'), config.pyrprimagefilters_log_calls)
+    _initialized_libs.add('rif')
+    log.info("RIF version:", utils.rif_ver_str(full=True),
+             f"loaded in {time.perf_counter() - time_begin:.3f} sec")
+
+    return pyrprimagefilters
+
+
+def init_load_store():
+    """ Loads RprLoadStore library on first call, returns pyrpr_load_store module """
+    import pyrpr_load_store
+    if 'load_store' in _initialized_libs:
+        return pyrpr_load_store
+
+    pyrpr_load_store.init(rpr_lib_dir)
+    _initialized_libs.add('load_store')
+    log("Loaded RprLoadStore library")
+
+    return pyrpr_load_store
+
+
+def get_plugin_lib_path(ContextCls):
+    lib_name = PLUGINS[ContextCls][0].get(utils.OS, None)
+    if not lib_name:
+        return None
 
-def register_plugins():
     rprsdk_bin_path = utils.package_root_dir() if not utils.IS_DEBUG_MODE else \
         utils.package_root_dir().parent.parent / '.sdk/rpr/bin'
+    return rprsdk_bin_path / lib_name
+
+
+def is_plugin_available(ContextCls):
+    """
+    Checks if render plugin could be used. Plugin isn't registered here,
+    it is registered by register_plugin() before creating its first context
+    """
+    if ContextCls.plugin_id >= 0:
+        return True
+
+    if ContextCls not in PLUGINS or ContextCls in _failed_plugins:
+        return False
 
-    def register_plugin(ContextCls, lib_name, cache_path):
-        lib_path = rprsdk_bin_path / lib_name
+    if ContextCls is pyhybridpro.Context and not pyhybridpro.enabled or \
+            ContextCls is pyhybrid.Context and not pyhybrid.enabled:
+        return False
+
+    lib_path = get_plugin_lib_path(ContextCls)
+    return bool(lib_path) and lib_path.is_file()
+
+
+def register_plugin(ContextCls):
+    """ Registers render plugin of ContextCls if it isn't registered yet """
+    if ContextCls.plugin_id >= 0 or ContextCls not in PLUGINS:
+        return
+
+    if not is_plugin_available(ContextCls):
+        raise RuntimeError("Render plugin is not available", ContextCls.__module__)
+
+    lib_path = get_plugin_lib_path(ContextCls)
+    cache_path = utils.core_cache_dir() / f"{hex(pyrpr.API_VERSION)}_{PLUGINS[ContextCls][1]}"
+
+    time_begin = time.perf_counter()
+    try:
         ContextCls.register_plugin(lib_path, cache_path)
-        log(f"Registered plugin: plugin_id={ContextCls.plugin_id}, "
-                  f"lib_path={lib_path}, cache_path={cache_path}")
 
-    cache_dir = utils.core_cache_dir()
+    except RuntimeError:
+        _failed_plugins.add(ContextCls)
+        raise
+
+    log(f"Registered plugin: plugin_id={ContextCls.plugin_id}, lib_path={lib_path}, "
+        f"cache_path={cache_path}, time={time.perf_counter() - time_begin:.3f} sec")
+
+
+def _get_drivers_info():
+    """ Returns versions of installed GPU drivers, which are available without loading them """
+    info = []
+
+    if utils.IS_WIN:
+        import winreg
+
+        # display adapters device class
+        class_key = r"SYSTEM\CurrentControlSet\Control\Class\{4d36e968-e325-11ce-bfc1-08002be10318}"
+        try:
+            with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, class_key) as key:
+                for i in range(winreg.QueryInfoKey(key)[0]):
+                    try:
+                        with winreg.OpenKey(key, winreg.EnumKey(key, i)) as adapter_key:
+                            info.append([winreg.QueryValueEx(adapter_key, 'DriverDesc')[0],
+                                         winreg.QueryValueEx(adapter_key, 'DriverVersion')[0]])
+                    except OSError:
+                        # not an adapter key, like 'Properties'
+                        pass
+
+        except OSError as err:
+            log.warn("Unable to read display drivers info:", err)
+
+    elif utils.IS_LINUX:
+        paths = [Path('/proc/driver/nvidia/version'), Path('/sys/module/amdgpu/version'),
+                 Path('/sys/module/i915/version')]
+        for card_path in sorted(Path('/sys/class/drm').glob('card[0-9]')):
+            paths += [card_path / 'device/vendor', card_path / 'device/device']
+
+        for path in paths:
+            try:
+                info.append([str(path), path.read_text().strip()])
+            except OSError:
+                pass
+
+    else:
+        # Metal drivers are updated with OS
+        info.append(platform.mac_ver()[0])
+
+    return info
+
+
+def _get_devices_cache_key():
+    """ Cached devices are valid while core, Northstar libraries and GPU drivers are the same """
+    lib_path = get_plugin_lib_path(pyrpr2.Context)
+    stat = lib_path.stat()
+    return {
+        'core': utils.core_ver_str(full=True),
+        'api_version': pyrpr.API_VERSION,
+        'plugin': [str(lib_path), stat.st_size, stat.st_mtime_ns],
+        'drivers': _get_drivers_info(),
+    }
+
+
+def _set_devices(cpu_device, gpu_devices):
+    pyrpr2.Context.cpu_device = pyrpr.Context.cpu_device = cpu_device
+    pyrpr2.Context.gpu_devices = pyrpr.Context.gpu_devices = gpu_devices
+
+
+def load_devices():
+    """
+    Sets available devices of pyrpr.Context. Devices are enumerated by Northstar plugin
+    only if devices cache is absent or outdated, config.device_cache disables the cache
+    """
+    if not is_plugin_available(pyrpr2.Context):
+        log.warn("Unable to load devices, Northstar plugin is not available")
+        return
+
+    time_begin = time.perf_counter()
+    cache_path = utils.core_cache_dir() / DEVICES_CACHE_FILE
+    key = _get_devices_cache_key() if config.device_cache else None
+
+    if key:
+        try:
+            with open(cache_path) as f:
+                data = json.load(f)
+
+            if data['key'] == key:
+                _set_devices(data['cpu_device'], data['gpu_devices'])
+                log(f"Loaded cached devices: cpu={pyrpr.Context.cpu_device}, "
+                    f"gpu={pyrpr.Context.gpu_devices}, time={time.perf_counter() - time_begin:.3f} sec")
+                return
+
+        except FileNotFoundError:
+            pass
+
+        except (OSError, ValueError, KeyError, TypeError) as err:
+            log.warn("Unable to read devices cache", cache_path, err)
 
-    # enabling RPR 2
     try:
-        register_plugin(pyrpr2.Context,
-                        {'Windows': 'Northstar64.dll',
-                         'Linux': 'libNorthstar64.so',
-                         'Darwin': 'libNorthstar64.dylib'}[utils.OS],
-                        cache_dir / f"{hex(pyrpr.API_VERSION)}_rpr2")
+        register_plugin(pyrpr2.Context)
+
     except RuntimeError as err:
         log.warn(err)
+        return
 
-    # enabling HybridPro for Windows and Linux
-    pyhybridpro.enabled = config.enable_hybridpro and (utils.IS_WIN or utils.IS_LINUX)
-    if pyhybridpro.enabled:
-        try:
-            register_plugin(pyhybridpro.Context,
-                            {'Windows': 'HybridPro.dll',
-                             'Linux': 'HybridPro.so'}[utils.OS],
-                            cache_dir / f"{hex(pyrpr.API_VERSION)}_hybridpro")
-        except RuntimeError as err:
-            log.warn(err)
-            pyhybridpro.enabled = False
-
-    # enabling Hybrid only for Windows and Linux if HybridPro is disabled
-    pyhybrid.enabled = not pyhybridpro.enabled and config.enable_hybrid and (utils.IS_WIN or utils.IS_LINUX)
-    if pyhybrid.enabled:
-        try:
-            register_plugin(pyhybrid.Context,
-                            {'Windows': 'Hybrid.dll',
-                             'Linux': 'Hybrid.so'}[utils.OS],
-                            cache_dir / f"{hex(pyrpr.API_VERSION)}_hybrid")
-        except RuntimeError as err:
-            log.warn(err)
-            pyhybrid.enabled = False
+    pyrpr2.Context.load_devices()
+    log(f"Loaded devices: cpu={pyrpr.Context.cpu_device}, gpu={pyrpr.Context.gpu_devices}, "
+        f"time={time.perf_counter() - time_begin:.3f} sec")
+
+    if not key:
+        return
+
+    # cache is written to temporary file and renamed, so other Blender process doesn't read partial file
+    temp_path = cache_path.with_name(f"{cache_path.name}.{utils.PID}.tmp")
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(temp_path, 'w') as f:
+            json.dump({'key': key, 'cpu_device': pyrpr.Context.cpu_device,
+                       'gpu_devices': pyrpr.Context.gpu_devices}, f, indent=2)
+        os.replace(temp_path, cache_path)
 
+    except OSError as err:
+        log.warn("Unable to write devices cache", cache_path, err)
+        if temp_path.is_file():
+            temp_path.unlink()
 
 
-register_plugins()
+# enabling HybridPro for Windows and Linux, Hybrid is enabled only if HybridPro isn't available
+pyhybridpro.enabled = config.enable_hybridpro and (utils.IS_WIN or utils.IS_LINUX) and \
+    is_plugin_available(pyhybridpro.Context)
+pyhybrid.enabled = not pyhybridpro.enabled and config.enable_hybrid and (utils.IS_WIN or utils.IS_LINUX)
 
-pyrpr2.Context.load_devices()
-log(f"Loaded devices: cpu={pyrpr.Context.cpu_device}, gpu={pyrpr.Context.gpu_devices}")
+load_devices()
@@ -3,22 +3,333 @@
 # Licensed under the Apache License, Version 2.0 (the "License");
 # you may not use this file except in compliance with the License.
 # You may obtain a copy of the License at
-# 
+#
 #     http://www.apache.org/licenses/LICENSE-2.0
-# 
+#
 # Unless required by applicable law or agreed to in writing, software
 # distributed under the License is distributed on an "AS IS" BASIS,
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #********************************************************************
+import bpy
+import pyrpr
+
 from .render_engine import RenderEngine
 from .render_engine_2 import RenderEngine2
+from rprblender.export import object, instance, particle, material
+
+from rprblender.utils import logging
+log = logging.Log(tag='AnimationEngine')
 
 
 class AnimationEngine(RenderEngine):
-    pass
+    """
+    Final render engine for animation.
+
+    With enabled Persistent Data (scene.render.use_persistent_data) Blender keeps render engine
+    and its depsgraph between frames. In this case rpr_context is kept as well and next frame
+    is synced by sync_update(), which re-exports only data changed in depsgraph.updates.
+    """
+
+    def __init__(self, rpr_engine):
+        super().__init__(rpr_engine)
+
+        self.is_last_frame = False
+        self.is_persistent = False
+        self.sync_settings = None
+
+        # depsgraph updates of the current frame, None means full scene sync
+        self.updated_objects = None
+        self.updated_materials = None
+        self.synced_shared_materials = None
+
+    def _get_sync_settings(self, depsgraph):
+        """ Settings which require full scene sync when changed """
+        scene = depsgraph.scene
+        material_override = depsgraph.view_layer.material_override
+
+        return (
+            scene.name, depsgraph.view_layer.name,
+            scene.render.resolution_x, scene.render.resolution_y, scene.render.resolution_percentage,
+            scene.render.use_border, scene.render.border_min_x, scene.render.border_min_y,
+            scene.render.border_max_x, scene.render.border_max_y,
+            scene.rpr.is_tile_render_available, scene.rpr.tile_x, scene.rpr.tile_y,
+            material_override.name_full if material_override else None,
+        )
+
+    def _init_rpr_context(self, scene):
+        if self.updated_objects is None:
+            super()._init_rpr_context(scene)
+
+            # deformed meshes of next frames are recreated with topology of previous frame
+            self.rpr_context.cache_mesh_topology = scene.render.use_persistent_data
+
+    def sync(self, depsgraph):
+        super().sync(depsgraph)
+
+        scene = depsgraph.scene
+        # with frame_step > 1 the last rendered frame could be less than frame_end
+        self.is_last_frame = scene.frame_current + scene.frame_step > scene.frame_end
+
+        # motion blur data is cached by switching scene frame, such scene can't be updated incrementally
+        self.is_persistent = self.is_synced and scene.render.use_persistent_data and \
+            not self.rpr_context.do_motion_blur
+        self.sync_settings = self._get_sync_settings(depsgraph) if self.is_persistent else None
+
+    def can_sync_update(self, depsgraph):
+        return self.is_persistent and self.rpr_context is not None \
+            and depsgraph.scene.render.use_persistent_data \
+            and self.sync_settings == self._get_sync_settings(depsgraph)
+
+    def sync_update(self, depsgraph):
+        """ Updates scene of previous frame by depsgraph updates of current frame """
+        log('Start sync_update', depsgraph.scene.frame_current)
+
+        self.updated_objects = {}
+        self.updated_materials = set()
+        self.synced_shared_materials = set()
+        updated_images = set()
+        updated_lights = set()
+
+        for update in depsgraph.updates:
+            if isinstance(update.id, bpy.types.Object):
+                self.updated_objects[object.key(update.id)] = \
+                    (update.is_updated_geometry, update.is_updated_transform)
+
+            elif isinstance(update.id, bpy.types.Material):
+                self.updated_materials.add(update.id.name_full)
+
+            elif isinstance(update.id, bpy.types.Image):
+                updated_images.add(update.id.name)
+
+            elif isinstance(update.id, bpy.types.Light):
+                updated_lights.add(update.id.name_full)
+
+        for obj in self.depsgraph_objects(depsgraph):
+            # light data changes are exported as light geometry update
+            if obj.type == 'LIGHT' and obj.data.name_full in updated_lights:
+                obj_key = object.key(obj)
+                self.updated_objects[obj_key] = (True, self.updated_objects.get(obj_key, (False, False))[1])
+
+            for slot in obj.material_slots:
+                if slot.material and self._is_material_animated(slot.material, updated_images):
+                    self.updated_materials.add(slot.material.name_full)
+
+        # images are exported by name and frame number, remove them to export actual image data
+        for image_key in tuple(self.rpr_context.images.keys()):
+            if image_key[0] in updated_images:
+                self.rpr_context.remove_image(image_key)
+
+        log("Updated objects", tuple(self.updated_objects.keys()))
+        log("Updated materials", self.updated_materials)
+
+        try:
+            self.sync(depsgraph)
+            self.rpr_context.log_mesh_updates()
+
+        finally:
+            self.updated_objects = None
+            self.updated_materials = None
+            self.synced_shared_materials = None
+
+    def _is_material_animated(self, mat, updated_images):
+        """
+        Checks if material uses updated images. Depsgraph doesn't provide updates for
+        ShaderNodeTexImage with image sequence, such images are also added to updated_images
+        """
+        if not mat.node_tree:
+            return False
+
+        is_animated = False
+        for node in material.get_material_nodes_by_type(mat, 'ShaderNodeTexImage'):
+            if not node.image:
+                continue
+
+            if node.image.source == 'SEQUENCE' and node.image_user.use_auto_refresh:
+                updated_images.add(node.image.name)
+
+            is_animated |= node.image.name in updated_images
+
+        return is_animated
+
+    def sync_objects(self, depsgraph, material_override):
+        if self.updated_objects is None:
+            return super().sync_objects(depsgraph, material_override)
+
+        scene = depsgraph.scene
+        view_layer = depsgraph.view_layer
+
+        depsgraph_keys = set()
+        for obj in self.depsgraph_objects(depsgraph):
+            obj_key = object.key(obj)
+            depsgraph_keys.add(obj_key)
+
+            indirect_only = obj.original.indirect_only_get(view_layer=view_layer)
+            kwargs = {
+                'indirect_only': indirect_only,
+                'material_override': material_override,
+                'frame_current': scene.frame_current,
+            }
+
+            if obj_key not in self.rpr_context.objects:
+                object.sync(self.rpr_context, obj, **kwargs)
+
+            else:
+                is_material_updated = self._sync_update_materials(obj, material_override)
+                if obj_key in self.updated_objects or is_material_updated:
+                    is_updated_geometry, is_updated_transform = \
+                        self.updated_objects.get(obj_key, (False, False))
+                    object.sync_update(self.rpr_context, obj, is_updated_geometry, is_updated_transform,
+                                       **kwargs)
+
+            if self.rpr_engine.test_break():
+                log.warn("Syncing stopped by user termination")
+                return False
+
+        # removing objects which are not present in depsgraph anymore,
+        # invisible shapes are kept as they could be used by instances
+        keys_to_remove = tuple(
+            key for key, obj in self.rpr_context.objects.items()
+            if isinstance(key, str) and key not in depsgraph_keys
+            and not isinstance(obj, pyrpr.Camera)
+            and (not isinstance(obj, pyrpr.Shape) or obj.is_visible)
+        )
+        for key in keys_to_remove:
+            if key in self.rpr_context.objects:
+                self.rpr_context.remove_object(key)
+
+        return True
+
+    def _sync_update_materials(self, obj, material_override):
+        """ Recreates updated materials of object, returns True if any material was updated """
+        if material_override:
+            materials = (material_override,)
+        else:
+            materials = set(slot.material for slot in obj.material_slots if slot.material)
+
+        is_updated = False
+        for mat in materials:
+            if mat.name_full not in self.updated_materials:
+                continue
+
+            is_updated = True
+
+            # material which doesn't depend on object is shared by all users, it is recreated only once
+            if mat.name_full in self.synced_shared_materials:
+                continue
+
+            material.sync_update(self.rpr_context, mat, obj=obj)
+            material.sync_update(self.rpr_context, mat, 'Volume', obj=obj)
+
+            if not material.is_object_dependent(self.rpr_context, mat):
+                self.synced_shared_materials.add(mat.name_full)
+
+        return is_updated
+
+    def sync_instances(self, depsgraph, material_override):
+        if self.updated_objects is None:
+            return super().sync_instances(depsgraph, material_override)
+
+        scene = depsgraph.scene
+        view_layer = depsgraph.view_layer
+
+        depsgraph_keys = set()
+        for inst in self.depsgraph_instances(depsgraph):
+            if not isinstance(inst.instance_object.original.data, type(inst.object.data)):
+                continue
+
+            inst_key = instance.key(inst)
+            depsgraph_keys.add(inst_key)
+
+            parent_update = self.updated_objects.get(object.key(inst.parent), None)
+            object_update = self.updated_objects.get(object.key(inst.object), None)
+            if inst_key in self.rpr_context.objects and not parent_update and not object_update:
+                continue
+
+            # instance transform depends on parent and instanced object
+            is_updated_geometry = bool(object_update and object_update[0])
+            is_updated_transform = True
+
+            indirect_only = inst.parent.original.indirect_only_get(view_layer=view_layer)
+            instance.sync_update(self.rpr_context, inst, is_updated_geometry, is_updated_transform,
+                                 indirect_only=indirect_only, material_override=material_override,
+                                 frame_current=scene.frame_current)
+
+            if self.rpr_engine.test_break():
+                log.warn("Syncing stopped by user termination")
+                return False
+
+        # instance key is (parent key, random_id)
+        keys_to_remove = tuple(
+            key for key in self.rpr_context.objects.keys()
+            if isinstance(key, tuple) and isinstance(key[0], str) and isinstance(key[1], int)
+            and key not in depsgraph_keys
+        )
+        for key in keys_to_remove:
+            if key in self.rpr_context.objects:
+                self.rpr_context.remove_object(key)
+
+        return True
+
+    def sync_particles(self, depsgraph):
+        if self.updated_objects is None:
+            return super().sync_particles(depsgraph)
+
+        self.notify_status(0, "Syncing particles")
+
+        emitters = {}
+        for obj in self.depsgraph_objects(depsgraph):
+            emitters[object.key(obj)] = obj
+
+        # objects linked to scene as a collection are instanced, so walk thru them for particles
+        for entry in self.depsgraph_instances(depsgraph):
+            emitters[object.key(entry.instance_object)] = entry.instance_object
+
+        particle_keys = set()
+        for obj_key, obj in emitters.items():
+            keys = set(particle.key(p_sys, obj) for p_sys in particle.emitter_p_sys(obj))
+            if not keys:
+                continue
+
+            particle_keys |= keys
+            if obj_key not in self.updated_objects and all(k in self.rpr_context.objects for k in keys):
+                continue
+
+            # particle instances are created or removed only if number of alive particles changes
+            particle.sync_update(self.rpr_context, obj, True, True)
+
+            if self.rpr_engine.test_break():
+                log.warn("Syncing stopped by user termination")
+                return False
+
+        # removing particle systems which are not present in depsgraph anymore,
+        # particle system key is (emitter key, particle system name)
+        self._remove_particles(set(
+            key for key, obj in self.rpr_context.objects.items()
+            if isinstance(key, tuple) and isinstance(key[0], str) and isinstance(key[1], str)
+            and isinstance(obj, pyrpr.Mesh) and key not in particle_keys
+        ))
+
+        return True
+
+    def _remove_particles(self, particle_keys):
+        """ Removes particle system master shapes and their instances """
+        for particle_key in particle_keys:
+            for key in tuple(self.rpr_context.child_object_keys.get(particle_key, ())):
+                self.rpr_context.remove_object(key)
+
+            if particle_key in self.rpr_context.objects:
+                self.rpr_context.remove_object(particle_key)
+
+    def stop_render(self):
+        # keeping rpr_context and image filters for the next frame
+        if self.is_persistent and not self.is_last_frame and not self.rpr_engine.test_break():
+            return
+
+        self.is_persistent = False
+        super().stop_render()
 
 
-class AnimationEngine2(RenderEngine2):
+class AnimationEngine2(AnimationEngine, RenderEngine2):
     pass
@@ -13,11 +13,46 @@
 # limitations under the License.
 #********************************************************************
 import threading
+import weakref
+import numpy as np
 
 import pyrpr
 import pyrpr2
 
-from rprblender.utils.conversion import get_cryptomatte_name, get_cryptomatte_hash
+from rprblender.utils.conversion import get_cryptomatte_hashes
+from rprblender.engine import register_plugin
+
+from rprblender.utils import profiler
+from rprblender.utils import logging
+log = logging.Log(tag='context')
+
+
+# AOV consumers, they define when resolved AOV frame buffer is needed
+AOV_CONSUMER_DISPLAY = 'DISPLAY'        # progressive display, every render update
+AOV_CONSUMER_FINAL = 'FINAL'            # final render result only
+AOV_CONSUMER_DENOISER = 'DENOISER'      # image filter input
+AOV_CONSUMER_EXPORT = 'EXPORT'          # scene export, never resolved by render
+
+PROGRESSIVE_CONSUMERS = frozenset((AOV_CONSUMER_DISPLAY,))
+
+
+def _add_index_key(index, parent_key, key):
+    keys = index.get(parent_key, None)
+    if keys is None:
+        index[parent_key] = {key}
+    else:
+        keys.add(key)
+
+
+def _remove_index_key(index, parent_key, key):
+    keys = index.get(parent_key, None)
+    if keys is None:
+        return
+
+    keys.discard(key)
+    if not keys:
+        del index[parent_key]
+
 
 class RPRContext:
     """ Manager of pyrpr calls """
@@ -64,9 +99,29 @@ class RPRContext:
         self.objects = {}
         self.mesh_masters = {}
         self.object_hashes = {}
+
+        # geometry content instancing: fingerprint -> (key, pyrpr.Mesh)
+        self.geometry_instancing = False
+        self.mesh_fingerprints = {}
+        self.instanced_geometry_count = 0
+        self.instanced_geometry_size = 0
+
+        # MeshData topology of exported meshes by object key, it is kept by engines with
+        # incremental updates to recreate deformed meshes without rebuilding index arrays
+        self.cache_mesh_topology = False
+        self.mesh_topology = {}
+        self.mesh_update_stats = self._init_mesh_update_stats()
+
         self.curves = {}
         self.volumes = {}
 
+        # secondary indexes of objects, curves and volumes: parent key -> set of keys.
+        # Tuple keys of instances, particles, curves and volumes start with parent object key
+        self.child_object_keys = {}
+        self.mesh_instance_keys = {}    # id(mesh) -> keys of its instances
+        self.curve_keys = {}
+        self.volume_keys = {}
+
         self.do_motion_blur = False
         self.engine_type = None
         
@@ -78,12 +133,33 @@ class RPRContext:
         self.material_nodes = {}
         self.material_nodes_hashes = {}
         self.materials = {}
+        # material name: bool, if material export depends on the object it is assigned to
+        self.material_object_dependency = {}
+
+        # secondary indexes of materials and nodes: material key -> set of child material/node keys
+        self.child_material_keys = {}
+        self.material_node_keys = {}
+
+        # material nodes shared by materials with the same node subgraph: structure key -> node,
+        # nodes are kept alive by materials using them. Secondary index: material name -> structure keys
+        self.material_node_structures = weakref.WeakValueDictionary()
+        self.material_node_structure_keys = {}
+
+        # arithmetic nodes by operation and operands, identical operations reuse existing node
+        self.arithmetic_nodes = weakref.WeakValueDictionary()
 
         self.images = {}
         self.post_effect = None
 
         # list of frame buffers for AOVs
         self.frame_buffers_aovs = {}
+        # preallocated buffers to read frame buffers data: (aov_type, width, height) -> np.array
+        self.readback_buffers = {}
+        # aov_type -> set of AOV_CONSUMER_*, resolve(consumers=...) resolves only AOVs needed by consumers
+        self.aov_consumers = {}
+        self.resolve_stats = {'resolved': 0, 'skipped': 0}
+        # incremented by every render() and resize, tells if resolved image could be changed
+        self.render_generation = 0
 
         # shadow and reflection catchers
         self.composite = None
@@ -95,6 +171,8 @@ class RPRContext:
         self.texture_compression = False
 
     def init(self, context_flags, context_props):
+        # render plugin is registered by first created context
+        register_plugin(self._Context)
         self.context = self._Context(context_flags, context_props)
         self.material_system = pyrpr.MaterialSystem(self.context)
         self.gl_interop = pyrpr.CREATION_FLAGS_ENABLE_GL_INTEROP in context_flags
@@ -128,8 +206,27 @@ class RPRContext:
         self.curves = {}
         self.volumes = {}
 
+        self.mesh_fingerprints = {}
+        self.instanced_geometry_count = 0
+        self.instanced_geometry_size = 0
+
+        self.mesh_topology = {}
+
+        self.child_object_keys = {}
+        self.mesh_instance_keys = {}
+        self.curve_keys = {}
+        self.volume_keys = {}
+
         self.material_nodes = {}
         self.materials = {}
+        self.material_object_dependency = {}
+
+        self.child_material_keys = {}
+        self.material_node_keys = {}
+
+        self.material_node_structures = weakref.WeakValueDictionary()
+        self.material_node_structure_keys = {}
+        self.arithmetic_nodes = weakref.WeakValueDictionary()
 
         self.images = {}
 
@@ -145,11 +242,28 @@ class RPRContext:
         else:
             self.context.render_tile(*tile)
 
+        self.render_generation += 1
+
     def abort_render(self):
         self.context.abort_render()
 
-    def get_image(self, aov_type=None):
-        return self.get_frame_buffer(aov_type).get_data()
+    def get_image(self, aov_type=None, buf=None):
+        """ Returns frame buffer data, fills buf in place if provided """
+        return self.get_frame_buffer(aov_type).get_data(buf)
+
+    def get_pooled_image(self, aov_type=None):
+        """
+        Returns frame buffer data read into preallocated buffer. The buffer is reused by next call
+        with the same aov_type and resolution, therefore returned image has to be consumed before it
+        """
+        fb = self.get_frame_buffer(aov_type)
+        buf_key = (aov_type, fb.width, fb.height)
+        buf = self.readback_buffers.get(buf_key, None)
+        if buf is None:
+            buf = np.empty((fb.height, fb.width, fb.channels), dtype=np.float32)
+            self.readback_buffers[buf_key] = buf
+
+        return fb.get_data(buf)
 
     def set_integrator(self, use_contour_integrator):
         integrator = "gpucontour" if use_contour_integrator else "gpusimple"
@@ -167,18 +281,50 @@ class RPRContext:
 
         return self.frame_buffers_aovs[pyrpr.AOV_COLOR]['res']
 
-    def resolve(self, aovs=None):
-        if aovs:
-            for aov in aovs:
-                fbs = self.frame_buffers_aovs[aov]
-                fbs['aov'].resolve(fbs['res'], aov != pyrpr.AOV_SHADOW_CATCHER)
-        else:
-            for aov, fbs in self.frame_buffers_aovs.items():
-                fbs['aov'].resolve(fbs['res'], aov != pyrpr.AOV_SHADOW_CATCHER)
+    def resolve(self, aovs=None, consumers=None):
+        """ Resolves AOVs, if consumers are set only AOVs needed by any of them are resolved """
+        if not aovs:
+            aovs = tuple(self.frame_buffers_aovs.keys())
+
+        resolved = 0
+        for aov in aovs:
+            if consumers is not None and not self.is_aov_consumed(aov, consumers):
+                continue
+
+            fbs = self.frame_buffers_aovs[aov]
+            fbs['aov'].resolve(fbs['res'], aov != pyrpr.AOV_SHADOW_CATCHER)
+            resolved += 1
+
+        self.resolve_stats['resolved'] += resolved
+        self.resolve_stats['skipped'] += len(aovs) - resolved
 
         self.apply_filters()
 
-    def enable_aov(self, aov_type):
+    def is_aov_consumed(self, aov_type, consumers):
+        """ Checks if AOV is needed by any of consumers """
+        return not self.aov_consumers.get(aov_type, PROGRESSIVE_CONSUMERS).isdisjoint(consumers)
+
+    def get_aovs_not_consumed(self, consumers):
+        """ Returns enabled AOVs which are not needed by consumers """
+        return tuple(aov for aov in self.frame_buffers_aovs.keys()
+                     if not self.is_aov_consumed(aov, consumers))
+
+    def log_resolve_stats(self):
+        """ Logs and resets statistics of AOV resolves """
+        stats = self.resolve_stats
+        log.info(f"AOV resolves: {stats['resolved']}, skipped: {stats['skipped']}")
+        self.resolve_stats = {'resolved': 0, 'skipped': 0}
+
+    def _add_aov_consumer(self, aov_type, consumer):
+        consumers = self.aov_consumers.get(aov_type, None)
+        if consumers is None:
+            self.aov_consumers[aov_type] = {consumer}
+        else:
+            consumers.add(consumer)
+
+    def enable_aov(self, aov_type, consumer=AOV_CONSUMER_DISPLAY):
+        """ Enables AOV, consumer defines when AOV is resolved, see AOV_CONSUMER_* """
+        self._add_aov_consumer(aov_type, consumer)
         if self.is_aov_enabled(aov_type):
             return
 
@@ -199,6 +345,10 @@ class RPRContext:
     def disable_aov(self, aov_type):
         self.context.detach_aov(aov_type)
         del self.frame_buffers_aovs[aov_type]
+        self.aov_consumers.pop(aov_type, None)
+
+        for buf_key in tuple(k for k in self.readback_buffers.keys() if k[0] == aov_type):
+            del self.readback_buffers[buf_key]
 
     def disable_aovs(self):
         for aov_type in tuple(self.frame_buffers_aovs.keys()):
@@ -211,6 +361,10 @@ class RPRContext:
         self.context.set_aov_index_lookup(key, r, g, b, a)
 
     def resize(self, width, height):
+        if (self.width, self.height) != (width, height):
+            self.readback_buffers = {}
+            self.render_generation += 1
+
         self.width = width
         self.height = height
 
@@ -235,17 +389,13 @@ class RPRContext:
             self._sync_obj_hash()
 
     def _sync_obj_hash(self):
-        for key, value in self.objects.items():
-            if not isinstance(value, (pyrpr.Mesh, pyrpr.Instance)):
-                continue
-
-            key = str(key)
-            self.object_hashes[get_cryptomatte_name(key)] = get_cryptomatte_hash(key)
+        self.object_hashes = get_cryptomatte_hashes(
+            key for key, value in self.objects.items()
+            if isinstance(value, (pyrpr.Mesh, pyrpr.Instance)))
 
     def _sync_mat_hash(self):
-        for key in self.material_nodes.keys():
-            key = str(key[0][0])
-            self.material_nodes_hashes[get_cryptomatte_name(key)] = get_cryptomatte_hash(key)
+        self.material_nodes_hashes = get_cryptomatte_hashes(
+            key[0][0] for key in self.material_nodes.keys())
 
     def sync_catchers(self, use_transparent_background=None):
         prev_state = (self.use_shadow_catcher, self.use_reflection_catcher,
@@ -399,9 +549,10 @@ class RPRContext:
     # OBJECT'S CREATION FUNCTIONS
     #
     def create_empty_object(self, key):
-        self.objects[key] = None
+        self._set_object(key, None)
         return None
 
+    @profiler.profile('context.create_light')
     def create_light(self, key, light_type):
         if light_type == 'point':
             light = self._PointLight(self.context)
@@ -418,12 +569,13 @@ class RPRContext:
         else:
             raise KeyError("No such light type", light_type)
 
-        self.objects[key] = light
+        self._set_object(key, light)
         return light
 
     def create_environment_light(self):
         return self._EnvironmentLight(self.context)
 
+    @profiler.profile('context.create_area_light')
     def create_area_light(
             self, key,
             vertices, normals, uvs,
@@ -438,9 +590,10 @@ class RPRContext:
             {}
         )
         light = self._AreaLight(mesh, self.material_system)
-        self.objects[key] = light
+        self._set_object(key, light)
         return light
 
+    @profiler.profile('context.create_mesh', count_bytes=True)
     def create_mesh(
             self, key,
             vertices, normals, uvs,
@@ -455,44 +608,76 @@ class RPRContext:
             num_face_vertices,
             mesh_info
         )
-        self.objects[key] = mesh
+        self._set_object(key, mesh)
         return mesh
 
+    @profiler.profile('context.create_instance')
     def create_instance(self, key, mesh):
         instance = self._Instance(self.context, mesh)
-        self.objects[key] = instance
+        self._set_object(key, instance)
         return instance
 
+    @profiler.profile('context.create_curve', count_bytes=True)
     def create_curve(self, key, control_points, points_radii, uvs):
         curve = self._Curve(self.context, control_points, points_radii, uvs)
         self.curves[key] = curve
+        _add_index_key(self.curve_keys, key[0], key)
         return curve
 
+    @profiler.profile('context.create_curve_object')
     def create_curve_object(self, key, control_points, points_radii, uvs):
         curve = self._Curve(self.context, control_points, points_radii, uvs)
-        self.objects[key] = curve
+        self._set_object(key, curve)
         return curve
 
+    @profiler.profile('context.create_hetero_volume')
     def create_hetero_volume(self, key):
         volume = self._HeteroVolume(self.context)
         self.volumes[key] = volume
+        _add_index_key(self.volume_keys, key[0], key)
         return volume
 
     def create_camera(self, key=None):
         camera = self._Camera(self.context)
         if key:
-            self.objects[key] = camera
+            self._set_object(key, camera)
         return camera
 
+    @profiler.profile('context.create_material_node')
     def create_material_node(self, material_type):
         return self._MaterialNode(self.material_system, material_type)
 
     def set_material_node_key(self, key, material_node):
         self.material_nodes[key] = material_node
+        _add_index_key(self.material_node_keys, key[0], key)
+
+    def remove_material_nodes(self, material_key):
+        for node_key in self.material_node_keys.pop(material_key, ()):
+            del self.material_nodes[node_key]
+
+    def get_material_node_structure(self, material_name, structure_key):
+        """ Returns node exported for the same node subgraph, it is linked to material_name """
+        material_node = self.material_node_structures.get(structure_key, None)
+        if material_node is not None:
+            _add_index_key(self.material_node_structure_keys, material_name, structure_key)
+
+        return material_node
+
+    def set_material_node_structure(self, material_name, structure_key, material_node):
+        self.material_node_structures[structure_key] = material_node
+        _add_index_key(self.material_node_structure_keys, material_name, structure_key)
+
+    def remove_material_node_structures(self, material_name):
+        """ Removes shared nodes used by material, so they are exported again after material update """
+        for structure_key in self.material_node_structure_keys.pop(material_name, ()):
+            self.material_node_structures.pop(structure_key, None)
 
     def set_material_node_as_material(self, key, material_node):
         self.materials[key] = material_node
+        if isinstance(key, tuple):
+            _add_index_key(self.child_material_keys, key[0], key)
 
+    @profiler.profile('context.create_image_file')
     def create_image_file(self, key, filepath):
         image = self._ImageFile(self.context, filepath)
         image.set_compression(self.texture_compression)
@@ -500,6 +685,7 @@ class RPRContext:
             self.images[key] = image
         return image
 
+    @profiler.profile('context.create_image_data', count_bytes=True)
     def create_image_data(self, key, data):
         image = self._ImageData(self.context, data)
         image.set_compression(self.texture_compression)
@@ -511,6 +697,7 @@ class RPRContext:
         # Tiled images are unsupported by Tahoe
         return None
 
+    @profiler.profile('context.create_buffer', count_bytes=True)
     def create_buffer(self, data, dtype):
         return pyrpr.Buffer(self.context, data, dtype)
 
@@ -522,9 +709,11 @@ class RPRContext:
 
         return composite
 
+    @profiler.profile('context.create_grid_from_3d_array', count_bytes=True)
     def create_grid_from_3d_array(self, data):
         return self._Grid.init_from_3d_array(self.context, data)
 
+    @profiler.profile('context.create_grid_from_array_indices', count_bytes=True)
     def create_grid_from_array_indices(self, x, y, z, data, indices):
         return self._Grid.init_from_array_indices(self.context, x, y, z, data, indices)
 
@@ -547,15 +736,34 @@ class RPRContext:
 
         raise ValueError("Incorrect value_type for RPRContext.get_info", value_type)
 
+    def _set_object(self, key, obj):
+        if key in self.objects:
+            self._pop_object(key)
+
+        self.objects[key] = obj
+        if isinstance(key, tuple):
+            _add_index_key(self.child_object_keys, key[0], key)
+        if isinstance(obj, pyrpr.Instance):
+            _add_index_key(self.mesh_instance_keys, id(obj.mesh), key)
+
+    def _pop_object(self, key):
+        obj = self.objects.pop(key)
+        self.mesh_topology.pop(key, None)
+
+        if isinstance(key, tuple):
+            _remove_index_key(self.child_object_keys, key[0], key)
+        if isinstance(obj, pyrpr.Instance):
+            _remove_index_key(self.mesh_instance_keys, id(obj.mesh), key)
+
+        return obj
+
     def remove_object(self, key):
         obj = self.objects[key]
 
         if isinstance(obj, pyrpr.Mesh):
             # removing and detaching related instances
-            instance_keys = tuple(k for k in self.objects.keys()
-                                    if isinstance(k, tuple) and k[0] == key)
-            for k in instance_keys:
-                instance = self.objects.pop(k)
+            for k in tuple(self.child_object_keys.get(key, ())):
+                instance = self._pop_object(k)
                 self.scene.detach(instance)
 
         self.remove_curves(key)
@@ -564,50 +772,70 @@ class RPRContext:
         if isinstance(obj, pyrpr.Mesh):
             # checking if object has direct instances,
             # in this case we don't remove/detach object, just hiding it
-            has_instances = next((True for o in self.objects.values()
-                                       if isinstance(o, pyrpr.Instance) and o.mesh is obj), False)
-            if has_instances:
+            if id(obj) in self.mesh_instance_keys:
                 obj.set_visibility(False)
                 return
 
         if obj:
             self.scene.detach(obj)
 
-        del self.objects[key]
+        self._pop_object(key)
+
+    def get_mesh_by_fingerprint(self, fingerprint):
+        """ Returns exported mesh with the same geometry fingerprint if it is still in scene """
+        key, mesh = self.mesh_fingerprints.get(fingerprint, (None, None))
+        if mesh and self.objects.get(key, None) is mesh:
+            return mesh
+
+        return None
+
+    def log_geometry_instancing(self):
+        log.info(f"Geometry instancing: {self.instanced_geometry_count} meshes instanced, "
+                 f"{self.instanced_geometry_size / 1024 ** 2:.1f} MB of geometry data saved")
+
+    @staticmethod
+    def _init_mesh_update_stats():
+        return {'reused': 0, 'rebuilt': 0, 'uploaded_size': 0, 'reused_size': 0}
+
+    def log_mesh_updates(self):
+        """ Logs and resets statistics of meshes recreated by sync_update() """
+        stats = self.mesh_update_stats
+        if stats['reused'] or stats['rebuilt']:
+            log.info(f"Mesh updates: {stats['reused']} with reused topology, {stats['rebuilt']} rebuilt, "
+                     f"{stats['uploaded_size'] / 1024 ** 2:.1f} MB uploaded, "
+                     f"{stats['reused_size'] / 1024 ** 2:.1f} MB of index data reused")
+
+        self.mesh_update_stats = self._init_mesh_update_stats()
 
     def remove_curves(self, base_obj_key):
-        keys = tuple(k for k in self.curves.keys() if k[0] == base_obj_key)
-        for k in keys:
+        for k in self.curve_keys.pop(base_obj_key, ()):
             particle = self.curves.pop(k)
             self.scene.detach(particle)
 
     def has_curves(self, base_obj_key):
-        return bool(next((k for k in self.curves.keys() if k[0] == base_obj_key), None))
+        return base_obj_key in self.curve_keys
 
     def remove_volumes(self, base_obj_key):
-        keys = tuple(k for k in self.volumes.keys() if k[0] == base_obj_key)
-        for k in keys:
+        for k in self.volume_keys.pop(base_obj_key, ()):
             volume = self.volumes.pop(k)
             self.scene.detach(volume)
 
     def has_volumes(self, base_obj_key):
-        return bool(next((k for k in self.volumes.keys() if k[0] == base_obj_key), None))
+        return base_obj_key in self.volume_keys
 
     def remove_image(self, key):
         del self.images[key]
 
     def remove_material(self, key):
         # removing child materials
-        for mat_key in tuple(self.materials.keys()):
-            if isinstance(mat_key, tuple) and mat_key[0] == key:
-                self.remove_material(mat_key)
+        for mat_key in tuple(self.child_material_keys.get(key, ())):
+            self.remove_material(mat_key)
 
-        # removing all corresponded nodes
-        for node_key in tuple(self.material_nodes.keys()):
-            if node_key[0] == key:
-                del self.material_nodes[node_key]
+        self.remove_material_nodes(key)
 
         del self.materials[key]
+        if isinstance(key, tuple):
+            _remove_index_key(self.child_material_keys, key[0], key)
 
     def apply_filters(self):
         if self.composite:
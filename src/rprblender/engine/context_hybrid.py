@@ -60,14 +60,15 @@ class RPRContext(context.RPRContext):
         # enable arithmetic operations on Hybrid
         self.set_parameter(pyrpr.CONTEXT_ENABLE_ARITHMETICS, True)
 
-    def resolve(self, aovs=None):
+    def resolve(self, aovs=None, consumers=None):
         pass
 
-    def enable_aov(self, aov_type):
+    def enable_aov(self, aov_type, consumer=context.AOV_CONSUMER_DISPLAY):
         if aov_type == pyrpr.AOV_VARIANCE:
             log("Unsupported RPRContext.enable_aov(AOV_VARIANCE)")
             return
 
+        self._add_aov_consumer(aov_type, consumer)
         if self.is_aov_enabled(aov_type):
             return
 
@@ -25,7 +25,8 @@ import weakref
 import bpy
 import pyrpr
 
-from .context import RPRContext
+from . import init_rif
+from .context import RPRContext, AOV_CONSUMER_DENOISER
 from rprblender.export import object, instance
 from . import image_filter
 
@@ -54,11 +55,23 @@ class Engine:
         self.background_filter = None
         self.upscale_filter = None
 
+        # RIF context shared by image filters: (rpr core context, rif context)
+        self.rif_context = None
+
     def stop_render(self):
         self.rpr_context = None
         self.image_filter = None
         self.background_filter = None
         self.upscale_filter = None
+        self.rif_context = None
+
+    def _get_rif_context(self):
+        """ Returns RIF context of rpr_context, it is created once and shared by all image filters """
+        if self.rif_context is None or self.rif_context[0] is not self.rpr_context.context:
+            self.rif_context = (self.rpr_context.context,
+                                image_filter.create_context(self.rpr_context.context))
+
+        return self.rif_context[1]
 
     def depsgraph_objects(self, depsgraph: bpy.types.Depsgraph, with_camera=False):
         """ Iterates evaluated objects in depsgraph with ITERATED_OBJECT_TYPES """
@@ -118,9 +131,9 @@ class Engine:
             if not self.image_filter:
                 self._enable_image_filter(settings)
 
-            elif self.image_filter.settings['resolution'] == settings['resolution'] \
-                    and self.image_filter.settings['filter_type'] == settings['filter_type'] \
-                    and self.image_filter.settings['filter_type'] != 'ML':
+            elif self._is_image_filter_compatible(settings):
+                # filter graph is kept, only its images are recreated on resolution change
+                self.image_filter.resize(*settings['resolution'])
                 self._update_image_filter(settings)
 
             else:
@@ -136,6 +149,18 @@ class Engine:
 
         return True
 
+    def _is_image_filter_compatible(self, settings):
+        """ Checks if image filter could be updated to settings without recreating """
+        prev_settings = self.image_filter.settings
+        if prev_settings['filter_type'] != settings['filter_type']:
+            return False
+
+        if settings['filter_type'] == 'ML':
+            return prev_settings['ml_color_only'] == settings['ml_color_only'] \
+                and prev_settings['ml_use_fp16_compute_type'] == settings['ml_use_fp16_compute_type']
+
+        return True
+
     def _enable_image_filter(self, settings):
         width, height = settings['resolution']
 
@@ -143,9 +168,9 @@ class Engine:
         self.rpr_context.enable_aov(pyrpr.AOV_COLOR)
 
         if settings['filter_type'] == 'BILATERAL':
-            self.rpr_context.enable_aov(pyrpr.AOV_WORLD_COORDINATE)
-            self.rpr_context.enable_aov(pyrpr.AOV_OBJECT_ID)
-            self.rpr_context.enable_aov(pyrpr.AOV_SHADING_NORMAL)
+            self.rpr_context.enable_aov(pyrpr.AOV_WORLD_COORDINATE, AOV_CONSUMER_DENOISER)
+            self.rpr_context.enable_aov(pyrpr.AOV_OBJECT_ID, AOV_CONSUMER_DENOISER)
+            self.rpr_context.enable_aov(pyrpr.AOV_SHADING_NORMAL, AOV_CONSUMER_DENOISER)
 
             inputs = {'color', 'normal', 'world_coordinate', 'object_id'}
             sigmas = {
@@ -156,13 +181,14 @@ class Engine:
             }
             params = {'radius': settings['radius']}
             self.image_filter = image_filter.ImageFilterBilateral(
-                self.rpr_context.context, inputs, sigmas, params, width, height)
+                self.rpr_context.context, inputs, sigmas, params, width, height,
+                rif_context=self._get_rif_context())
 
         elif settings['filter_type'] == 'EAW':
-            self.rpr_context.enable_aov(pyrpr.AOV_WORLD_COORDINATE)
-            self.rpr_context.enable_aov(pyrpr.AOV_OBJECT_ID)
-            self.rpr_context.enable_aov(pyrpr.AOV_DEPTH)
-            self.rpr_context.enable_aov(pyrpr.AOV_SHADING_NORMAL)
+            self.rpr_context.enable_aov(pyrpr.AOV_WORLD_COORDINATE, AOV_CONSUMER_DENOISER)
+            self.rpr_context.enable_aov(pyrpr.AOV_OBJECT_ID, AOV_CONSUMER_DENOISER)
+            self.rpr_context.enable_aov(pyrpr.AOV_DEPTH, AOV_CONSUMER_DENOISER)
+            self.rpr_context.enable_aov(pyrpr.AOV_SHADING_NORMAL, AOV_CONSUMER_DENOISER)
 
             inputs = {'color', 'normal', 'depth', 'trans', 'world_coordinate', 'object_id'}
             sigmas = {
@@ -172,13 +198,14 @@ class Engine:
                 'trans': settings['trans_sigma'],
             }
             self.image_filter = image_filter.ImageFilterEaw(
-                self.rpr_context.context, inputs, sigmas, {}, width, height)
+                self.rpr_context.context, inputs, sigmas, {}, width, height,
+                rif_context=self._get_rif_context())
 
         elif settings['filter_type'] == 'LWR':
-            self.rpr_context.enable_aov(pyrpr.AOV_WORLD_COORDINATE)
-            self.rpr_context.enable_aov(pyrpr.AOV_OBJECT_ID)
-            self.rpr_context.enable_aov(pyrpr.AOV_DEPTH)
-            self.rpr_context.enable_aov(pyrpr.AOV_SHADING_NORMAL)
+            self.rpr_context.enable_aov(pyrpr.AOV_WORLD_COORDINATE, AOV_CONSUMER_DENOISER)
+            self.rpr_context.enable_aov(pyrpr.AOV_OBJECT_ID, AOV_CONSUMER_DENOISER)
+            self.rpr_context.enable_aov(pyrpr.AOV_DEPTH, AOV_CONSUMER_DENOISER)
+            self.rpr_context.enable_aov(pyrpr.AOV_SHADING_NORMAL, AOV_CONSUMER_DENOISER)
 
             inputs = {'color', 'normal', 'depth', 'trans', 'world_coordinate', 'object_id'}
             params = {
@@ -187,27 +214,29 @@ class Engine:
                 'bandwidth': settings['bandwidth'],
             }
             self.image_filter = image_filter.ImageFilterLwr(
-                self.rpr_context.context, inputs, {}, params, width, height)
+                self.rpr_context.context, inputs, {}, params, width, height,
+                rif_context=self._get_rif_context())
 
         elif settings['filter_type'] == 'ML':
             inputs = {'color'}
             params = {}
 
             if not settings['ml_color_only']:
-                self.rpr_context.enable_aov(pyrpr.AOV_DEPTH)
-                self.rpr_context.enable_aov(pyrpr.AOV_DIFFUSE_ALBEDO)
-                self.rpr_context.enable_aov(pyrpr.AOV_SHADING_NORMAL)
+                self.rpr_context.enable_aov(pyrpr.AOV_DEPTH, AOV_CONSUMER_DENOISER)
+                self.rpr_context.enable_aov(pyrpr.AOV_DIFFUSE_ALBEDO, AOV_CONSUMER_DENOISER)
+                self.rpr_context.enable_aov(pyrpr.AOV_SHADING_NORMAL, AOV_CONSUMER_DENOISER)
                 inputs |= {'normal', 'depth', 'albedo'}
 
             from .viewport_engine import ViewportEngine
-            import pyrprimagefilters as rif
+            rif = init_rif()
             if settings['ml_use_fp16_compute_type']:
                 params['compute_type'] = rif.COMPUTE_TYPE_FLOAT16
             else:
                 params['compute_type'] = rif.COMPUTE_TYPE_FLOAT
 
             self.image_filter = image_filter.ImageFilterML(
-                self.rpr_context.context, inputs, {}, params, width, height)
+                self.rpr_context.context, inputs, {}, params, width, height,
+                rif_context=self._get_rif_context())
 
         self.image_filter.settings = settings
 
@@ -236,64 +265,58 @@ class Engine:
             self.image_filter.update_param('bandwidth', settings['bandwidth'])
 
     def update_image_filter_inputs(self, tile_pos=(0, 0)):
-        color = self.rpr_context.get_image()
-
         filter_type = self.image_filter.settings['filter_type']
         if filter_type == 'BILATERAL':
-            world = self.rpr_context.get_image(pyrpr.AOV_WORLD_COORDINATE)
-            object_id = self.rpr_context.get_image(pyrpr.AOV_OBJECT_ID)
-            shading = self.rpr_context.get_image(pyrpr.AOV_SHADING_NORMAL)
-
-            inputs = {
-                'color': color,
-                'normal': shading,
-                'world_coordinate': world,
-                'object_id': object_id,
-            }
-
-        elif filter_type == 'EAW':
-            world = self.rpr_context.get_image(pyrpr.AOV_WORLD_COORDINATE)
-            object_id = self.rpr_context.get_image(pyrpr.AOV_OBJECT_ID)
-            depth = self.rpr_context.get_image(pyrpr.AOV_DEPTH)
-            shading = self.rpr_context.get_image(pyrpr.AOV_SHADING_NORMAL)
-
-            inputs = {
-                'color': color,
-                'normal': shading,
-                'depth': depth,
-                'trans': object_id,
-                'world_coordinate': world,
-                'object_id': object_id,
+            input_aovs = {
+                'color': None,
+                'normal': pyrpr.AOV_SHADING_NORMAL,
+                'world_coordinate': pyrpr.AOV_WORLD_COORDINATE,
+                'object_id': pyrpr.AOV_OBJECT_ID,
             }
 
-        elif filter_type == 'LWR':
-            world = self.rpr_context.get_image(pyrpr.AOV_WORLD_COORDINATE)
-            object_id = self.rpr_context.get_image(pyrpr.AOV_OBJECT_ID)
-            depth = self.rpr_context.get_image(pyrpr.AOV_DEPTH)
-            shading = self.rpr_context.get_image(pyrpr.AOV_SHADING_NORMAL)
-
-            inputs = {
-                'color': color,
-                'normal': shading,
-                'depth': depth,
-                'trans': object_id,
-                'world_coordinate': world,
-                'object_id': object_id,
+        elif filter_type in ('EAW', 'LWR'):
+            input_aovs = {
+                'color': None,
+                'normal': pyrpr.AOV_SHADING_NORMAL,
+                'depth': pyrpr.AOV_DEPTH,
+                'trans': pyrpr.AOV_OBJECT_ID,
+                'world_coordinate': pyrpr.AOV_WORLD_COORDINATE,
+                'object_id': pyrpr.AOV_OBJECT_ID,
             }
 
         elif filter_type == 'ML':
-            inputs = {'color': color}
+            input_aovs = {'color': None}
 
             if not self.image_filter.settings['ml_color_only']:
-                inputs['depth'] = self.rpr_context.get_image(pyrpr.AOV_DEPTH)
-                inputs['albedo'] = self.rpr_context.get_image(pyrpr.AOV_DIFFUSE_ALBEDO)
-                inputs['normal'] = self.rpr_context.get_image(pyrpr.AOV_SHADING_NORMAL)
+                input_aovs['depth'] = pyrpr.AOV_DEPTH
+                input_aovs['albedo'] = pyrpr.AOV_DIFFUSE_ALBEDO
+                input_aovs['normal'] = pyrpr.AOV_SHADING_NORMAL
 
         else:
             raise ValueError("Incorrect filter type", filter_type)
 
-        for input_id, data in inputs.items():
-            self.image_filter.update_input(input_id, data, tile_pos)
+        self._update_filter_inputs(self.image_filter, input_aovs, tile_pos)
+
+    def _update_filter_inputs(self, rif_filter, input_aovs, tile_pos, images=None):
+        """
+        Binds AOV frame buffers to filter inputs if they cover the whole filter image,
+        so filter reads them without copying to numpy array. Otherwise copies frame buffers data.
+        Filter images are recreated once for all inputs. images: input_id -> data of other inputs
+        """
+        images = dict(images) if images else {}
+        frame_buffers = dict.fromkeys(images)
+        for input_id, aov_type in input_aovs.items():
+            fb = self.rpr_context.get_frame_buffer(aov_type)
+            if tile_pos == (0, 0) and (fb.width, fb.height) == (rif_filter.width, rif_filter.height) \
+                    and not isinstance(fb, pyrpr.FrameBufferGL):
+                frame_buffers[input_id] = fb
+            else:
+                frame_buffers[input_id] = None
+                images[input_id] = fb.get_data()
+
+        rif_filter.bind_inputs(frame_buffers)
+        for input_id, data in images.items():
+            rif_filter.update_input(input_id, data, tile_pos)
 
     def setup_background_filter(self, settings):
         if self.background_filter and self.background_filter.settings == settings:
@@ -306,6 +329,10 @@ class Engine:
             elif self.background_filter.settings['resolution'] == settings['resolution']:
                 return False
 
+            elif self._settings_differ_by_resolution(self.background_filter.settings, settings):
+                self.background_filter.resize(*settings['resolution'])
+                self.background_filter.settings = settings
+
             else:
                 # recreating filter
                 self._disable_background_filter()
@@ -316,6 +343,11 @@ class Engine:
 
         return True
 
+    @staticmethod
+    def _settings_differ_by_resolution(prev_settings, settings):
+        return prev_settings.keys() == settings.keys() and \
+            all(prev_settings[key] == settings[key] for key in settings if key != 'resolution')
+
     def _enable_background_filter(self, settings):
         width, height = settings['resolution']
         use_background = settings['use_background']
@@ -344,7 +376,8 @@ class Engine:
         params = {'use_background': use_background, 'use_shadow': use_shadow, 'use_reflection': use_reflection}
 
         self.background_filter = image_filter.ImageFilterTransparentShadowReflectionCatcher(
-            self.rpr_context.context, inputs, {}, params, width, height
+            self.rpr_context.context, inputs, {}, params, width, height,
+            rif_context=self._get_rif_context()
         )
 
         self.background_filter.settings = settings
@@ -360,24 +393,27 @@ class Engine:
         Use color_image and opacity_image as source if passed, get from AOV otherwise.
         Update catchers from AOVs if usage flags are set.
         """
+        input_aovs = {}
+        images = {}
         if color_image is None:
-            color_image = self.rpr_context.get_image(pyrpr.AOV_COLOR)
-        self.background_filter.update_input('color', color_image, tile_pos)
+            input_aovs['color'] = pyrpr.AOV_COLOR
+        else:
+            images['color'] = color_image
 
         if opacity_image is None:
-            opacity_image = self.rpr_context.get_image(pyrpr.AOV_OPACITY)
-        self.background_filter.update_input('opacity', opacity_image, tile_pos)
+            input_aovs['opacity'] = pyrpr.AOV_OPACITY
+        else:
+            images['opacity'] = opacity_image
 
         # Catchers are taken directly from AOVs only when needed
         if self.rpr_context.use_shadow_catcher:
-            shadow_catcher_image = self.rpr_context.get_image(pyrpr.AOV_SHADOW_CATCHER)
-            self.background_filter.update_input('shadow_catcher', shadow_catcher_image, tile_pos)
+            input_aovs['shadow_catcher'] = pyrpr.AOV_SHADOW_CATCHER
         if self.rpr_context.use_reflection_catcher:
-            reflection_catcher_image = self.rpr_context.get_image(pyrpr.AOV_REFLECTION_CATCHER)
-            self.background_filter.update_input('reflection_catcher', reflection_catcher_image, tile_pos)
+            input_aovs['reflection_catcher'] = pyrpr.AOV_REFLECTION_CATCHER
         if self.rpr_context.use_shadow_catcher or self.rpr_context.use_reflection_catcher:
-            background_image = self.rpr_context.get_image(pyrpr.AOV_BACKGROUND)
-            self.background_filter.update_input('background', background_image, tile_pos)
+            input_aovs['background'] = pyrpr.AOV_BACKGROUND
+
+        self._update_filter_inputs(self.background_filter, input_aovs, tile_pos, images)
 
     def setup_upscale_filter(self, settings):
         if self.upscale_filter and self.upscale_filter.settings == settings:
@@ -390,6 +426,10 @@ class Engine:
             elif self.upscale_filter.settings['resolution'] == settings['resolution']:
                 return False
 
+            elif self._settings_differ_by_resolution(self.upscale_filter.settings, settings):
+                self.upscale_filter.resize(*settings['resolution'])
+                self.upscale_filter.settings = settings
+
             else:
                 # recreating filter
                 self._disable_upscale_filter()
@@ -404,7 +444,7 @@ class Engine:
         return True
 
     def _enable_upscale_filter(self, settings):
-        import pyrprimagefilters as rif
+        rif = init_rif()
         width, height = settings['resolution']
 
         self.rpr_context.enable_aov(pyrpr.AOV_COLOR)
@@ -413,7 +453,7 @@ class Engine:
         self.upscale_filter = image_filter.ImageFilterUpscale(
             self.rpr_context.context, {'color'}, {},
             {'compute_type': rif.COMPUTE_TYPE_FLOAT if IS_LINUX else rif.COMPUTE_TYPE_FLOAT16},
-            width, height)
+            width, height, rif_context=self._get_rif_context())
 
         self.upscale_filter.settings = settings
 
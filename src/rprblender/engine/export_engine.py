@@ -17,8 +17,6 @@ Scene export to file
 """
 import math
 
-import pyrpr_load_store
-
 from rprblender.export import (
     instance,
     object,
@@ -26,10 +24,14 @@ from rprblender.export import (
     world,
     camera
 )
-from .context import RPRContext, RPRContext2
+from . import init_load_store
+from .context import RPRContext, RPRContext2, AOV_CONSUMER_EXPORT
 from .engine import Engine
 import pyrpr
 
+from rprblender.utils import image_cache
+from rprblender.utils import profiler
+
 from rprblender.utils.logging import Log
 log = Log(tag='ExportEngine')
 
@@ -43,6 +45,18 @@ class ExportEngine(Engine):
 
     def sync(self, context):
         """ Prepare scene for export """
+        scene = context.scene
+        profiler.start(f"{scene.name}_{context.view_layer.name}_export")
+        try:
+            self._sync(context)
+
+        finally:
+            # there is no render after export sync, report is written right away
+            sync_profile = profiler.stop()
+            if sync_profile:
+                sync_profile.write_report()
+
+    def _sync(self, context):
         log('Start sync')
 
         depsgraph = context.evaluated_depsgraph_get()
@@ -51,6 +65,7 @@ class ExportEngine(Engine):
         material_override = depsgraph.view_layer.material_override
 
         scene.rpr.init_rpr_context(self.rpr_context)
+        self.rpr_context.geometry_instancing = scene.rpr.geometry_instancing
 
         self.rpr_context.scene.set_name(scene.name)
         self.rpr_context.width = int(scene.render.resolution_x * scene.render.resolution_percentage / 100)
@@ -110,7 +125,7 @@ class ExportEngine(Engine):
                 self._set_scene_frame(scene, *cur_frame)
         
         # adaptive subdivision will be limited to the current scene render size
-        self.rpr_context.enable_aov(pyrpr.AOV_COLOR)
+        self.rpr_context.enable_aov(pyrpr.AOV_COLOR, AOV_CONSUMER_EXPORT)
         self.rpr_context.sync_auto_adapt_subdivision()
 
         self.rpr_context.sync_portal_lights()
@@ -118,6 +133,10 @@ class ExportEngine(Engine):
         # Exported scene will be rendered vertically flipped, flip it back
         self.rpr_context.set_parameter(pyrpr.CONTEXT_Y_FLIP, True)
 
+        if self.rpr_context.geometry_instancing:
+            self.rpr_context.log_geometry_instancing()
+
+        image_cache.log_stats()
         log('Finish sync')
 
     def _set_scene_frame(self, scene, frame, subframe=0.0):
@@ -129,7 +148,7 @@ class ExportEngine(Engine):
         :param filepath: full output file path, including filename extension
         """
         log('export_to_rpr')
-        pyrpr_load_store.export(filepath, self.rpr_context.context, self.rpr_context.scene, flags)
+        init_load_store().export(filepath, self.rpr_context.context, self.rpr_context.scene, flags)
 
 
 class ExportEngine2(ExportEngine):
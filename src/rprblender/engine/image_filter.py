@@ -23,55 +23,132 @@ import pyrprimagefilters as rif
 
 from rprblender import utils
 from rprblender.utils.user_settings import get_user_settings
+from . import init_rif
+
+
+def create_context(rpr_context: pyrpr.Context):
+    """ Creates RIF context for rpr_context. One context is shared by all image filters of engine """
+    init_rif()
+    rif.Context.set_cache_path(utils.core_cache_dir() / f"{hex(rif.API_VERSION)}_rif")
+
+    creation_flags = rpr_context.get_creation_flags()
+    if creation_flags & pyrpr.CREATION_FLAGS_ENABLE_METAL:
+        if isinstance(rpr_context, pyrpr2.Context):
+            return rif.Context(rpr_context)
+
+        return rif.ContextMetal(rpr_context)
+
+    if pyrpr.is_gpu_enabled(creation_flags) and \
+            not isinstance(rpr_context, (pyhybrid.Context, pyhybridpro.Context, pyrpr2.Context)):
+        return rif.ContextOpenCL(rpr_context)
+
+    return rif.Context(rpr_context)
 
 
 class ImageFilter(metaclass=ABCMeta):
+    """
+    Image filter graph: RIF filters attached to command queue with input, intermediate and
+    output images. Filters and command queue are kept for the whole filter life, resize() and
+    binding of frame buffers to inputs recreate only images and reattach filters, resize()
+    also resets temporal accumulators.
+    """
+
     def __init__(self, rpr_context: pyrpr.Context, inputs, sigmas, params, width, height,
-                 frame_buffer_gl=None):
+                 frame_buffer_gl=None, rif_context=None):
         # field for custom external settings
         self.settings = None
 
-        rif.Context.set_cache_path(utils.core_cache_dir() / f"{hex(rif.API_VERSION)}_rif")
+        self.context = rif_context if rif_context else create_context(rpr_context)
 
-        # creating context
-        creation_flags = rpr_context.get_creation_flags()
-        if creation_flags & pyrpr.CREATION_FLAGS_ENABLE_METAL:
-            if isinstance(rpr_context, pyrpr2.Context):
-                self.context = rif.Context(rpr_context)
-            else:
-                self.context = rif.ContextMetal(rpr_context)
-        elif pyrpr.is_gpu_enabled(creation_flags) and \
-                not isinstance(rpr_context, (pyhybrid.Context, pyhybridpro.Context, pyrpr2.Context)):
-            self.context = rif.ContextOpenCL(rpr_context)
-        else:
-            self.context = rif.Context(rpr_context)
-        
         self.width = width
         self.height = height
         self.filter = None
         self.params = params
         self.sigmas = sigmas
-        self.inputs = {}
+        self.frame_buffer_gl = frame_buffer_gl
 
-        if isinstance(inputs, set):
-            for input_id in inputs:
-                self.inputs[input_id] = self.context.create_image(self.width, self.height)
+        # frame buffers bound to inputs by input_id, None for inputs filled by update_input()
+        self.input_frame_buffers = dict.fromkeys(inputs) if isinstance(inputs, set) else dict(inputs)
+        self.inputs = {}
+        self.output_image = None
 
-        else:
-            for input_id, fb in inputs.items():
-                if fb:
-                    self.inputs[input_id] = self.context.create_frame_buffer_image(fb)
-                else:
-                    self.inputs[input_id] = self.context.create_image(self.width, self.height)
+        # filters by (name, filter_type), they are reused when filter graph is rebuilt
+        self.filters = {}
 
         self.command_queue = self.context.create_command_queue()
-        if frame_buffer_gl:
-            self.output_image = self.context.create_frame_buffer_image_gl(frame_buffer_gl)
+
+        self._create_images()
+        self._create_filter()
+
+    def _create_images(self):
+        self.inputs = {}
+        for input_id, fb in self.input_frame_buffers.items():
+            if fb and (fb.width, fb.height) != (self.width, self.height):
+                # frame buffer size doesn't match anymore, input is filled by update_input()
+                fb = self.input_frame_buffers[input_id] = None
+
+            if fb:
+                self.inputs[input_id] = self.context.create_frame_buffer_image(fb)
+            else:
+                self.inputs[input_id] = self.context.create_image(self.width, self.height)
+
+        if self.frame_buffer_gl:
+            self.output_image = self.context.create_frame_buffer_image_gl(self.frame_buffer_gl)
         else:
             self.output_image = self.context.create_image(self.width, self.height)
 
+    def _rebuild(self):
+        """ Recreates images and attaches filters to command queue with new images """
+        self.command_queue.detach_image_filters()
+        self._create_images()
         self._create_filter()
 
+    def _get_filter(self, name, filter_type):
+        """ Returns filter of graph, it is created only once """
+        image_filter = self.filters.get((name, filter_type), None)
+        if image_filter is None:
+            image_filter = self.context.create_filter(filter_type)
+            self.filters[(name, filter_type)] = image_filter
+
+        return image_filter
+
+    def resize(self, width, height):
+        if (self.width, self.height) == (width, height):
+            return
+
+        self.width = width
+        self.height = height
+
+        # temporal accumulators keep history of previous size, they are recreated by _rebuild()
+        self.filters = {key: image_filter for key, image_filter in self.filters.items()
+                        if key[1] != rif.IMAGE_FILTER_TEMPORAL_ACCUMULATOR}
+        self._rebuild()
+
+    def bind_inputs(self, frame_buffers):
+        """
+        Binds frame buffers of the same size as filter to inputs, None unbinds input to be filled
+        by update_input(). Images are recreated once for all changed inputs. Frame buffer data is
+        copied to input image by run() directly or input image shares frame buffer memory (OpenCL, Metal)
+        """
+        is_changed = False
+        for input_id, frame_buffer in frame_buffers.items():
+            if frame_buffer is None:
+                if self.input_frame_buffers[input_id]:
+                    self.input_frame_buffers[input_id] = None
+                    is_changed = True
+                continue
+
+            image = self.inputs[input_id]
+            if isinstance(image, rif.FrameBufferImage) and image.frame_buffer is frame_buffer \
+                    and (image.width, image.height) == (frame_buffer.width, frame_buffer.height):
+                continue
+
+            self.input_frame_buffers[input_id] = frame_buffer
+            is_changed = True
+
+        if is_changed:
+            self._rebuild()
+
     def update_sigma(self, input_id, sigma):
         self.sigmas[input_id] = sigma
 
@@ -79,6 +156,10 @@ class ImageFilter(metaclass=ABCMeta):
         self.params[name] = value
 
     def update_input(self, input_id, data, pos=(0, 0)):
+        if self.input_frame_buffers[input_id]:
+            self.input_frame_buffers[input_id] = None
+            self._rebuild()
+
         self.inputs[input_id].set_data(data, pos)
 
     @abstractmethod
@@ -115,7 +196,7 @@ class ImageFilter(metaclass=ABCMeta):
 
     def setup_alpha_filter(self, alpha):
         """ Apply transparent background by setting output image alpha by alpha value """
-        result = self.context.create_filter(rif.IMAGE_FILTER_USER_DEFINED)
+        result = self._get_filter('alpha', rif.IMAGE_FILTER_USER_DEFINED)
 
         # redefine image alpha channel by alpha value
         code = """
@@ -140,7 +221,7 @@ class ImageFilterBilateral(ImageFilter):
     input_ids = ['color', 'normal', 'world_coordinate', 'object_id']
 
     def _create_filter(self):
-        self.filter = self.context.create_filter(rif.IMAGE_FILTER_BILATERAL_DENOISE)
+        self.filter = self._get_filter('denoise', rif.IMAGE_FILTER_BILATERAL_DENOISE)
         self.filter.set_parameter('inputs', [self.inputs[input_id] for input_id in self.input_ids])
         self.filter.set_parameter('inputsNum', len(self.input_ids))
 
@@ -152,12 +233,12 @@ class ImageFilterBilateral(ImageFilter):
 
 class ImageFilterLwr(ImageFilter):
     def _create_filter(self):
-        self.filter = self.context.create_filter(rif.IMAGE_FILTER_LWR_DENOISE)
+        self.filter = self._get_filter('denoise', rif.IMAGE_FILTER_LWR_DENOISE)
 
         aux_filters = {}
         aux_images = {}
         for key in ['color', 'normal', 'depth', 'trans']:
-            aux_filters[key] = self.context.create_filter(rif.IMAGE_FILTER_TEMPORAL_ACCUMULATOR)
+            aux_filters[key] = self._get_filter(f'{key}_variance', rif.IMAGE_FILTER_TEMPORAL_ACCUMULATOR)
             aux_images[key] = self.context.create_image(self.width, self.height)
             self._setup_variance_image_filter(aux_filters[key], aux_images[key])            
 
@@ -189,9 +270,9 @@ class ImageFilterML(ImageFilter):
         devices = self.get_devices()
         use_oidn = (utils.IS_WIN or utils.IS_MAC) and devices.cpu_state
         if use_oidn:
-            self.filter = self.context.create_filter(rif.IMAGE_FILTER_OPENIMAGE_DENOISE)
+            self.filter = self._get_filter('denoise', rif.IMAGE_FILTER_OPENIMAGE_DENOISE)
         else:
-            self.filter = self.context.create_filter(rif.IMAGE_FILTER_AI_DENOISE)
+            self.filter = self._get_filter('denoise', rif.IMAGE_FILTER_AI_DENOISE)
 
         self.filter.set_parameter('useHDR', True)
 
@@ -209,7 +290,7 @@ class ImageFilterML(ImageFilter):
 
         else:
             # setup remap normals filter
-            normal_remap_filter = self.context.create_filter(rif.IMAGE_FILTER_REMAP_RANGE)
+            normal_remap_filter = self._get_filter('normal_remap', rif.IMAGE_FILTER_REMAP_RANGE)
             normal_remap_filter.set_parameter('dstLo', 0.0)
             normal_remap_filter.set_parameter('dstHi', 1.0)
             normal_remap_image = self.context.create_image(self.width, self.height)
@@ -217,7 +298,7 @@ class ImageFilterML(ImageFilter):
                                                    normal_remap_image)
 
             # setup remap depth filter
-            depth_remap_filter = self.context.create_filter(rif.IMAGE_FILTER_REMAP_RANGE)
+            depth_remap_filter = self._get_filter('depth_remap', rif.IMAGE_FILTER_REMAP_RANGE)
             depth_remap_filter.set_parameter('dstLo', 0.0)
             depth_remap_filter.set_parameter('dstHi', 1.0)
             depth_remap_image = self.context.create_image(self.width, self.height)
@@ -231,7 +312,7 @@ class ImageFilterML(ImageFilter):
             self.filter.set_parameter('albedoImg', self.inputs['albedo'])
 
         # setup resample filter
-        output_resample_filter = self.context.create_filter(rif.IMAGE_FILTER_RESAMPLE)
+        output_resample_filter = self._get_filter('output_resample', rif.IMAGE_FILTER_RESAMPLE)
         output_resample_filter.set_parameter('interpOperator', rif.IMAGE_INTERPOLATION_NEAREST)
         output_resample_filter.set_parameter('outSize', (self.width, self.height))
 
@@ -251,12 +332,12 @@ class ImageFilterML(ImageFilter):
 
 class ImageFilterEaw(ImageFilter):
     def _create_filter(self):
-        self.filter = self.context.create_filter(rif.IMAGE_FILTER_EAW_DENOISE)
+        self.filter = self._get_filter('denoise', rif.IMAGE_FILTER_EAW_DENOISE)
 
         aux_filters = {
-            'color': self.context.create_filter(rif.IMAGE_FILTER_TEMPORAL_ACCUMULATOR),
-            'mlaa': self.context.create_filter(rif.IMAGE_FILTER_MLAA),
-            'depth': self.context.create_filter(rif.IMAGE_FILTER_NORMALIZATION),
+            'color': self._get_filter('color_variance', rif.IMAGE_FILTER_TEMPORAL_ACCUMULATOR),
+            'mlaa': self._get_filter('mlaa', rif.IMAGE_FILTER_MLAA),
+            'depth': self._get_filter('depth_normalization', rif.IMAGE_FILTER_NORMALIZATION),
         }
         aux_images = {
             'color': self.context.create_image(self.width, self.height),
@@ -303,7 +384,7 @@ class ImageFilterUpscale(ImageFilter):
     """ Apply transparent background only """
 
     def _create_filter(self):
-        self.filter = self.context.create_filter(rif.IMAGE_FILTER_AI_UPSCALE)
+        self.filter = self._get_filter('upscale', rif.IMAGE_FILTER_AI_UPSCALE)
 
         models_path = utils.package_root_dir() / 'data/models'
         if not models_path.is_dir():
@@ -328,7 +409,7 @@ class ImageFilterTransparentShadowReflectionCatcher(ImageFilter):
         use_shadow = self.params.get('use_shadow', False)
         use_reflection = self.params.get('use_reflection', False)
 
-        self.filter = self.context.create_filter(rif.IMAGE_FILTER_USER_DEFINED)
+        self.filter = self._get_filter('catchers', rif.IMAGE_FILTER_USER_DEFINED)
 
         # only the outputImage is opened for writing in the USER_DEFINED filter, so work will be done in a single pass
         # for this to work the filter code multi-string is combined here
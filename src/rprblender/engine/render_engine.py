@@ -19,13 +19,18 @@ import math
 import numpy as np
 import bpy
 import json
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 
 import pyrpr
 
 from rprblender import utils
 from .engine import Engine
+from .context import AOV_CONSUMER_FINAL, PROGRESSIVE_CONSUMERS
 from rprblender.export import world, camera, object, instance, particle
 from rprblender.utils import render_stamp
+from rprblender.utils.pipeline import SyncPipeline
+from rprblender.utils import profiler
 from rprblender.utils.conversion import perfcounter_to_str, get_cryptomatte_hash
 from rprblender.utils.user_settings import get_user_settings
 from rprblender import bl_info
@@ -39,6 +44,86 @@ log = logging.Log(tag='RenderEngine')
 MAX_RENDER_ITERATIONS = 32
 
 
+RenderPassInfo = namedtuple('RenderPassInfo', ('name', 'channels'))
+
+
+def get_render_passes_size(render_passes, tile_size):
+    return sum(p.channels for p in render_passes) * tile_size[0] * tile_size[1]
+
+
+def get_pass_images(buffer, render_passes, tile_size):
+    """ Returns views of buffer for every render pass in the same layout as RenderPasses.foreach_set() """
+    width, height = tile_size
+    pass_images = []
+    offset = 0
+    for p in render_passes:
+        pass_size = width * height * p.channels
+        pass_images.append(buffer[offset:offset + pass_size].reshape(height, width, p.channels))
+        offset += pass_size
+
+    return pass_images
+
+
+class TileResultWriter:
+    """
+    Stores tiles AOVs to render result while next samples or the next tile are rendering.
+    AOVs are read from core frame buffers in render thread, because context is used by render
+    at the same time. Worker thread copies read images to staging buffer, then the buffer is
+    written to RenderResult by flush() in render thread, because Blender RenderResult API
+    isn't thread safe. Tile is flushed by the next read, after the next render() call.
+    """
+
+    def __init__(self, rpr_engine, layer_name, render_passes):
+        self.rpr_engine = rpr_engine
+        self.layer_name = layer_name
+        self.render_passes = tuple(RenderPassInfo(p.name, p.channels) for p in render_passes)
+
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='RPRTileReader')
+        self.buffer = None
+
+        # (future, tile_pos, tile_size) of submitted read
+        self.pending = None
+
+    def read(self, read_func, store_func, tile_pos, tile_size):
+        """
+        Reads tile by read_func(pass_images) in render thread and submits store_func(images)
+        with its result to worker. Previously read tile is written before
+        """
+        self.flush()
+
+        size = get_render_passes_size(self.render_passes, tile_size)
+        if self.buffer is None or len(self.buffer) != size:
+            self.buffer = np.empty(size, dtype=np.float32)
+
+        pass_images = get_pass_images(self.buffer, self.render_passes, tile_size)
+        images = read_func(pass_images)
+        self.pending = (self.executor.submit(store_func, images), tile_pos, tile_size)
+
+    def flush(self):
+        """ Waits for submitted read and writes staging buffer to RenderResult, called in render thread """
+        if not self.pending:
+            return
+
+        future, tile_pos, tile_size = self.pending
+        self.pending = None
+        future.result()
+
+        result = self.rpr_engine.begin_result(*tile_pos, *tile_size, layer=self.layer_name, view="")
+        try:
+            result.layers[0].passes.foreach_set('rect', self.buffer)
+
+        finally:
+            self.rpr_engine.end_result(result)
+
+    def finish(self):
+        """ Writes pending tile and stops worker thread """
+        try:
+            self.flush()
+
+        finally:
+            self.executor.shutdown(wait=True)
+
+
 class RenderEngine(Engine):
     """ Final render engine """
 
@@ -59,6 +144,7 @@ class RenderEngine(Engine):
         self.render_time = 0
         self.current_render_time = 0
         self.sync_time = 0
+        self.sync_profile = None    # see utils.profiler
 
         self.status_title = ""
 
@@ -77,6 +163,9 @@ class RenderEngine(Engine):
         self.render_stamp_text = ""
         self.render_iteration = 0
 
+        # staging array of render result passes, see _get_render_result_buffer()
+        self.render_result_buffer = None
+
         self.cryptomatte_allowed = False  # only Full mode supports cryptomatte AOVs
 
     def notify_status(self, progress, info):
@@ -84,83 +173,137 @@ class RenderEngine(Engine):
         self.rpr_engine.update_progress(progress)
         self.rpr_engine.update_stats(self.status_title, info)
 
+    def _get_render_result_buffer(self, render_passes, tile_size):
+        """
+        Returns staging array for all render passes of the tile and views of it for every pass.
+        The array is reused while tile size and passes are the same.
+        """
+        size = get_render_passes_size(render_passes, tile_size)
+        if self.render_result_buffer is None or len(self.render_result_buffer) != size:
+            # zeroed, passes not read by progressive updates stay black until final update
+            self.render_result_buffer = np.zeros(size, dtype=np.float32)
+
+        return self.render_result_buffer, get_pass_images(self.render_result_buffer, render_passes, tile_size)
+
+    def _read_image(self, pass_image, aov_type=None):
+        """ Reads frame buffer directly into pass image if it has the same number of channels """
+        if pass_image.shape[2] == pyrpr.FrameBuffer.channels:
+            return self.rpr_context.get_image(aov_type, buf=pass_image)
+
+        return self.rpr_context.get_pooled_image(aov_type)
+
     def _update_render_result(self, tile_pos, tile_size, layer_name="",
-                              apply_image_filter=False):
+                              apply_image_filter=False, tile_writer=None, consumers=None):
+        """
+        Reads rendered AOVs of the tile to render result.
+        With tile_writer AOVs are read in render thread and stored to its staging buffer
+        by its worker thread, the buffer is written to render result by tile_writer.flush().
+        If consumers are set only passes of AOVs needed by them are read
+        """
+        if tile_writer:
+            tile_writer.read(
+                lambda pass_images: self._read_render_passes(
+                    tile_writer.render_passes, pass_images, tile_pos, tile_size, apply_image_filter,
+                    consumers),
+                lambda images: self._store_render_passes(images, tile_pos, tile_size),
+                tile_pos, tile_size)
+            return
+
+        result = self.rpr_engine.begin_result(*tile_pos, *tile_size, layer=layer_name, view="")
+        try:
+            render_passes = result.layers[0].passes
 
-        def zeros_image(channels):
-            return np.zeros((self.rpr_context.height, self.rpr_context.width, channels),
-                            dtype=np.float32)
+            # all pass images are written into views of one staging array
+            buffer, pass_images = self._get_render_result_buffer(render_passes, tile_size)
+            images = self._read_render_passes(render_passes, pass_images, tile_pos, tile_size,
+                                              apply_image_filter, consumers)
+            self._store_render_passes(images, tile_pos, tile_size)
 
-        def set_render_result(render_passes: bpy.types.RenderPasses):
-            images = []
+            # efficient way to copy all AOV images
+            render_passes.foreach_set('rect', buffer)
 
-            x1, y1 = tile_pos
-            x2, y2 = x1 + tile_size[0], y1 + tile_size[1]
+        finally:
+            self.rpr_engine.end_result(result)
 
-            for p in render_passes:
-                if p.name == "Combined":
-                    if apply_image_filter and self.image_filter:
-                        image = self.image_filter.get_data()
+    def _read_render_passes(self, render_passes, pass_images, tile_pos, tile_size, apply_image_filter,
+                            consumers=None):
+        """
+        Reads AOVs from core, render_passes could be any items with name and channels.
+        Returns list of (render pass, pass image, read image) for _store_render_passes(),
+        read image is pass image itself or pooled buffer, which is valid till the next read
+        """
+        x1, y1 = tile_pos
+        x2, y2 = x1 + tile_size[0], y1 + tile_size[1]
 
-                        if self.background_filter:
-                            # calculate background effects on denoised image and cut out by tile size
-                            self.update_background_filter_inputs(tile_pos=tile_pos,
-                                                                 color_image=image)
-                            self.background_filter.run()
-                            image = self.background_filter.get_data()[y1:y2, x1:x2, :]
-                        else:
-                            # copying alpha component from rendered image to final denoised image,
-                            # because image filter changes it to 1.0
-                            image[:, :, 3] = self.rpr_context.get_image()[:, :, 3]
-
-                    elif self.background_filter:
-                        # calculate background effects and cut out by tile size
-                        self.update_background_filter_inputs(tile_pos=tile_pos)
+        images = []
+        for p, pass_image in zip(render_passes, pass_images):
+            if p.name == "Combined":
+                if apply_image_filter and self.image_filter:
+                    image = self.image_filter.get_data()
+
+                    if self.background_filter:
+                        # calculate background effects on denoised image and cut out by tile size
+                        self.update_background_filter_inputs(tile_pos=tile_pos,
+                                                             color_image=image)
                         self.background_filter.run()
                         image = self.background_filter.get_data()[y1:y2, x1:x2, :]
                     else:
-                        image = self.rpr_context.get_image()
+                        # copying alpha component from rendered image to final denoised image,
+                        # because image filter changes it to 1.0
+                        image[:, :, 3] = self.rpr_context.get_pooled_image()[:, :, 3]
+
+                elif self.background_filter:
+                    # calculate background effects and cut out by tile size
+                    self.update_background_filter_inputs(tile_pos=tile_pos)
+                    self.background_filter.run()
+                    image = self.background_filter.get_data()[y1:y2, x1:x2, :]
+                else:
+                    image = self._read_image(pass_image)
 
-                elif p.name == "Color":
-                    image = self.rpr_context.get_image(pyrpr.AOV_COLOR)
+            elif p.name == "Color":
+                image = self._read_image(pass_image, pyrpr.AOV_COLOR)
 
-                elif p.name == "Outline":
-                    image = zeros_image(p.channels)
+            elif p.name == "Outline":
+                pass_image.fill(0.0)
+                image = pass_image
 
+            else:
+                aovs_info = RPR_ViewLayerProperites.cryptomatte_aovs_info \
+                    if "Crypto" in p.name else RPR_ViewLayerProperites.aovs_info
+                aov = next((aov for aov in aovs_info
+                            if aov['name'] == p.name), None)
+                if aov and self.rpr_context.is_aov_enabled(aov['rpr']):
+                    if consumers is not None and not self.rpr_context.is_aov_consumed(aov['rpr'], consumers):
+                        # AOV isn't resolved for these consumers, pass is read by later update
+                        continue
+
+                    image = self._read_image(pass_image, aov['rpr'])
                 else:
-                    aovs_info = RPR_ViewLayerProperites.cryptomatte_aovs_info \
-                        if "Crypto" in p.name else RPR_ViewLayerProperites.aovs_info
-                    aov = next((aov for aov in aovs_info
-                                if aov['name'] == p.name), None)
-                    if aov and self.rpr_context.is_aov_enabled(aov['rpr']):
-                        image = self.rpr_context.get_image(aov['rpr'])
-                    elif p.name != 'Outline':
-                        log.warn(f"AOV '{p.name}' is not enabled in rpr_context "
-                                 f"or not found in aovs_info")
-                        image = zeros_image(p.channels)
-
-                if p.channels != image.shape[2]:
-                    image = image[:, :, 0:p.channels]
-
-                if self.needs_contour_pass:
-                    # saving rendered image into cache_rendered_images
-                    if p.name not in self.cached_rendered_images:
-                        self.cached_rendered_images[p.name] = np.zeros(
-                            (self.height, self.width, p.channels), dtype=np.float32)
-
-                    self.cached_rendered_images[p.name][y1:y2, x1:x2] = image
-
-                images.append(image.flatten())
+                    log.warn(f"AOV '{p.name}' is not enabled in rpr_context "
+                             f"or not found in aovs_info")
+                    pass_image.fill(0.0)
+                    image = pass_image
 
-            # efficient way to copy all AOV images
-            render_passes.foreach_set('rect', np.concatenate(images))
+            images.append((p, pass_image, image))
 
-        result = self.rpr_engine.begin_result(*tile_pos, *tile_size, layer=layer_name, view="")
-        try:
-            set_render_result(result.layers[0].passes)
+        return images
 
-        finally:
-            self.rpr_engine.end_result(result)
+    def _store_render_passes(self, images, tile_pos, tile_size):
+        """ Copies images read by _read_render_passes() to pass images, doesn't access rpr_context """
+        x1, y1 = tile_pos
+        x2, y2 = x1 + tile_size[0], y1 + tile_size[1]
+
+        for p, pass_image, image in images:
+            if image is not pass_image:
+                pass_image[:] = image[:, :, 0:p.channels]
+
+            if self.needs_contour_pass:
+                # saving rendered image into cache_rendered_images
+                if p.name not in self.cached_rendered_images:
+                    self.cached_rendered_images[p.name] = np.zeros(
+                        (self.height, self.width, p.channels), dtype=np.float32)
+
+                self.cached_rendered_images[p.name][y1:y2, x1:x2] = pass_image
 
     def stamp_data_add_field(self):
         result = self.rpr_engine.get_result()
@@ -189,22 +332,23 @@ class RenderEngine(Engine):
 
     def _update_render_result_contour(self, tile_pos, tile_size, layer_name=""):
         def set_render_result(render_passes: bpy.types.RenderPasses):
-            images = []
-
             x1, y1 = tile_pos
             x2, y2 = x1 + tile_size[0], y1 + tile_size[1]
 
-            for p in render_passes:
+            buffer, pass_images = self._get_render_result_buffer(render_passes, tile_size)
+
+            for p, pass_image in zip(render_passes, pass_images):
                 if p.name == "Outline":
-                    image = self.rpr_context.get_image(pyrpr.AOV_COLOR)
+                    image = self._read_image(pass_image, pyrpr.AOV_COLOR)
                 else:
                     # getting required rendered image from cached_rendered_images
                     image = self.cached_rendered_images[p.name][y1:y2, x1:x2]
 
-                images.append(image.flatten())
+                if image is not pass_image:
+                    pass_image[:] = image[:, :, 0:p.channels]
 
             # efficient way to copy all AOV images
-            render_passes.foreach_set('rect', np.concatenate(images))
+            render_passes.foreach_set('rect', buffer)
 
         result = self.rpr_engine.begin_result(*tile_pos, *tile_size, layer=layer_name, view="")
         try:
@@ -270,12 +414,13 @@ class RenderEngine(Engine):
 
             self.current_sample += update_samples
 
-            self.rpr_context.resolve()
+            self.rpr_context.resolve(consumers=PROGRESSIVE_CONSUMERS)
             if self.background_filter:
                 self.update_background_filter_inputs()
                 self.background_filter.run()
             self._update_render_result((0, 0), (self.width, self.height),
-                                       layer_name=self.render_layer_name)
+                                       layer_name=self.render_layer_name,
+                                       consumers=PROGRESSIVE_CONSUMERS)
 
             # stop at whichever comes first:
             # max samples or max time if enabled or active_pixels == 0
@@ -295,6 +440,16 @@ class RenderEngine(Engine):
                 # progressively increase update samples up to 32
                 render_update_samples *= 2
 
+        # AOVs which aren't displayed progressively are resolved and read once after rendering
+        final_aovs = self.rpr_context.get_aovs_not_consumed(PROGRESSIVE_CONSUMERS)
+        if final_aovs and self.current_sample > 0:
+            self.rpr_context.resolve(final_aovs)
+            if not self.image_filter:
+                self._update_render_result((0, 0), (self.width, self.height),
+                                           layer_name=self.render_layer_name)
+
+        self.rpr_context.log_resolve_stats()
+
         if self.image_filter:
             self.notify_status(1.0, "Denoising final image")
             self.update_image_filter_inputs()
@@ -337,83 +492,90 @@ class RenderEngine(Engine):
 
         render_update_samples = self.render_update_samples
 
-        for tile_index, (tile_pos, tile_size) in enumerate(tile_iterator()):
-            if self.rpr_engine.test_break():
-                athena_data['End Status'] = "cancelled"
-                break
+        # tile AOVs are read in render thread, then they are stored to render result while
+        # next samples or the next tile are rendering
+        render_passes = self.rpr_engine.get_result().layers[self.render_layer_name].passes
+        tile_writer = TileResultWriter(self.rpr_engine, self.render_layer_name, render_passes)
+        try:
+            for tile_index, (tile_pos, tile_size) in enumerate(tile_iterator()):
+                if self.rpr_engine.test_break():
+                    athena_data['End Status'] = "cancelled"
+                    break
 
-            log(f"Render tile {tile_index} / {tiles_number}: [{tile_pos}, {tile_size}]")
+                log(f"Render tile {tile_index} / {tiles_number}: [{tile_pos}, {tile_size}]")
 
-            tile = ((tile_pos[0] / self.width, tile_pos[1] / self.height),
-                    (tile_size[0] / self.width, tile_size[1] / self.height))
-            # set camera for tile
-            self.camera_data.export(rpr_camera, tile=tile)
-            self.rpr_context.resize(*tile_size)
+                tile = ((tile_pos[0] / self.width, tile_pos[1] / self.height),
+                        (tile_size[0] / self.width, tile_size[1] / self.height))
+                # set camera for tile
+                self.camera_data.export(rpr_camera, tile=tile)
+                self.rpr_context.resize(*tile_size)
 
-            # export backplate section for tile if backplate present
-            if self.world_backplate:
-                self.world_backplate.export(self.rpr_context, (self.width, self.height), tile)
+                # export backplate section for tile if backplate present
+                if self.world_backplate:
+                    self.world_backplate.export(self.rpr_context, (self.width, self.height), tile)
 
-            sample = 0
-            if is_adaptive:
-                all_pixels = active_pixels = self.rpr_context.width * self.rpr_context.height
+                sample = 0
+                if is_adaptive:
+                    all_pixels = active_pixels = self.rpr_context.width * self.rpr_context.height
 
-            render_iteration = 0
-            while True:
-                if self.rpr_engine.test_break():
-                    break
+                render_iteration = 0
+                while True:
+                    if self.rpr_engine.test_break():
+                        break
 
-                update_samples = min(render_update_samples, self.render_samples - sample)
-                self.current_render_time = time.perf_counter() - time_begin
-                progress = (tile_index + sample/self.render_samples) / tiles_number
-                info_str = f"Render Time: {self.current_render_time:.1f} sec"\
-                           f" | Tile: {tile_index}/{tiles_number}"\
-                           f" | Samples: {sample}/{self.render_samples}"
-                log_str = f"  samples: {sample} +{update_samples} / {self.render_samples}"\
-                    f", progress: {progress * 100:.1f}%, time: {self.current_render_time:.2f}"
-
-                is_adaptive_active = is_adaptive and sample >= \
-                                     self.rpr_context.get_parameter(pyrpr.CONTEXT_ADAPTIVE_SAMPLING_MIN_SPP)
-                if is_adaptive_active:
-                    adaptive_progress = max((all_pixels - active_pixels) / all_pixels, 0.0)
-                    progress = max(progress, (tile_index + adaptive_progress) / tiles_number)
-                    info_str += f" | Adaptive Sampling: {adaptive_progress * 100:.0f}%"
-                    log_str += f", active_pixels: {active_pixels}"
-
-                self.notify_status(progress, info_str)
-                log(log_str)
-
-                self.rpr_context.set_parameter(pyrpr.CONTEXT_ITERATIONS, update_samples)
-                self.rpr_context.set_parameter(pyrpr.CONTEXT_FRAMECOUNT, render_iteration)
-                self.rpr_context.render(restart=(sample == 0))
-
-                sample += update_samples
-
-                self.rpr_context.resolve()
-                self._update_render_result(tile_pos, tile_size,
-                                           layer_name=self.render_layer_name)
+                    update_samples = min(render_update_samples, self.render_samples - sample)
+                    self.current_render_time = time.perf_counter() - time_begin
+                    progress = (tile_index + sample/self.render_samples) / tiles_number
+                    info_str = f"Render Time: {self.current_render_time:.1f} sec"\
+                               f" | Tile: {tile_index}/{tiles_number}"\
+                               f" | Samples: {sample}/{self.render_samples}"
+                    log_str = f"  samples: {sample} +{update_samples} / {self.render_samples}"\
+                        f", progress: {progress * 100:.1f}%, time: {self.current_render_time:.2f}"
+
+                    is_adaptive_active = is_adaptive and sample >= \
+                                         self.rpr_context.get_parameter(pyrpr.CONTEXT_ADAPTIVE_SAMPLING_MIN_SPP)
+                    if is_adaptive_active:
+                        adaptive_progress = max((all_pixels - active_pixels) / all_pixels, 0.0)
+                        progress = max(progress, (tile_index + adaptive_progress) / tiles_number)
+                        info_str += f" | Adaptive Sampling: {adaptive_progress * 100:.0f}%"
+                        log_str += f", active_pixels: {active_pixels}"
+
+                    self.notify_status(progress, info_str)
+                    log(log_str)
 
-                # store maximum actual number of used samples for render stamp info
-                self.current_sample = max(self.current_sample, sample)
+                    self.rpr_context.set_parameter(pyrpr.CONTEXT_ITERATIONS, update_samples)
+                    self.rpr_context.set_parameter(pyrpr.CONTEXT_FRAMECOUNT, render_iteration)
+                    self.rpr_context.render(restart=(sample == 0))
 
-                if is_adaptive_active:
-                    active_pixels = self.rpr_context.get_info(pyrpr.CONTEXT_ACTIVE_PIXEL_COUNT, int)
-                    if active_pixels == 0:
+                    sample += update_samples
+
+                    self.rpr_context.resolve()
+                    self._update_render_result(tile_pos, tile_size, tile_writer=tile_writer)
+
+                    # store maximum actual number of used samples for render stamp info
+                    self.current_sample = max(self.current_sample, sample)
+
+                    if is_adaptive_active:
+                        active_pixels = self.rpr_context.get_info(pyrpr.CONTEXT_ACTIVE_PIXEL_COUNT, int)
+                        if active_pixels == 0:
+                            break
+
+                    if sample == self.render_samples:
                         break
 
-                if sample == self.render_samples:
-                    break
+                    render_iteration += 1
+                    if render_iteration > 1 and render_update_samples < MAX_RENDER_ITERATIONS:
+                        # progressively increase update samples up to 32
+                        render_update_samples *= 2
 
-                render_iteration += 1
-                if render_iteration > 1 and render_update_samples < MAX_RENDER_ITERATIONS:
-                    # progressively increase update samples up to 32
-                    render_update_samples *= 2
+                if not self.rpr_engine.test_break():
+                    if self.image_filter:
+                        self.update_image_filter_inputs(tile_pos=tile_pos)
+                    if self.background_filter:
+                        self.update_background_filter_inputs(tile_pos=tile_pos)
 
-            if not self.rpr_engine.test_break():
-                if self.image_filter:
-                    self.update_image_filter_inputs(tile_pos=tile_pos)
-                if self.background_filter:
-                    self.update_background_filter_inputs(tile_pos=tile_pos)
+        finally:
+            tile_writer.finish()
 
         if (self.image_filter or self.background_filter) and not self.rpr_engine.test_break():
             self.notify_status(1.0, "Applying denoising final image")
@@ -461,6 +623,8 @@ class RenderEngine(Engine):
         if not self.rpr_engine.test_break():
             self.apply_render_stamp_to_image()
 
+        self.rpr_context.log_resolve_stats()
+
         athena_data['Stop Time'] = datetime.datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
         athena_data['Samples'] = round(self.render_samples * progress)
 
@@ -571,12 +735,110 @@ class RenderEngine(Engine):
         self.notify_status(1, "Finish render")
         log('Finish render')
 
+        if self.sync_profile:
+            self.sync_profile.write_report()
+            self.sync_profile = None
+
     def _init_rpr_context(self, scene):
         scene.rpr.init_rpr_context(self.rpr_context)
 
         self.rpr_context.scene.set_name(scene.name)
 
+    def can_sync_update(self, depsgraph):
+        """ Returns True if already synced scene could be updated by sync_update() """
+        return False
+
+    def sync_objects(self, depsgraph, material_override):
+        """ Exports depsgraph objects, returns False if syncing was stopped by user """
+        scene = depsgraph.scene
+        view_layer = depsgraph.view_layer
+
+        objects_len = len(depsgraph.objects)
+
+        # mesh data is read here, its processing and creation of rpr meshes are done by pipeline
+        with SyncPipeline() as pipeline:
+            for i, obj in enumerate(self.depsgraph_objects(depsgraph)):
+                self.notify_status(0, "Syncing object (%d/%d): %s" % (i, objects_len, obj.name))
+
+                # the correct collection visibility info is stored in original object
+                indirect_only = obj.original.indirect_only_get(view_layer=view_layer)
+                object.sync(self.rpr_context, obj,
+                            indirect_only=indirect_only, material_override=material_override,
+                            frame_current=scene.frame_current, pipeline=pipeline)
+
+                if self.rpr_engine.test_break():
+                    log.warn("Syncing stopped by user termination")
+                    return False
+
+            pipeline.finish()
+
+        return True
+
+    def sync_instances(self, depsgraph, material_override):
+        """ Exports depsgraph instances, returns False if syncing was stopped by user """
+        scene = depsgraph.scene
+        view_layer = depsgraph.view_layer
+
+        instances_len = len(depsgraph.object_instances)
+        last_instances_percent = 0
+        self.notify_status(0, "Syncing instances 0%")
+
+        for i, inst in enumerate(self.depsgraph_instances(depsgraph)):
+            # Blender creates instances for Curve, MetaBall object that is already synced via object sync
+            # exclude it to avoid sync it twice
+            if not isinstance(inst.instance_object.original.data, type(inst.object.data)):
+                continue
+
+            instances_percent = (i * 100) // instances_len
+            if instances_percent > last_instances_percent:
+                self.notify_status(0, f"Syncing instances {instances_percent}%")
+                last_instances_percent = instances_percent
+
+            indirect_only = inst.parent.original.indirect_only_get(view_layer=view_layer)
+            instance.sync(self.rpr_context, inst,
+                          indirect_only=indirect_only, material_override=material_override,
+                          frame_current=scene.frame_current)
+
+            if self.rpr_engine.test_break():
+                log.warn("Syncing stopped by user termination")
+                return False
+
+        self.notify_status(0, "Syncing instances 100%")
+        return True
+
+    def sync_particles(self, depsgraph):
+        """ Exports particle systems, returns False if syncing was stopped by user """
+        self.notify_status(0, "Syncing particles")
+        for obj in self.depsgraph_objects(depsgraph):
+            particle.sync(self.rpr_context, obj)
+            if self.rpr_engine.test_break():
+                log.warn("Syncing stopped by user termination")
+                return False
+
+        # objects linked to scene as a collection are instanced, so walk thru them for particles
+        for entry in self.depsgraph_instances(depsgraph):
+            particle.sync(self.rpr_context, entry.instance_object)
+            if self.rpr_engine.test_break():
+                log.warn("Syncing stopped by user termination")
+                return False
+
+        return True
+
     def sync(self, depsgraph):
+        scene = depsgraph.scene
+        profiler.start(f"{scene.name}_{depsgraph.view_layer.name}_{scene.frame_current}")
+        try:
+            self._sync(depsgraph)
+
+        finally:
+            # profiling is stopped also if sync was stopped by user or failed
+            self.sync_profile = profiler.stop()
+            if self.sync_profile and not self.is_synced:
+                # render() isn't called after incomplete sync, so report is written here
+                self.sync_profile.write_report()
+                self.sync_profile = None
+
+    def _sync(self, depsgraph):
         log('Start syncing')
 
         # Preparations for syncing
@@ -612,6 +874,7 @@ class RenderEngine(Engine):
             view_layer.rpr.contour.export_contour_settings(self.rpr_context)
 
         self.rpr_context.blender_data['depsgraph'] = depsgraph
+        self.rpr_context.geometry_instancing = scene.rpr.geometry_instancing
 
         # CACHE BLUR DATA
         self.rpr_context.do_motion_blur = scene.render.use_motion_blur and \
@@ -627,46 +890,15 @@ class RenderEngine(Engine):
                 self.set_motion_blur_mode(scene)
 
             # EXPORT OBJECTS
-            objects_len = len(depsgraph.objects)
-            for i, obj in enumerate(self.depsgraph_objects(depsgraph)):
-                self.notify_status(0, "Syncing object (%d/%d): %s" % (i, objects_len, obj.name))
-
-                # the correct collection visibility info is stored in original object
-                indirect_only = obj.original.indirect_only_get(view_layer=view_layer)
-                object.sync(self.rpr_context, obj,
-                            indirect_only=indirect_only, material_override=material_override,
-                            frame_current=scene.frame_current)
-
-                if self.rpr_engine.test_break():
-                    log.warn("Syncing stopped by user termination")
-                    return
+            if not self.sync_objects(depsgraph, material_override):
+                return
 
             # EXPORT INSTANCES
-            instances_len = len(depsgraph.object_instances)
-            last_instances_percent = 0
-            self.notify_status(0, "Syncing instances 0%")
-
-            for i, inst in enumerate(self.depsgraph_instances(depsgraph)):
-                # Blender creates instances for Curve, MetaBall object that is already synced via object sync
-                # exclude it to avoid sync it twice
-                if not isinstance(inst.instance_object.original.data, type(inst.object.data)):
-                    continue
-
-                instances_percent = (i * 100) // instances_len
-                if instances_percent > last_instances_percent:
-                    self.notify_status(0, f"Syncing instances {instances_percent}%")
-                    last_instances_percent = instances_percent
-
-                indirect_only = inst.parent.original.indirect_only_get(view_layer=view_layer)
-                instance.sync(self.rpr_context, inst,
-                              indirect_only=indirect_only, material_override=material_override,
-                              frame_current=scene.frame_current)
-
-                if self.rpr_engine.test_break():
-                    log.warn("Syncing stopped by user termination")
-                    return
+            if not self.sync_instances(depsgraph, material_override):
+                return
 
-            self.notify_status(0, "Syncing instances 100%")
+            if self.rpr_context.geometry_instancing:
+                self.rpr_context.log_geometry_instancing()
 
             # EXPORT CAMERA
             camera_key = object.key(scene.camera)   # current camera key
@@ -717,19 +949,8 @@ class RenderEngine(Engine):
             # EXPORT PARTICLES
             # Note: particles should be exported after motion blur,
             #       otherwise prev_location of particle will be (0, 0, 0)
-            self.notify_status(0, "Syncing particles")
-            for obj in self.depsgraph_objects(depsgraph):
-                particle.sync(self.rpr_context, obj)
-                if self.rpr_engine.test_break():
-                    log.warn("Syncing stopped by user termination")
-                    return
-
-            # objects linked to scene as a collection are instanced, so walk thru them for particles
-            for entry in self.depsgraph_instances(depsgraph):
-                particle.sync(self.rpr_context, entry.instance_object)
-                if self.rpr_engine.test_break():
-                    log.warn("Syncing stopped by user termination")
-                    return
+            if not self.sync_particles(depsgraph):
+                return
 
         finally:
             if self.rpr_context.do_motion_blur:
@@ -744,7 +965,7 @@ class RenderEngine(Engine):
 
         if enable_adaptive:
             # if adaptive is enable turn on aov and settings
-            self.rpr_context.enable_aov(pyrpr.AOV_VARIANCE)
+            self.rpr_context.enable_aov(pyrpr.AOV_VARIANCE, AOV_CONSUMER_FINAL)
             scene.rpr.limits.set_adaptive_params(self.rpr_context)
 
         # Image filter
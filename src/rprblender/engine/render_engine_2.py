@@ -18,7 +18,7 @@ import time
 import pyrpr
 
 from .render_engine import RenderEngine
-from .context import RPRContext2
+from .context import RPRContext2, PROGRESSIVE_CONSUMERS
 
 from rprblender.utils import logging
 log = logging.Log(tag='RenderEngine2')
@@ -90,9 +90,10 @@ class RenderEngine2(RenderEngine):
                 if is_finished or self.rpr_engine.test_break():
                     break
 
-                self.rpr_context.resolve()
+                self.rpr_context.resolve(consumers=PROGRESSIVE_CONSUMERS)
                 self._update_render_result((0, 0), (self.width, self.height),
-                                           layer_name=self.render_layer_name)
+                                           layer_name=self.render_layer_name,
+                                           consumers=PROGRESSIVE_CONSUMERS)
 
             log('Finish do_resolve')
 
@@ -26,6 +26,7 @@ from bpy_extras import view3d_utils
 
 import pyrpr
 from .engine import Engine
+from .context import AOV_CONSUMER_FINAL, PROGRESSIVE_CONSUMERS
 
 from rprblender.export import camera, material, world, object, instance, volume
 from rprblender.export.mesh import assign_materials
@@ -188,6 +189,9 @@ class ViewportEngine(Engine):
         super().__init__(rpr_engine)
 
         self.gl_texture = gl.GLTexture()
+        self.gl_quad = gl.GLQuad()
+        # render generation of image resolved to GL interop frame buffer
+        self.gl_interop_generation = None
         self.viewport_settings: ViewportSettings = None
         self.world_settings: world.WorldData = None
         self.shading_data: ShadingData = None
@@ -217,6 +221,12 @@ class ViewportEngine(Engine):
         self.selected_objects = None
         self.frame_current = None
 
+        # original object name -> keys of instances which depend on the object: instances
+        # of the object and instances created by the object as instancer
+        self.dependent_instance_keys = {}
+        # instance key -> (original instancer name, instance matrix relative to instancer)
+        self.dependent_instance_matrices = {}
+
         self.user_settings = get_user_settings()
 
     def stop_render(self):
@@ -224,18 +234,22 @@ class ViewportEngine(Engine):
         self.restart_render_event.set()
         self.sync_render_thread.join()
 
+        if self.rpr_context:
+            self.rpr_context.log_resolve_stats()
         self.rpr_context = None
         self.image_filter = None
         self.upscale_filter = None
 
-    def _resolve(self):
-        self.rpr_context.resolve()
+    def _resolve(self, consumers=None):
+        """ Resolves AOVs, if consumers are set only AOVs needed by them are resolved """
+        self.rpr_context.resolve(consumers=consumers)
 
     def notify_status(self, info, status):
         """ Display export progress status """
         wrap_info = textwrap.fill(info, 120)
         self.rpr_engine.update_stats(status, wrap_info)
-        log(status, wrap_info)
+        if log.is_enabled():
+            log(status, wrap_info)
 
         # requesting blender to call draw()
         self.rpr_engine.tag_redraw()
@@ -264,6 +278,8 @@ class ViewportEngine(Engine):
         # exporting instances
         instances_len = len(depsgraph.object_instances)
         last_instances_percent = 0
+        self.dependent_instance_keys = {}
+        self.dependent_instance_matrices = {}
 
         for i, inst in enumerate(self.depsgraph_instances(depsgraph)):
             if self.is_finished:
@@ -279,6 +295,7 @@ class ViewportEngine(Engine):
             instance.sync(self.rpr_context, inst,
                           indirect_only=indirect_only, material_override=material_override,
                           frame_current=self.frame_current)
+            self._add_dependent_instance(inst)
 
         # shadow catcher
         if depsgraph.scene.rpr.viewport_render_mode != 'FULL':  # non-Legacy modes
@@ -350,7 +367,8 @@ class ViewportEngine(Engine):
                     self.rpr_context.sync_auto_adapt_subdivision()
                     self.rpr_context.sync_portal_lights()
                     time_begin = time.perf_counter()
-                    log(f"Restart render [{self.width}, {self.height}]")
+                    if log.is_enabled():
+                        log(f"Restart render [{self.width}, {self.height}]")
 
                 # rendering
                 with self.render_lock:
@@ -437,7 +455,7 @@ class ViewportEngine(Engine):
                             self.upscaled_image = self.upscale_filter.get_data()
 
                     elif self.upscale_filter:
-                        self._resolve()
+                        self._resolve(PROGRESSIVE_CONSUMERS)
                         color = self.rpr_context.get_image()
                         self.upscale_filter.update_input('color', color)
                         self.upscale_filter.run()
@@ -486,6 +504,7 @@ class ViewportEngine(Engine):
 
         scene.rpr.init_rpr_context(self.rpr_context, is_final_engine=False,
                                    use_gl_interop=use_gl_interop)
+        self.rpr_context.cache_mesh_topology = True
 
         self.rpr_context.blender_data['depsgraph'] = depsgraph
 
@@ -500,7 +519,7 @@ class ViewportEngine(Engine):
 
         if viewport_limits.noise_threshold > 0.0:
             # if adaptive is enable turn on aov and settings
-            self.rpr_context.enable_aov(pyrpr.AOV_VARIANCE)
+            self.rpr_context.enable_aov(pyrpr.AOV_VARIANCE, AOV_CONSUMER_FINAL)
             viewport_limits.set_adaptive_params(self.rpr_context)
 
         self.rpr_context.scene.set_name(scene.name)
@@ -560,7 +579,8 @@ class ViewportEngine(Engine):
                          bpy.types.Collection, bpy.types.Light):
             for update in depsgraph.updates:
                 if isinstance(update.id, obj_type):
-                    updates.append((update.id, update.is_updated_geometry, update.is_updated_transform))
+                    updates.append((update.id, update.is_updated_geometry, update.is_updated_transform,
+                                    update.is_updated_shading))
 
                 # Handles Geometry Node updates
                 elif BLENDER_VERSION >= '3.0' and isinstance(update.id, bpy.types.GeometryNodeTree):
@@ -589,13 +609,13 @@ class ViewportEngine(Engine):
                                                for node in image_nodes
                                                if node.image and node.image.source == 'SEQUENCE')
                         if use_auto_refresh:
-                            updates.insert(1, (mat, None, None))
+                            updates.insert(1, (mat, None, None, None))
 
                 volume_domain_mat = set(material_slot.material for obj in self.depsgraph_objects(depsgraph) if volume.get_smoke_modifier(obj)
                                   for material_slot in obj.material_slots if material_slot.material)
                 volume_domain_mat -= set(update[0] for update in updates)
                 for mat in volume_domain_mat:
-                    updates.append((mat, None, None))
+                    updates.append((mat, None, None, None))
 
             # only a selection change
             if context.selected_objects != self.selected_objects \
@@ -629,9 +649,14 @@ class ViewportEngine(Engine):
 
         self._sync_update_before()
         with self.render_lock:
+            # original object name -> (is_updated_geometry, is_updated_transform, evaluated object)
+            # of updated objects
+            updated_objects = {}
+
             for update in updates:
-                obj, is_updated_geometry, is_updated_transform = update
-                log("sync_update", obj)
+                obj, is_updated_geometry, is_updated_transform, is_updated_shading = update
+                if log.is_enabled():
+                    log("sync_update", obj)
                 if isinstance(obj, bpy.types.Scene):
                     is_updated |= self.update_render(obj, depsgraph.view_layer)
 
@@ -652,23 +677,24 @@ class ViewportEngine(Engine):
                     if obj.type == 'CAMERA':
                         continue
 
-                    indirect_only = obj.original.indirect_only_get(view_layer=depsgraph.view_layer)
+                    kwargs = {
+                        'indirect_only': obj.original.indirect_only_get(view_layer=depsgraph.view_layer),
+                        'material_override': material_override,
+                        'frame_current': self.frame_current,
+                    }
                     active_and_mode_changed = mode_updated and context.active_object == obj.original
-                    is_updated |= object.sync_update(self.rpr_context, obj,
-                                                     is_updated_geometry or active_and_mode_changed,
-                                                     is_updated_transform,
-                                                     indirect_only=indirect_only,
-                                                     material_override=material_override,
-                                                     frame_current=self.frame_current)
+                    is_updated_geometry = is_updated_geometry or active_and_mode_changed
+
+                    if is_updated_geometry:
+                        is_updated |= self._sync_update_object_geometry(obj, is_updated_transform, **kwargs)
+                    elif is_updated_transform and not is_updated_shading:
+                        is_updated |= self._sync_update_object_transform(obj, **kwargs)
+                    else:
+                        is_updated |= self._sync_update_object_shading(obj, is_updated_transform, **kwargs)
                     is_obj_updated |= is_updated
 
-                    for inst in depsgraph.object_instances:
-                        ob = inst.object
-                        if not inst.is_instance:
-                            continue
-
-                        if ob.original == obj.original:
-                            instance.sync_update(self.rpr_context, inst, is_updated_geometry, is_updated_transform)
+                    if is_updated_geometry or is_updated_transform:
+                        updated_objects[obj.original.name_full] = (is_updated_geometry, is_updated_transform, obj)
 
                     if sync_collection:
                         continue
@@ -715,6 +741,9 @@ class ViewportEngine(Engine):
                     sync_collection = True
                     continue
 
+            if updated_objects:
+                is_updated |= self._sync_update_dependent_instances(depsgraph, updated_objects)
+
             if sync_world:
                 world_settings = self._get_world_settings(depsgraph)
                 if self.world_settings != world_settings:
@@ -738,63 +767,81 @@ class ViewportEngine(Engine):
             self.restart_render_event.set()
             self._sync_update_after()
 
-    def _sync_update_before(self):
-        pass
+    def _sync_update_object_geometry(self, obj, is_updated_transform, **kwargs):
+        """ Object geometry is changed: object is re-exported """
+        return object.sync_update(self.rpr_context, obj, True, is_updated_transform, **kwargs)
 
-    def _sync_update_after(self):
-        pass
+    def _sync_update_object_transform(self, obj, **kwargs):
+        """ Only object transform is changed: transforms of exported shapes are updated """
+        return object.sync_update_transform(self.rpr_context, obj, **kwargs)
 
-    @staticmethod
-    def _draw_texture(texture_id, x, y, width, height):
-        # INITIALIZATION
+    def _sync_update_object_shading(self, obj, is_updated_transform, **kwargs):
+        """ Material slots or visibility are changed: materials and visibility are reassigned """
+        return object.sync_update(self.rpr_context, obj, False, is_updated_transform, **kwargs)
 
-        # Getting shader program
-        shader_program = bgl.Buffer(bgl.GL_INT, 1)
-        bgl.glGetIntegerv(bgl.GL_CURRENT_PROGRAM, shader_program)
+    def _add_dependent_instance(self, inst):
+        """
+        Adds instance to index of instances by instanced object and by instancer,
+        instance matrix relative to instancer is kept to move instance with instancer
+        """
+        # evaluated instanced object has different key, therefore original object name is used
+        inst_key = instance.key(inst)
+        for obj in (inst.object, inst.parent):
+            self.dependent_instance_keys.setdefault(obj.original.name_full, set()).add(inst_key)
 
-        # Generate vertex array
-        vertex_array = bgl.Buffer(bgl.GL_INT, 1)
-        bgl.glGenVertexArrays(1, vertex_array)
+        self.dependent_instance_matrices[inst_key] = (inst.parent.original.name_full,
+                                                      instance.get_parent_relative_matrix(inst))
+        return inst_key
 
-        texturecoord_location = bgl.glGetAttribLocation(shader_program[0], "texCoord")
-        position_location = bgl.glGetAttribLocation(shader_program[0], "pos")
+    def _sync_update_dependent_instances(self, depsgraph, updated_objects):
+        """
+        Updates instances which depend on updated objects,
+        updated_objects: {original object name: (is_updated_geometry, is_updated_transform, evaluated object)}
+        """
+        # instances moved with their instancer get transforms from index, other updated instances
+        # are synced from depsgraph
+        moved_instances = {}
+        instance_updates = {}
+        for obj_name, (is_updated_geometry, is_updated_transform, obj) in updated_objects.items():
+            for inst_key in self.dependent_instance_keys.get(obj_name, ()):
+                parent_name, relative_matrix = self.dependent_instance_matrices[inst_key]
+                if obj_name == parent_name and not is_updated_geometry:
+                    moved_instances[inst_key] = (obj, relative_matrix)
+                    continue
 
-        # Generate geometry buffers for drawing textured quad
-        position = [x, y, x + width, y, x + width, y + height, x, y + height]
-        position = bgl.Buffer(bgl.GL_FLOAT, len(position), position)
-        texcoord = [0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0]
-        texcoord = bgl.Buffer(bgl.GL_FLOAT, len(texcoord), texcoord)
+                geometry, transform = instance_updates.get(inst_key, (False, False))
+                instance_updates[inst_key] = (geometry or is_updated_geometry,
+                                              transform or is_updated_transform)
 
-        vertex_buffer = bgl.Buffer(bgl.GL_INT, 2)
-        bgl.glGenBuffers(2, vertex_buffer)
-        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, vertex_buffer[0])
-        bgl.glBufferData(bgl.GL_ARRAY_BUFFER, 32, position, bgl.GL_STATIC_DRAW)
-        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, vertex_buffer[1])
-        bgl.glBufferData(bgl.GL_ARRAY_BUFFER, 32, texcoord, bgl.GL_STATIC_DRAW)
-        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
+        updated = False
+        for inst_key, (parent, relative_matrix) in moved_instances.items():
+            if inst_key in instance_updates:
+                continue
 
-        # DRAWING
-        bgl.glActiveTexture(bgl.GL_TEXTURE0)
-        bgl.glBindTexture(bgl.GL_TEXTURE_2D, texture_id)
+            if instance.sync_update_parent_transform(self.rpr_context, inst_key, parent, relative_matrix):
+                updated = True
+            else:
+                # instance isn't exported yet
+                instance_updates[inst_key] = (False, True)
 
-        bgl.glBindVertexArray(vertex_array[0])
-        bgl.glEnableVertexAttribArray(texturecoord_location)
-        bgl.glEnableVertexAttribArray(position_location)
+        if not instance_updates:
+            return updated
 
-        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, vertex_buffer[0])
-        bgl.glVertexAttribPointer(position_location, 2, bgl.GL_FLOAT, bgl.GL_FALSE, 0, None)
-        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, vertex_buffer[1])
-        bgl.glVertexAttribPointer(texturecoord_location, 2, bgl.GL_FLOAT, bgl.GL_FALSE, 0, None)
-        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
+        # depsgraph instances couldn't be accessed by key, they are walked once for all instances
+        # with updated geometry or relative transform
+        for inst in self.depsgraph_instances(depsgraph):
+            update = instance_updates.get(instance.key(inst), None)
+            if update:
+                updated |= instance.sync_update(self.rpr_context, inst, *update)
+                self._add_dependent_instance(inst)
 
-        bgl.glDrawArrays(bgl.GL_TRIANGLE_FAN, 0, 4)
+        return updated
 
-        bgl.glBindVertexArray(0)
-        bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
+    def _sync_update_before(self):
+        pass
 
-        # DELETING
-        bgl.glDeleteBuffers(2, vertex_buffer)
-        bgl.glDeleteVertexArrays(1, vertex_array)
+    def _sync_update_after(self):
+        pass
 
     def _get_render_image(self):
         return self.rpr_context.get_image()
@@ -813,8 +860,8 @@ class ViewportEngine(Engine):
             self.rpr_engine.bind_display_space_shader(scene)
 
             # note this has to draw to region size, not scaled down size
-            self._draw_texture(texture_id, *self.viewport_settings.border[0],
-                               *self.viewport_settings.border[1])
+            self.gl_quad.draw(texture_id, *self.viewport_settings.border[0],
+                              *self.viewport_settings.border[1])
 
             self.rpr_engine.unbind_display_space_shader()
             bgl.glDisable(bgl.GL_BLEND)
@@ -833,17 +880,27 @@ class ViewportEngine(Engine):
             return
 
         with self.render_lock:
-            self._resolve()
             if self.rpr_context.gl_interop:
+                if self.gl_interop_generation != self.rpr_context.render_generation:
+                    self._resolve(PROGRESSIVE_CONSUMERS)
+                    self.gl_interop_generation = self.rpr_context.render_generation
+
                 self.draw_texture(self.rpr_context.get_frame_buffer().texture_id, scene)
                 return
 
             if self.width * self.height == 0:
                 return
 
-            im = self._get_render_image()
+            # image isn't resolved and uploaded again if nothing was rendered since previous draw
+            generation = self.rpr_context.render_generation
+            im = None
+            if generation != self.gl_texture.generation:
+                self._resolve(PROGRESSIVE_CONSUMERS)
+                im = self._get_render_image()
+
+        if im is not None:
+            self.gl_texture.set_image(im, generation)
 
-        self.gl_texture.set_image(im)
         self.draw_texture(self.gl_texture.texture_id, scene)
 
     def draw(self, context):
@@ -968,10 +1025,12 @@ class ViewportEngine(Engine):
         view_layer_data = ViewLayerSettings(depsgraph.view_layer)
         material_override = view_layer_data.material_override
 
-        # set of depsgraph object keys
+        # set of depsgraph object keys, index of dependent instances is rebuilt along the way
+        self.dependent_instance_keys = {}
+        self.dependent_instance_matrices = {}
         depsgraph_keys = set.union(
             set(object.key(obj) for obj in self.depsgraph_objects(depsgraph)),
-            set(instance.key(obj) for obj in self.depsgraph_instances(depsgraph))
+            set(self._add_dependent_instance(inst) for inst in self.depsgraph_instances(depsgraph))
         )
 
         # set of visible rpr object keys
@@ -1081,13 +1140,18 @@ class ViewportEngine(Engine):
             active_mat = mat
 
         updated = False
+        is_shared_synced = False
         for obj in objects:
-            rpr_material = material.sync_update(self.rpr_context, active_mat, obj=obj)
-            rpr_volume = material.sync_update(self.rpr_context, active_mat, 'Volume', obj=obj)
-            rpr_displacement = material.sync_update(self.rpr_context, active_mat, 'Displacement', obj=obj)
+            # material which doesn't depend on object is shared by all users, it is recreated only once
+            if not is_shared_synced:
+                rpr_material = material.sync_update(self.rpr_context, active_mat, obj=obj)
+                rpr_volume = material.sync_update(self.rpr_context, active_mat, 'Volume', obj=obj)
+                rpr_displacement = material.sync_update(self.rpr_context, active_mat, 'Displacement', obj=obj)
 
-            if not rpr_material and not rpr_volume and not rpr_displacement:
-                continue
+                if not rpr_material and not rpr_volume and not rpr_displacement:
+                    continue
+
+                is_shared_synced = not material.is_object_dependent(self.rpr_context, active_mat)
 
             indirect_only = obj.original.indirect_only_get(view_layer=depsgraph.view_layer)
 
@@ -45,11 +45,12 @@ class ViewportEngine2(ViewportEngine):
         self.resolve_thread.join()
 
         self.rpr_context.set_render_update_callback(None)
+        self.rpr_context.log_resolve_stats()
         self.rpr_context = None
         self.image_filter = None
         self.upscale_filter = None
 
-    def _resolve(self):
+    def _resolve(self, consumers=None):
         self.rpr_context.resolve(None if self.image_filter and self.is_last_iteration else
                                  (pyrpr.AOV_COLOR,))
         
@@ -41,7 +41,7 @@ class ViewportEngine(viewport_engine.ViewportEngine):
 
         return restart
 
-    def _resolve(self):
+    def _resolve(self, consumers=None):
         self.render_image = self.rpr_context.get_image()
 
     def _get_render_image(self):
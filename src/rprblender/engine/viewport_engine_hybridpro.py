@@ -34,7 +34,7 @@ class ViewportEngine(viewport_engine.ViewportEngine):
         self.render_image = None
         self.is_denoised = False
 
-    def _resolve(self):
+    def _resolve(self, consumers=None):
         self.render_image = self.rpr_context.get_image()
 
     def _get_render_image(self):
@@ -13,6 +13,7 @@
 # limitations under the License.
 #********************************************************************
 from dataclasses import dataclass
+from itertools import chain
 import numpy as np
 
 import bpy
@@ -20,6 +21,7 @@ import bpy
 from . import particle, object, instance, material
 from rprblender.utils import get_data_from_collection
 
+from rprblender.utils import profiler
 from rprblender.utils import logging
 log = logging.Log(tag='export.hair')
 
@@ -58,28 +60,28 @@ class CurveData:
             (0, num_parents) if settings.child_type == 'NONE' else \
                 (num_parents, len(p_sys.child_particles))
 
-        # getting all points of all curves
+        if curves_count == 0:
+            return None
+
+        # getting all points of all curves, Blender doesn't provide bulk access to hair paths,
+        # therefore points are read into preallocated array without intermediate tuples
         # Note: points which are not available are equal to (0, 0, 0).
         #       We will weld such points by updating (0, 0, 0) point to previous point
+        co_hair = p_sys.co_hair
         all_points = np.fromiter(
-            (elem for i in range(start_index, start_index + curves_count)
-             for step in range(length)
-             for elem in p_sys.co_hair(obj, particle_no=i, step=step)),
-            dtype=np.float32
-        ).reshape(-1, length, 3)
-
-        # welding (0, 0, 0) point by previous point
-        for curve in all_points:
-            for i in range(1, length):
-                # if all elements of curve[i] == 0 then make it equal to curve[i-1]
-                if np.count_nonzero(curve[i]) == 0:
-                    curve[i] = curve[i - 1]
-
-        # getting indices of curves rows (points) with any non-zero values
-        curve_indices = np.arange(len(all_points), dtype=np.int32)
-
-        if len(curve_indices) == 0:
-            return None
+            chain.from_iterable(co_hair(obj, particle_no=i, step=step)
+                                for i in range(start_index, start_index + curves_count)
+                                for step in range(length)),
+            dtype=np.float32, count=curves_count * length * 3
+        ).reshape(curves_count, length, 3)
+
+        # welding (0, 0, 0) point by previous point: each zero point takes index of
+        # the last non-zero point before it, then all points are gathered at once
+        is_zero = ~all_points.any(axis=2)
+        is_zero[:, 0] = False
+        weld_indices = np.where(is_zero, 0, np.arange(length, dtype=np.int32))
+        np.maximum.accumulate(weld_indices, axis=1, out=weld_indices)
+        all_points = np.take_along_axis(all_points, weld_indices[:, :, np.newaxis], axis=1)
 
         data = CurveData()
 
@@ -89,16 +91,14 @@ class CurveData:
         root = settings.root_radius * radius_scale / 2.
         tip = settings.tip_radius * radius_scale / 2.
 
-        data.points_radii = np.fromiter(
-            (root + (tip - root) * shape_f(i / (length - 1), settings.shape) for i in
-             range(length)),
-            dtype=np.float32)
+        data.points_radii = (root + (tip - root) * shape_f(np.linspace(0.0, 1.0, length),
+                                                           settings.shape)).astype(np.float32)
 
         if settings.use_close_tip:
             data.points_radii[length - 1] = 0.0
 
         # getting final curve points
-        data.points = np.ascontiguousarray(all_points[curve_indices], dtype=np.float32)
+        data.points = np.ascontiguousarray(all_points, dtype=np.float32)
 
         if obj.type == 'MESH' and len(obj.data.uv_layers) > 0:
             # finding corresponded active ParticleSystemModifier
@@ -114,16 +114,15 @@ class CurveData:
                 return None
 
             # getting all UVs
-            all_uvs = np.fromiter(
-                (elem for i in range(start_index, start_index + curves_count)
-                 for elem in p_sys.uv_on_emitter(p_modifier,
-                                                 particle=p_sys.particles[(i - start_index) % num_parents],
-                                                 particle_no=i)),
-                dtype=np.float32
-            ).reshape(-1, 2)
-
-            # getting final UVs
-            data.uvs = np.ascontiguousarray(all_uvs[curve_indices], dtype=np.float32)
+            uv_on_emitter = p_sys.uv_on_emitter
+            particles = tuple(p_sys.particles)
+            data.uvs = np.fromiter(
+                chain.from_iterable(uv_on_emitter(p_modifier,
+                                                  particle=particles[(i - start_index) % num_parents],
+                                                  particle_no=i)
+                                    for i in range(start_index, start_index + curves_count)),
+                dtype=np.float32, count=curves_count * 2
+            ).reshape(curves_count, 2)
 
         else:
             data.uvs = None
@@ -143,17 +142,22 @@ class CurveData:
             data.points = get_data_from_collection(curves.points, 'position',
                                                    (len(curves.curves), points_length_max, 3))
 
+            # get radius for all control point
+            points_radii = get_data_from_collection(curves.points, 'radius',
+                                                    (len(curves.curves), points_length_max))
+
         else:
-            points = get_data_from_collection(curves.points, 'position', (len(curves.points), 3))
+            # curves are padded to the longest one by repeating their last point
             points_index = get_data_from_collection(curves.curves, 'first_point_index',
                                                     (len(curves.curves),), dtype=np.int32)
-            data.points = np.zeros((len(curves.curves), points_length_max, 3), dtype=np.float32)
-            for i in range(len(curves.curves)):
-                for j in range(points_length_max):
-                    data.points[i, j, :] = points[(points_index[i] + min(j, points_length[i] - 1)), :]
+            indices = points_index[:, np.newaxis] + \
+                np.minimum(np.arange(points_length_max, dtype=np.int32), points_length[:, np.newaxis] - 1)
+
+            points = get_data_from_collection(curves.points, 'position', (len(curves.points), 3))
+            data.points = np.ascontiguousarray(points[indices])
 
-        # get radius for all control point
-        points_radii = get_data_from_collection(curves.points, 'radius', (len(curves.curves), points_length_max))
+            points_radii = get_data_from_collection(curves.points, 'radius', (len(curves.points),))
+            points_radii = np.ascontiguousarray(points_radii[indices])
 
         # check if radius the same for all control point,
         # in this case we generate radius for control points of one curve
@@ -179,6 +183,7 @@ def hair_p_sys(emitter):
     return (p_sys for p_sys in emitter.particle_systems if p_sys.settings.type == 'HAIR')
 
 
+@profiler.profile('hair.sync')
 def sync(rpr_context, emitter: bpy.types.Object):
     """ sync the particle system """
     from rprblender.engine.render_engine import RenderEngine
@@ -241,6 +246,7 @@ def sync_update(rpr_context, emitter: bpy.types.Object, is_updated_geometry, is_
     return updated
 
 
+@profiler.profile('hair.sync_curves')
 def sync_curves(rpr_context, obj: bpy.types.Object):
     log("sync_curves", obj, obj.data)
 
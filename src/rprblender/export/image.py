@@ -20,9 +20,11 @@ import bpy
 import bpy_extras
 
 from rprblender import utils
+from rprblender.utils import image_cache
 from rprblender.engine import context
 from rprblender.engine.context_hybridpro import RPRContext as RPRContextHybridPro
 
+from rprblender.utils import profiler
 from rprblender.utils import logging
 from rprblender.utils import get_sequence_frame_file_path
 
@@ -53,6 +55,7 @@ def key(image: bpy.types.Image, color_space, frame_number=None, UDIM_tile=0):
     return (image.name, color_space)
 
 
+@profiler.profile('image.sync')
 def sync(rpr_context, image: bpy.types.Image, use_color_space=None, frame_number=None):
     """ Creates pyrpr.Image from bpy.types.Image """
     from rprblender.engine.export_engine import ExportEngine
@@ -194,9 +197,56 @@ class ImagePixels:
         return rpr_image
 
 
-def _get_temp_image_path(image: [bpy.types.Image, str], extension="png") -> str:
-    h = abs(hash(image if isinstance(image, str) else image.name))
-    return str(utils.get_temp_pid_dir() / f"{h}.{extension}")
+def _output_settings(scene):
+    """ Scene settings which affect image saved by save_render() """
+    view, display, image_settings = scene.view_settings, scene.display_settings, scene.render.image_settings
+    return (view.view_transform, view.look, view.exposure, view.gamma, display.display_device,
+            image_settings.color_depth, image_settings.color_mode)
+
+
+# content hashes of packed files: (image pointer, name, filepath, packed file pointer, size) -> hash
+_packed_file_hashes = {}
+
+
+def _pixels_hash(image):
+    return image_cache.hash_key(utils.get_prop_array_data(image.pixels), tuple(image.size),
+                                image.channels)
+
+
+def _packed_file_hash(image):
+    """ Packed file is replaced by new one on repack, so its data is hashed once """
+    packed_file = image.packed_file
+    file_key = (image.as_pointer(), image.name_full, image.filepath,
+                packed_file.as_pointer(), packed_file.size)
+
+    file_hash = _packed_file_hashes.get(file_key, None)
+    if not file_hash:
+        file_hash = image_cache.hash_key(packed_file.data)
+        _packed_file_hashes[file_key] = file_hash
+
+    return file_hash
+
+
+def _source_hash(image, file_path=None):
+    """
+    Content hash of image source data: generated image settings, packed file or source file.
+    Pixels are hashed only for images edited in Blender or without other source of data
+    """
+    if image.is_dirty:
+        return _pixels_hash(image)
+
+    if image.source == 'GENERATED':
+        return image_cache.hash_key(image.generated_type, tuple(image.generated_color),
+                                    image.generated_width, image.generated_height,
+                                    image.use_generated_float)
+
+    if image.packed_file:
+        return _packed_file_hash(image)
+
+    if file_path and os.path.isfile(file_path):
+        return image_cache.hash_file(file_path)
+
+    return _pixels_hash(image)
 
 
 def _save_temp_image(image, target_format, temp_path, depsgraph):
@@ -209,15 +259,19 @@ def _save_temp_image(image, target_format, temp_path, depsgraph):
 
 def cache_image_file(image: bpy.types.Image, depsgraph) -> str:
     """
-    See if image is a file, cache image pixels to temporary folder if not.
+    See if image is a file, cache image pixels to image cache folder if not.
     Return image file path.
     """
-    if image.source != 'FILE':
-        temp_path = _get_temp_image_path(image)
-        if image.is_dirty or not os.path.isfile(temp_path):
-            image.save_render(temp_path)
+    color_space = image.colorspace_settings.name
 
-        return temp_path
+    if image.source != 'FILE':
+        # key uses format of saved file, scene file_format is changed by _save_temp_image()
+        target_format, target_extension = IMAGE_FORMATS.get(image.file_format, DEFAULT_FORMAT)
+        cache_key = image_cache.hash_key(_source_hash(image), color_space,
+                                         target_format, _output_settings(depsgraph.scene_eval))
+        return image_cache.get_cached_file(
+            cache_key, target_extension,
+            lambda path: _save_temp_image(image, target_format, path, depsgraph))
 
     file_path = image.filepath_from_user()
 
@@ -229,23 +283,21 @@ def cache_image_file(image: bpy.types.Image, depsgraph) -> str:
             log.warn("Can't load image", image, file_path)
             return None
 
-        temp_path = _get_temp_image_path(image, "ies")
-        if not os.path.isfile(temp_path):
-            # save data of packed file
-            Path(temp_path).write_bytes(image.packed_file.data)
-
-        return temp_path
+        # save data of packed file
+        data = image.packed_file.data
+        return image_cache.get_cached_file(image_cache.hash_key(data), "ies",
+                                           lambda path: Path(path).write_bytes(data))
 
     if image.is_dirty or not os.path.isfile(file_path) \
             or file_path.lower().endswith(UNSUPPORTED_IMAGES):
         target_format, target_extension = IMAGE_FORMATS.get(image.file_format, DEFAULT_FORMAT)
 
         # getting file path from image cache and if such file not exist saving image to cache
-        temp_path = _get_temp_image_path(image, target_extension)
-        if image.is_dirty or not os.path.isfile(temp_path):
-            _save_temp_image(image, target_format, temp_path, depsgraph)
-
-        return temp_path
+        cache_key = image_cache.hash_key(_source_hash(image, file_path), color_space,
+                                         target_format, _output_settings(depsgraph.scene_eval))
+        return image_cache.get_cached_file(
+            cache_key, target_extension,
+            lambda path: _save_temp_image(image, target_format, path, depsgraph))
 
     return file_path
 
@@ -260,14 +312,13 @@ def cache_image_file_path(file_path: str, depsgraph) -> str:
     else:
         target_format, target_extension = IMAGE_FORMATS['TIFF']
 
-    temp_path = _get_temp_image_path(file_path, target_extension)
-    if os.path.isfile(temp_path):
-        return temp_path
-
-    image = bpy_extras.image_utils.load_image(file_path)
-    try:
-        _save_temp_image(image, target_format, temp_path, depsgraph)
-    finally:
-        bpy.data.images.remove(image)
+    def save_image(path):
+        image = bpy_extras.image_utils.load_image(file_path)
+        try:
+            _save_temp_image(image, target_format, path, depsgraph)
+        finally:
+            bpy.data.images.remove(image)
 
-    return temp_path
+    cache_key = image_cache.hash_key(image_cache.hash_file(file_path), target_format,
+                                     _output_settings(depsgraph.scene_eval))
+    return image_cache.get_cached_file(cache_key, target_extension, save_image)
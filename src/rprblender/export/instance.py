@@ -29,13 +29,19 @@ def get_transform(instance: bpy.types.DepsgraphObjectInstance):
     return np.array(instance.matrix_world, dtype=np.float32).reshape(4, 4)
 
 
+def get_parent_relative_matrix(instance: bpy.types.DepsgraphObjectInstance):
+    """ Returns instance matrix relative to its instancer, it is kept to move instance with instancer """
+    return instance.parent.matrix_world.inverted_safe() @ instance.matrix_world
+
+
 def sync(rpr_context, instance: bpy.types.DepsgraphObjectInstance, **kwargs):
     """ sync the blender instance """
 
     assert instance.is_instance  # expecting: instance.is_instance == True
 
     instance_key = key(instance)
-    log("sync", instance, instance_key)
+    if log.is_enabled():
+        log("sync", instance, instance_key)
 
     obj = instance.instance_object if instance.parent.name != instance.object.name else instance.object
 
@@ -78,7 +84,8 @@ def sync(rpr_context, instance: bpy.types.DepsgraphObjectInstance, **kwargs):
 
 def sync_update(rpr_context: RPRContext, instance: bpy.types.DepsgraphObjectInstance, is_updated_geometry, is_updated_transform, **kwargs):
     """ Update existing instance or create a new instance """
-    log("sync_update", instance)
+    if log.is_enabled():
+        log("sync_update", instance)
 
     inst_key = key(instance)
     rpr_shape = rpr_context.objects.get(inst_key, None)
@@ -97,6 +104,19 @@ def sync_update(rpr_context: RPRContext, instance: bpy.types.DepsgraphObjectInst
     return True
 
 
+def sync_update_parent_transform(rpr_context: RPRContext, inst_key, parent: bpy.types.Object,
+                                relative_matrix):
+    """ Updates transform of instance moved with its instancer, returns False if instance isn't exported """
+    rpr_shape = rpr_context.objects.get(inst_key, None)
+    if not rpr_shape:
+        return False
+
+    log("sync_update_parent_transform", inst_key)
+    transform = np.array(parent.matrix_world @ relative_matrix, dtype=np.float32).reshape(4, 4)
+    rpr_shape.set_transform(transform)
+    return True
+
+
 def cache_blur_data(rpr_context, inst: bpy.types.DepsgraphObjectInstance):
     if inst.parent.rpr.motion_blur:
         rpr_context.transform_cache[key(inst)] = get_transform(inst)
@@ -24,6 +24,7 @@ from rprblender.properties.light import MAX_LUMINOUS_EFFICACY
 from . import mesh, image, object
 from rprblender.utils.conversion import convert_kelvins_to_rgb
 
+from rprblender.utils import profiler
 from rprblender.utils import logging
 log = logging.Log(tag='export.light')
 
@@ -114,6 +115,7 @@ def sync_ies_light(rpr_context, light: bpy.types.Light, light_key) -> RPRContext
     return rpr_light
 
 
+@profiler.profile('light.sync')
 def sync(rpr_context: RPRContext, obj: bpy.types.Object, instance_key=None):
     """ Creates pyrpr.Light from obj.data: bpy.types.Light """
 
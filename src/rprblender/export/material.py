@@ -17,6 +17,7 @@ import bpy
 from rprblender.engine.context import RPRContext
 from rprblender.nodes.blender_nodes import ShaderNodeOutputMaterial
 
+from rprblender.utils import profiler
 from rprblender.utils import logging
 from . import object
 log = logging.Log(tag='export.Material')
@@ -29,6 +30,49 @@ def key(material: bpy.types.Material, obj=None, input_socket_key='Surface'):
     return (mat_key, obj_name, input_socket_key)
 
 
+# outputs of nodes which export depends on the object material is assigned to,
+# None means all outputs of the node
+OBJECT_DEPENDENT_NODE_OUTPUTS = {
+    'ShaderNodeObjectInfo': ('Location', 'Color', 'Object Index', 'Random'),
+    'ShaderNodeTexCoord': ('Generated',),
+    'ShaderNodeUVMap': None,
+    'ShaderNodeAttribute': None,
+    'ShaderNodeVolumePrincipled': None,
+    'ShaderNodeVolumeScatter': None,
+    'ShaderNodeVolumeInfo': None,
+}
+
+
+def _is_node_tree_object_dependent(node_tree):
+    for node in node_tree.nodes:
+        if node.bl_idname == 'ShaderNodeGroup':
+            if node.node_tree and _is_node_tree_object_dependent(node.node_tree):
+                return True
+            continue
+
+        if node.bl_idname not in OBJECT_DEPENDENT_NODE_OUTPUTS:
+            continue
+
+        outputs = OBJECT_DEPENDENT_NODE_OUTPUTS[node.bl_idname]
+        if outputs is None or any(output.is_linked for output in node.outputs if output.name in outputs):
+            return True
+
+    return False
+
+
+def is_object_dependent(rpr_context, material: bpy.types.Material) -> bool:
+    """
+    Checks if material export depends on the object it is assigned to.
+    Such material has separate node graph per object, other materials are shared by all users.
+    """
+    is_dependent = rpr_context.material_object_dependency.get(material.name_full, None)
+    if is_dependent is None:
+        is_dependent = bool(material.node_tree) and _is_node_tree_object_dependent(material.node_tree)
+        rpr_context.material_object_dependency[material.name_full] = is_dependent
+
+    return is_dependent
+
+
 def get_material_output_node(material):
     """ Finds output node in material tree and exports it """
     if not material.node_tree:
@@ -67,6 +111,7 @@ def get_material_input_node(material, input_socket_key: str):
     return socket_in.links[0].from_node
 
 
+@profiler.profile('material.sync')
 def sync(rpr_context: RPRContext, material: bpy.types.Material, input_socket_key='Surface', *,
          obj: bpy.types.Object = None):
     """
@@ -74,7 +119,10 @@ def sync(rpr_context: RPRContext, material: bpy.types.Material, input_socket_key
     In other cases: returns None
     """
 
-    log(f"sync {material} '{input_socket_key}'; obj {obj}")
+    log("sync", material, input_socket_key, "obj", obj)
+
+    if obj is not None and not is_object_dependent(rpr_context, material):
+        obj = None
 
     mat_key = key(material, obj, input_socket_key)
     rpr_material = rpr_context.materials.get(mat_key, None)
@@ -105,9 +153,20 @@ def sync_update(rpr_context: RPRContext, material: bpy.types.Material, input_soc
 
     log("sync_update", material)
 
-    mat_key = key(material, obj, input_socket_key)
-    if mat_key in rpr_context.materials:
-        rpr_context.remove_material(mat_key)
+    # material could become dependent or independent on the object after update,
+    # therefore both object and shared materials are removed
+    was_dependent = rpr_context.material_object_dependency.pop(material.name_full, None)
+    # nodes shared with other materials could be changed by update of node tree or node groups
+    rpr_context.remove_material_node_structures(material.name_full)
+    for mat_key in {key(material, obj, input_socket_key), key(material, None, input_socket_key)}:
+        if mat_key in rpr_context.materials:
+            rpr_context.remove_material(mat_key)
+
+    if was_dependent and not is_object_dependent(rpr_context, material):
+        # material became shared, its node graphs of other objects aren't used anymore
+        for mat_key in tuple(rpr_context.child_material_keys.get(material.name_full, ())):
+            if mat_key[1] and mat_key in rpr_context.materials:
+                rpr_context.remove_material(mat_key)
 
     sync(rpr_context, material, obj=obj)
 
@@ -13,6 +13,8 @@
 # limitations under the License.
 #********************************************************************
 from dataclasses import dataclass
+import copy
+import hashlib
 import numpy as np
 import math
 
@@ -26,12 +28,17 @@ from rprblender.engine.context_hybridpro import RPRContext as RPRContextHybridPr
 from . import object, material, volume
 from rprblender.utils import get_data_from_collection, BLENDER_VERSION
 
+from rprblender.utils import profiler
 from rprblender.utils import logging
 log = logging.Log(tag='export.mesh')
 
 
 NUM_TRIANGLES_WARNING = 1000000
 
+# modifiers which could change UVs or vertex colors without changing mesh topology,
+# topology of such meshes isn't reused
+TOPOLOGY_UNSAFE_MODIFIERS = ('UV_PROJECT', 'UV_WARP', 'NODES', 'DATA_TRANSFER', 'DYNAMIC_PAINT', 'OCEAN')
+
 
 def key(obj):
     return f"{obj.data.name_full}_{obj.original.type}"
@@ -51,9 +58,22 @@ class MeshData:
     vertex_colors: np.array = None
     area: float = None
 
+    # (colors, color_indices) of active vertex color map, scattered to vertex_colors by postprocess()
+    loop_colors: tuple = None
+
+    # (vertices count, loops count, UV layers and vertex color names), with equal vertex_indices
+    # it identifies mesh topology
+    topology_key: tuple = None
+    is_topology_reused: bool = False
+
     @staticmethod
-    def init_from_mesh(mesh: bpy.types.Mesh, calc_area=False, obj=None):
-        """ Returns MeshData from bpy.types.Mesh """
+    def init_from_mesh(mesh: bpy.types.Mesh, calc_area=False, obj=None, postprocess=True, topology=None):
+        """
+        Returns MeshData from bpy.types.Mesh.
+        With postprocess=False only bpy data is read, postprocess() has to be called later.
+        topology is MeshData of previously exported mesh: if mesh topology isn't changed,
+        index arrays are taken from topology, vertices, normals, UVs and colors are read.
+        """
         uv_mesh = mesh
         if obj and obj.mode != 'OBJECT':
             mesh = obj.data
@@ -80,6 +100,8 @@ class MeshData:
         data.vertices = get_data_from_collection(mesh.vertices, 'co', (len(mesh.vertices), 3))
         data.normals = get_data_from_collection(mesh.loop_triangles, 'split_normals',
                                                 (tris_len * 3, 3))
+        data.vertex_indices = get_data_from_collection(mesh.loop_triangles, 'vertices',
+                                                       (tris_len * 3,), np.int32)
 
         data.uvs = []
         data.uv_indices = []
@@ -93,48 +115,114 @@ class MeshData:
 
 
         primary_uv = uv_mesh.rpr.primary_uv_layer
+        secondary_uv = uv_mesh.rpr.secondary_uv_layer(obj) if primary_uv and obj else None
+        active_colors = mesh.vertex_colors.active
+        data.topology_key = (len(mesh.vertices), len(mesh.loops),
+                             *(layer.name if layer else None for layer in (primary_uv, secondary_uv, active_colors)))
+
+        # UVs and colors are read anyway, they are changed by UV editing and vertex painting
+        # without topology changes
+        if topology and not calc_area:
+            data.reuse_topology(topology)
+
+        reused_uv_indices = data.uv_indices
+        data.uv_indices = []
+
         if primary_uv:
             uvs = get_data_from_collection(primary_uv.data, 'uv', (len(primary_uv.data), 2))
-            uv_indices = get_data_from_collection(mesh.loop_triangles, 'loops',
-                                                  (tris_len * 3,), np.int32)
+            uv_indices = reused_uv_indices[0] if reused_uv_indices else \
+                get_data_from_collection(mesh.loop_triangles, 'loops', (tris_len * 3,), np.int32)
 
             if len(uvs) > 0:
                 data.uvs.append(uvs)
                 data.uv_indices.append(uv_indices)
 
-            if obj:
-                secondary_uv = uv_mesh.rpr.secondary_uv_layer(obj)
-                if secondary_uv:
-                    uvs = get_data_from_collection(secondary_uv.data, 'uv', (len(secondary_uv.data), 2))
-                    if len(uvs) > 0:
-                        data.uvs.append(uvs)
-                        data.uv_indices.append(uv_indices)
-
-        data.num_face_vertices = np.full((tris_len,), 3, dtype=np.int32)
-        data.vertex_indices = get_data_from_collection(mesh.loop_triangles, 'vertices',
-                                                       (tris_len * 3,), np.int32)
-        data.normal_indices = np.arange(tris_len * 3, dtype=np.int32)
+            if secondary_uv:
+                uvs = get_data_from_collection(secondary_uv.data, 'uv', (len(secondary_uv.data), 2))
+                if len(uvs) > 0:
+                    data.uvs.append(uvs)
+                    data.uv_indices.append(uv_indices)
 
         if calc_area:
             data.area = sum(tri.area for tri in mesh.loop_triangles)
 
         # set active vertex color map
-        if mesh.vertex_colors.active:
-            color_data = mesh.vertex_colors.active.data
+        if active_colors:
+            color_data = active_colors.data
             # getting vertex colors and its indices (the same as uv_indices)
             colors = get_data_from_collection(color_data, 'color', (len(color_data), 4))
             color_indices = data.uv_indices[0] if (data.uv_indices is not None and len(data.uv_indices) > 0) else \
                 get_data_from_collection(mesh.loop_triangles, 'loops',
                                          (tris_len * 3,), np.int32)
+            data.loop_colors = (colors, color_indices)
 
-            # preparing vertex_color buffer with the same size as vertices and
-            # setting its data by indices from vertex colors
-            if colors[color_indices].size > 0:
-                data.vertex_colors = np.zeros((len(data.vertices), 4), dtype=np.float32)
-                data.vertex_colors[data.vertex_indices] = colors[color_indices]
+        if postprocess:
+            data.postprocess()
 
         return data
 
+    def postprocess(self):
+        """ Builds index arrays and vertex colors. It doesn't access bpy data and could run in any thread """
+        if not self.is_topology_reused:
+            tris_len = len(self.vertex_indices) // 3
+            self.num_face_vertices = np.full((tris_len,), 3, dtype=np.int32)
+            self.normal_indices = np.arange(tris_len * 3, dtype=np.int32)
+
+        if self.loop_colors is None:
+            return
+
+        colors, color_indices = self.loop_colors
+        self.loop_colors = None
+
+        # preparing vertex_color buffer with the same size as vertices and
+        # setting its data by indices from vertex colors
+        loop_colors = colors[color_indices]
+        if loop_colors.size > 0:
+            self.vertex_colors = np.zeros((len(self.vertices), 4), dtype=np.float32)
+            self.vertex_colors[self.vertex_indices] = loop_colors
+
+    def reuse_topology(self, topology: 'MeshData'):
+        """
+        Takes index arrays from MeshData of previously exported mesh if topology isn't changed.
+        Returns True if topology is reused
+        """
+        if self.topology_key != topology.topology_key or \
+                not np.array_equal(self.vertex_indices, topology.vertex_indices):
+            return False
+
+        self.vertex_indices = topology.vertex_indices
+        self.normal_indices = topology.normal_indices
+        self.num_face_vertices = topology.num_face_vertices
+        self.uv_indices = topology.uv_indices
+        self.is_topology_reused = True
+        return True
+
+    def get_topology(self):
+        """ Returns copy with index arrays only, which is kept to update deformed mesh """
+        topology = copy.copy(self)
+        topology.vertices = None
+        topology.normals = None
+        topology.uvs = None
+        topology.vertex_colors = None
+        topology.is_topology_reused = False
+        return topology
+
+    def arrays(self):
+        """ Returns all geometry arrays uploaded to core """
+        return (self.vertices, self.normals, *self.uvs, self.vertex_indices, self.normal_indices,
+                *self.uv_indices, self.num_face_vertices,
+                *(() if self.vertex_colors is None else (self.vertex_colors,)))
+
+    def fingerprint(self):
+        """ Returns content hash of geometry data, it is used to instance identical meshes """
+        h = hashlib.blake2b(digest_size=20)
+        for arr in self.arrays():
+            # hashlib releases GIL for large buffers, so it could be run in sync pipeline thread
+            h.update(str((arr.dtype, arr.shape)).encode())
+            h.update(np.ascontiguousarray(arr).data)
+
+        return h.digest()
+
     @staticmethod
     def init_from_shape_type(shape_type, size, size_y, segments):
         """
@@ -227,7 +315,8 @@ def assign_materials(rpr_context: RPRContext, rpr_shape: pyrpr.Shape, obj: bpy.t
     # mesh here could actually be curve data which wouldn't have loop_triangles
     if len(material_slots) > 1 and getattr(mesh, 'loop_triangles', None):
         # Multiple materials found, going to collect indices of actually used materials
-        material_indices = np.fromiter((tri.material_index for tri in mesh.loop_triangles), dtype=np.int32)
+        material_indices = get_data_from_collection(mesh.loop_triangles, 'material_index',
+                                                    (len(mesh.loop_triangles),), np.int32)
         material_unique_indices = np.unique(material_indices)
 
     # Apply used materials to mesh
@@ -237,7 +326,8 @@ def assign_materials(rpr_context: RPRContext, rpr_shape: pyrpr.Shape, obj: bpy.t
         if not slot.material:
             continue
 
-        log(f"Syncing material '{slot.name}'; {slot}")
+        if log.is_enabled():
+            log("Syncing material", slot.name, slot)
 
         rpr_material = material.sync(rpr_context, slot.material, obj=obj)
 
@@ -354,15 +444,24 @@ def sync_visibility(rpr_context, obj: bpy.types.Object, rpr_shape: pyrpr.Shape,
         rpr_shape.set_portal_light(False)
 
 
+@profiler.profile('mesh.sync')
 def sync(rpr_context: RPRContext, obj: bpy.types.Object, **kwargs):
-    """ Creates pyrpr.Shape from obj.data:bpy.types.Mesh """
+    """
+    Creates pyrpr.Shape from obj.data:bpy.types.Mesh.
+    If kwargs contains pipeline: utils.pipeline.SyncPipeline, mesh data is read here,
+    NumPy processing and shape creation are deferred to the pipeline.
+    """
 
     mesh = kwargs.get("mesh", obj.data)
     material_override = kwargs.get("material_override", None)
+    pipeline = kwargs.get("pipeline", None)
+    topology = kwargs.get("topology", None)
+    is_update = kwargs.get("is_update", False)
     smoke_modifier = volume.get_smoke_modifier(obj)
 
     indirect_only = kwargs.get("indirect_only", False)
-    log("sync", mesh, obj, "IndirectOnly" if indirect_only else "")
+    if log.is_enabled():
+        log("sync", mesh, obj, "IndirectOnly" if indirect_only else "")
 
     obj_key = object.key(obj)
     transform = object.get_transform(obj)
@@ -370,22 +469,72 @@ def sync(rpr_context: RPRContext, obj: bpy.types.Object, **kwargs):
     # the mesh key is used to find duplicated mesh data
     mesh_key = key(obj)
     is_potential_instance = len(obj.modifiers) == 0
-    
+
     # if an object has no modifiers it could potentially instance a mesh
     # instead of exporting a new one
-    if is_potential_instance and mesh_key in rpr_context.mesh_masters:
-        rpr_mesh = rpr_context.mesh_masters[mesh_key]
-        rpr_shape = rpr_context.create_instance(obj_key, rpr_mesh)
-    else:
-        data = MeshData.init_from_mesh(mesh, obj=obj)
-        if not data:
-            rpr_context.create_empty_object(obj_key)
-            return
+    if is_potential_instance and (mesh_key in rpr_context.mesh_masters or
+                                  (pipeline and pipeline.is_pending(mesh_key))):
+        def create_instance(_):
+            rpr_mesh = rpr_context.mesh_masters.get(mesh_key, None)
+            if not rpr_mesh:
+                # mesh master exported by pipeline has no data
+                rpr_context.create_empty_object(obj_key)
+                return
+
+            rpr_shape = rpr_context.create_instance(obj_key, rpr_mesh)
+            _sync_shape(rpr_context, obj, rpr_shape, transform, material_override, indirect_only)
+
+        if pipeline:
+            pipeline.submit(None, create_instance)
+        else:
+            create_instance(None)
 
-        deformation_data = rpr_context.deformation_cache.get(obj_key)
+        return
 
-        if smoke_modifier and isinstance(rpr_context, RPRContext2):
-            transform = volume.get_transform(obj)
+    # volume.sync() of RPR1 requires created shape, such objects are not deferred
+    if smoke_modifier:
+        pipeline = None
+
+    if topology and any(modifier.type in TOPOLOGY_UNSAFE_MODIFIERS for modifier in obj.modifiers):
+        topology = None
+
+    data = MeshData.init_from_mesh(mesh, obj=obj, postprocess=False, topology=topology)
+    if not data:
+        rpr_context.create_empty_object(obj_key)
+        return
+
+    deformation_data = rpr_context.deformation_cache.get(obj_key)
+    is_volume = smoke_modifier and isinstance(rpr_context, RPRContext2)
+    if is_volume:
+        transform = volume.get_transform(obj)
+
+    use_fingerprint = rpr_context.geometry_instancing and not is_volume
+
+    def process():
+        """ Returns (motion_data, fingerprint) """
+        data.postprocess()
+        if is_volume:
+            return None, None
+
+        if deformation_data and np.any(data.vertices != deformation_data.vertices) and \
+                np.any(data.normals != deformation_data.normals):
+            vertices = np.concatenate((data.vertices, deformation_data.vertices))
+            normals = np.concatenate((data.normals, deformation_data.normals))
+            return (vertices, normals), None
+
+        return None, data.fingerprint() if use_fingerprint else None
+
+    def create_mesh(result):
+        motion_data, fingerprint = result
+
+        # instancing already exported mesh with the same geometry data
+        rpr_mesh = rpr_context.get_mesh_by_fingerprint(fingerprint) if fingerprint else None
+        if rpr_mesh:
+            rpr_shape = rpr_context.create_instance(obj_key, rpr_mesh)
+            rpr_context.instanced_geometry_count += 1
+            rpr_context.instanced_geometry_size += sum(arr.nbytes for arr in data.arrays())
+
+        elif is_volume:
             rpr_shape = rpr_context.create_mesh(
                 obj_key,
                 None, None, None,
@@ -394,13 +543,11 @@ def sync(rpr_context: RPRContext, obj: bpy.types.Object, **kwargs):
                 {pyrpr.MESH_VOLUME_FLAG: 1}
             )
 
-        elif deformation_data and np.any(data.vertices != deformation_data.vertices) and \
-                np.any(data.normals != deformation_data.normals):
-            vertices = np.concatenate((data.vertices, deformation_data.vertices))
-            normals = np.concatenate((data.normals, deformation_data.normals))
+        elif motion_data:
+            vertices, normals = motion_data
             rpr_shape = rpr_context.create_mesh(
                 obj_key,
-                np.ascontiguousarray(vertices), np.ascontiguousarray(normals), data.uvs,
+                vertices, normals, data.uvs,
                 data.vertex_indices, data.normal_indices, data.uv_indices,
                 data.num_face_vertices,
                 {pyrpr.MESH_MOTION_DIMENSION: 2}
@@ -413,27 +560,63 @@ def sync(rpr_context: RPRContext, obj: bpy.types.Object, **kwargs):
                 data.num_face_vertices
             )
 
-        if data.vertex_colors is not None:
-            rpr_shape.set_vertex_colors(data.vertex_colors)
+        if not rpr_mesh:
+            if data.vertex_colors is not None:
+                rpr_shape.set_vertex_colors(data.vertex_colors)
+
+            if fingerprint:
+                rpr_context.mesh_fingerprints[fingerprint] = (obj_key, rpr_shape)
+
+            if rpr_context.cache_mesh_topology and not is_volume:
+                rpr_context.mesh_topology[obj_key] = data.get_topology()
+
+            if is_update:
+                _add_mesh_update_stats(rpr_context, obj, data)
 
         # add mesh to masters if no modifiers
         if is_potential_instance:
-            rpr_context.mesh_masters[mesh_key] = rpr_shape
+            rpr_context.mesh_masters[mesh_key] = rpr_mesh or rpr_shape
+
+        _sync_shape(rpr_context, obj, rpr_shape, transform, material_override, indirect_only)
+
+    if pipeline:
+        pipeline.submit(process, create_mesh, key=mesh_key if is_potential_instance else None)
+    else:
+        create_mesh(process())
 
-    # create an instance of the mesh
-    rpr_shape.set_name(obj_key)
+
+def _add_mesh_update_stats(rpr_context, obj, data):
+    """ Counts mesh recreated by sync_update() and size of its data uploaded to core """
+    stats = rpr_context.mesh_update_stats
+    uploaded_size = sum(arr.nbytes for arr in data.arrays())
+    stats['uploaded_size'] += uploaded_size
+
+    if data.is_topology_reused:
+        # vertices, normals, UVs and colors are read every time, index arrays are reused
+        read_arrays = (data.vertices, data.normals, *data.uvs,
+                       *(() if data.vertex_colors is None else (data.vertex_colors,)))
+        stats['reused'] += 1
+        stats['reused_size'] += uploaded_size - sum(arr.nbytes for arr in read_arrays)
+    else:
+        stats['rebuilt'] += 1
+
+    log("Mesh updated", obj, "topology reused" if data.is_topology_reused else "rebuilt",
+        uploaded_size, "bytes uploaded")
+
+
+def _sync_shape(rpr_context, obj, rpr_shape, transform, material_override, indirect_only):
+    """ Exports shape settings, materials and attaches it to scene """
+    rpr_shape.set_name(object.key(obj))
     rpr_shape.set_id(obj.pass_index)
     rpr_context.set_aov_index_lookup(obj.pass_index, obj.pass_index,
                                      obj.pass_index, obj.pass_index, 1.0)
 
-    
-
     assign_materials(rpr_context, rpr_shape, obj, material_override)
 
     rpr_context.scene.attach(rpr_shape)
 
     rpr_shape.set_transform(transform)
-    object.export_motion_blur(rpr_context, obj_key, transform)
+    object.export_motion_blur(rpr_context, object.key(obj), transform)
 
     sync_visibility(rpr_context, obj, rpr_shape, indirect_only=indirect_only)
 
@@ -449,10 +632,12 @@ def sync_update(rpr_context: RPRContext, obj: bpy.types.Object, is_updated_geome
     rpr_shape = rpr_context.objects.get(obj_key, None)
     if rpr_shape:
         if is_updated_geometry:
+            # index arrays of mesh with unchanged topology are reused by new mesh
+            topology = rpr_context.mesh_topology.get(obj_key, None)
             rpr_context.remove_object(obj_key)
             if mesh_key in rpr_context.mesh_masters:
                 rpr_context.mesh_masters.pop(mesh_key)
-            sync(rpr_context, obj)
+            sync(rpr_context, obj, topology=topology, is_update=True, **kwargs)
             return True
 
         if is_updated_transform:
@@ -78,6 +78,8 @@ def sync(rpr_context, obj: bpy.types.Object, **kwargs):
 def sync_update(rpr_context, obj: bpy.types.Object, is_updated_geometry, is_updated_transform, **kwargs):
     """ Updates existing rpr object. Checks obj.type and calls corresponded sync_update() """
 
+    from rprblender.engine.render_engine import RenderEngine
+
     log("sync_update", obj, is_updated_geometry, is_updated_transform)
 
     updated = False
@@ -109,11 +111,43 @@ def sync_update(rpr_context, obj: bpy.types.Object, is_updated_geometry, is_upda
     if obj.type in ('MESH', 'CURVE', 'FONT', 'SURFACE', 'META'):
         updated |= volume.sync_update(rpr_context, obj, is_updated_geometry, is_updated_transform)
         updated |= hair.sync_update(rpr_context, obj, is_updated_geometry, is_updated_transform)
-        updated |= particle.sync_update(rpr_context, obj, is_updated_geometry, is_updated_transform)
+
+        # particles are updated separately in final render engine after motion blur, see sync()
+        if rpr_context.engine_type != RenderEngine.TYPE:
+            updated |= particle.sync_update(rpr_context, obj, is_updated_geometry, is_updated_transform)
 
     return updated
 
 
+def sync_update_transform(rpr_context, obj: bpy.types.Object, **kwargs):
+    """
+    Updates object which only transform was changed. Mesh shape and its volumes get new transform
+    without re-exporting materials and visibility, other objects are updated by sync_update()
+    """
+    from rprblender.engine.render_engine import RenderEngine
+
+    obj_key = key(obj)
+    rpr_shape = rpr_context.objects.get(obj_key, None)
+
+    # hair is exported in world space, therefore it has to be re-exported
+    if obj.type != 'MESH' or obj.mode != 'OBJECT' or not rpr_shape or rpr_context.has_curves(obj_key):
+        return sync_update(rpr_context, obj, False, True, **kwargs)
+
+    log("sync_update_transform", obj)
+
+    rpr_shape.set_transform(get_transform(obj))
+
+    if rpr_context.has_volumes(obj_key):
+        volume_transform = volume.get_transform(obj)
+        for volume_key in rpr_context.volume_keys[obj_key]:
+            rpr_context.volumes[volume_key].set_transform(volume_transform)
+
+    if rpr_context.engine_type != RenderEngine.TYPE:
+        particle.sync_update(rpr_context, obj, False, True)
+
+    return True
+
+
 def cache_blur_data(rpr_context, obj: bpy.types.Object):
     if obj.type == 'MESH':
         if obj.mode == 'OBJECT':
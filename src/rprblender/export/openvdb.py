@@ -22,6 +22,7 @@ from rprblender.engine.context import RPRContext2
 
 from . import object, material, volume
 
+from rprblender.utils import profiler
 from rprblender.utils import logging
 log = logging.Log(tag='export.openvdb')
 
@@ -42,11 +43,12 @@ def get_transform(obj: bpy.types.Object):
     return object.get_transform(obj) @ bound_mat
 
 
+@profiler.profile('openvdb.sync')
 def sync(rpr_context, obj: bpy.types.Object, **kwargs):
     if not isinstance(rpr_context, RPRContext2):
         return
 
-    if not (helper_lib.is_openvdb_support or BLENDER_VERSION >= '3.5'):
+    if not (helper_lib.is_openvdb_supported() or BLENDER_VERSION >= '3.5'):
         log.warn("OpenVDB is not supported")
         return
 
@@ -70,7 +72,7 @@ def sync(rpr_context, obj: bpy.types.Object, **kwargs):
 
 
 def sync_update(rpr_context, obj: bpy.types.Object, is_updated_geometry, is_updated_transform, **kwargs):
-    if not (helper_lib.is_openvdb_support or BLENDER_VERSION >= '3.5'):
+    if not (helper_lib.is_openvdb_supported() or BLENDER_VERSION >= '3.5'):
         return False
 
     obj_key = object.key(obj)
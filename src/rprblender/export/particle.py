@@ -15,10 +15,12 @@
 import numpy as np
 
 import bpy
-import mathutils
 
+import pyrpr
 from . import mesh, material, object
+from rprblender.utils import get_data_from_collection
 
+from rprblender.utils import profiler
 from rprblender.utils import logging
 log = logging.Log(tag='export.particle')
 
@@ -58,56 +60,160 @@ def emitter_p_sys(emitter):
     return (p_sys for p_sys in emitter.particle_systems if p_sys.settings.type == 'EMITTER')
 
 
+def quaternions_to_matrices(quaternions):
+    """ Converts (N, 4) array of unit quaternions (w, x, y, z) to (N, 3, 3) rotation matrices """
+    w, x, y, z = quaternions.T
+
+    matrices = np.empty((len(quaternions), 3, 3), dtype=np.float32)
+    matrices[:, 0, 0] = 1.0 - 2.0 * (y * y + z * z)
+    matrices[:, 0, 1] = 2.0 * (x * y - w * z)
+    matrices[:, 0, 2] = 2.0 * (x * z + w * y)
+    matrices[:, 1, 0] = 2.0 * (x * y + w * z)
+    matrices[:, 1, 1] = 1.0 - 2.0 * (x * x + z * z)
+    matrices[:, 1, 2] = 2.0 * (y * z - w * x)
+    matrices[:, 2, 0] = 2.0 * (x * z - w * y)
+    matrices[:, 2, 1] = 2.0 * (y * z + w * x)
+    matrices[:, 2, 2] = 1.0 - 2.0 * (x * x + y * y)
+    return matrices
+
+
+def get_transforms(p_sys, do_motion_blur):
+    """
+    Returns (transforms, prev_transforms) of alive particles as (N, 4, 4) arrays,
+    prev_transforms is None if motion blur is disabled
+    """
+    particles = p_sys.particles
+    count = len(particles)
+
+    # alive_state is enum, it couldn't be read by foreach_get
+    alive = np.fromiter((p.alive_state == 'ALIVE' for p in particles), dtype=bool, count=count)
+
+    rotations = get_data_from_collection(particles, 'rotation', (count, 4))[alive]
+    sizes = get_data_from_collection(particles, 'size', count)[alive]
+
+    # translation @ rotation @ scale
+    transforms = np.zeros((len(rotations), 4, 4), dtype=np.float32)
+    transforms[:, :3, :3] = quaternions_to_matrices(rotations) * sizes[:, np.newaxis, np.newaxis]
+    transforms[:, 3, 3] = 1.0
+
+    prev_transforms = None
+    if do_motion_blur:
+        prev_transforms = transforms.copy()
+        prev_transforms[:, :3, 3] = get_data_from_collection(particles, 'prev_location', (count, 3))[alive]
+
+    transforms[:, :3, 3] = get_data_from_collection(particles, 'location', (count, 3))[alive]
+
+    return transforms, prev_transforms
+
+
+def sync_instances(rpr_context, particle_key, master_shape, transforms, prev_transforms):
+    """
+    Sets particle instances transforms. Instance key is (particle_key, index of alive particle),
+    so instances are created or removed only when number of alive particles changes
+    """
+    count = len(transforms)
+    prev_count = len(rpr_context.child_object_keys.get(particle_key, ()))
+
+    for i in range(count, prev_count):
+        rpr_context.remove_object((particle_key, i))
+
+    instances = []
+    for i in range(count):
+        instance = rpr_context.objects.get((particle_key, i), None) if i < prev_count else None
+        if instance is not None and instance.mesh is not master_shape:
+            # master shape was recreated, instances of removed master are recreated too
+            rpr_context.remove_object((particle_key, i))
+            instance = None
+
+        if instance is None:
+            instance = rpr_context.create_instance((particle_key, i), master_shape)
+            rpr_context.scene.attach(instance)
+            instance.set_visibility(True)
+
+        instances.append(instance)
+
+    for instance, transform in zip(instances, transforms):
+        instance.set_transform(transform)
+
+    if prev_transforms is not None:
+        for instance, prev_transform in zip(instances, prev_transforms):
+            instance.set_motion_transform(prev_transform)
+
+
+def sync_particle_system(rpr_context, p_sys, emitter):
+    """ Exports particle system master shape and instances of alive particles """
+    log("sync", p_sys, emitter)
+
+    particle_key = key(p_sys, emitter)
+
+    # make master object for render type
+    master_shape = create_sphere_master(rpr_context, particle_key)
+
+    # add master shape to scene but set to invisible.
+    rpr_context.scene.attach(master_shape)
+    master_shape.set_visibility(False)
+
+    # add the material to master
+    rpr_material = get_particle_system_material(rpr_context, p_sys, emitter)
+    if rpr_material:
+        master_shape.set_material(rpr_material)
+
+    transforms, prev_transforms = get_transforms(p_sys, rpr_context.do_motion_blur)
+    sync_instances(rpr_context, particle_key, master_shape, transforms, prev_transforms)
+
+
+@profiler.profile('particle.sync')
 def sync(rpr_context, emitter: bpy.types.Object):
     """ sync the particle system """
 
     for p_sys in emitter_p_sys(emitter):
         if p_sys.settings.render_type != 'HALO':
             log.warn("Skipping particle system type", p_sys.settings.render_type, p_sys, emitter)
-            return
+            continue
 
-        log("sync", p_sys, emitter)
+        sync_particle_system(rpr_context, p_sys, emitter)
 
-        particle_key = key(p_sys, emitter)
 
-        # make master object for render type
-        master_shape = create_sphere_master(rpr_context, particle_key)
+@profiler.profile('particle.sync_update')
+def sync_update(rpr_context, emitter: bpy.types.Object,
+                is_updated_geometry, is_updated_transform):
+    """ Updates particle systems of emitter, returns True if anything was updated """
 
-        # add master shape to scene but set to invisible.
-        rpr_context.scene.attach(master_shape)
-        master_shape.set_visibility(False)
+    updated = False
+    p_sys_keys = set()
 
-        # add the material to master
-        rpr_material = get_particle_system_material(rpr_context, p_sys, emitter)
-        if rpr_material:
-            master_shape.set_material(rpr_material)
+    for p_sys in emitter_p_sys(emitter):
+        if p_sys.settings.render_type != 'HALO':
+            continue
+
+        particle_key = key(p_sys, emitter)
+        p_sys_keys.add(particle_key)
 
-        # walk through particle list and create rpr_instances of ones that are ALIVE
-        for i, particle in p_sys.particles.items():
-            if not particle.alive_state == 'ALIVE':
-                continue
+        master_shape = rpr_context.objects.get(particle_key, None)
+        if not master_shape:
+            sync_particle_system(rpr_context, p_sys, emitter)
+            updated = True
+            continue
 
-            instance_key = (particle_key, i)
-            instance = rpr_context.create_instance(instance_key, master_shape)
+        if not is_updated_geometry and not is_updated_transform:
+            continue
 
-            loc = mathutils.Matrix.Translation(particle.location)
-            scale = mathutils.Matrix.Scale(particle.size, 4)
-            rot = mathutils.Quaternion(particle.rotation)
-            mat = np.array(loc @ rot.to_matrix().to_4x4() @ scale, dtype=np.float32).reshape(4, 4)
+        log("sync_update", p_sys, emitter)
 
-            rpr_context.scene.attach(instance)
-            instance.set_transform(mat)
-            instance.set_visibility(True)
+        rpr_material = get_particle_system_material(rpr_context, p_sys, emitter)
+        if master_shape.materials != ([rpr_material] if rpr_material else []):
+            master_shape.set_material(rpr_material)
 
-            # do motion blur.
-            if rpr_context.do_motion_blur:
-                prev_loc = mathutils.Matrix.Translation(particle.prev_location)
-                prev_mat = np.array(prev_loc @ rot.to_matrix().to_4x4() @ scale,
-                                    dtype=np.float32).reshape(4, 4)
-                instance.set_motion_transform(prev_mat)
+        transforms, prev_transforms = get_transforms(p_sys, rpr_context.do_motion_blur)
+        sync_instances(rpr_context, particle_key, master_shape, transforms, prev_transforms)
+        updated = True
 
+    # removing particle systems which are not present in emitter anymore,
+    # particle system key is (emitter key, particle system name)
+    for particle_key in tuple(rpr_context.child_object_keys.get(object.key(emitter), ())):
+        if isinstance(particle_key[1], str) and particle_key not in p_sys_keys and \
+                isinstance(rpr_context.objects.get(particle_key, None), pyrpr.Mesh):
+            rpr_context.remove_object(particle_key)
+            updated = True
 
-def sync_update(rpr_context, emitter: bpy.types.Object,
-                is_updated_geometry, is_updated_transform):
-    # TODO: Implement sync_update
-    return False
+    return updated
@@ -12,7 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #********************************************************************
-
+import os
 import numpy as np
 
 import bpy
@@ -23,10 +23,18 @@ from rprblender.utils import BLENDER_VERSION, get_prop_array_data, is_zero
 from rprblender.engine.context import RPRContext2
 from rprblender.utils import helper_lib
 
+from rprblender.utils import profiler
 from rprblender.utils import logging
 log = logging.Log(tag='export.volume')
 
 
+# max number of voxels copied from OpenVDB grid at once
+VDB_SLAB_VOXELS = 16 * 1024 ** 2
+
+# grids metadata of OpenVDB files by (file path, modification time, size)
+_vdb_grids = {}
+
+
 def key(obj: bpy.types.Object, smoke_modifier):
     return (object.key(obj), smoke_modifier.name)
 
@@ -63,6 +71,77 @@ def get_domain_resolution(domain, grid_name):
     return x, y, z
 
 
+def get_vdb_grids(vdb_file):
+    """
+    Returns {grid name: grid metadata} of OpenVDB file. Metadata is cached by file path and
+    modification time, so file header is read only once while the file isn't changed.
+    Metadata is None for Blender < 3.5, where grids list is read by helper_lib
+    """
+    stat = os.stat(vdb_file)
+    file_path = os.path.abspath(vdb_file)
+    file_key = (file_path, stat.st_mtime_ns, stat.st_size)
+
+    grids = _vdb_grids.get(file_key, None)
+    if grids is not None:
+        return grids
+
+    if BLENDER_VERSION >= '3.5':
+        import pyopenvdb as vdb
+        grids = {g.name: g for g in vdb.readAllGridMetadata(vdb_file)}
+    else:
+        grids = {name: None for name in helper_lib.vdb_read_grids_list(vdb_file)}
+
+    # removing metadata of previous version of the file
+    for k in tuple(k for k in _vdb_grids if k[0] == file_path):
+        del _vdb_grids[k]
+
+    _vdb_grids[file_key] = grids
+    return grids
+
+
+def read_vdb_grid_data(grid):
+    """
+    Returns size, values and indices of not zero voxels of OpenVDB float grid in its leaf bounding box.
+    Grid is copied by slabs of VDB_SLAB_VOXELS voxels instead of one dense array of the whole
+    bounding box, so peak memory is proportional to number of active voxels
+    """
+    size = grid.evalLeafDim()
+    x, y, z = size
+
+    # ijk - specifies the index coordinates of the voxel to be copied to array index
+    # otherwise grid becomes shifted
+    i0, j0, k0 = grid.evalLeafBoundingBox()[0]
+
+    slab_depth = max(1, VDB_SLAB_VOXELS // max(1, y * z))
+    slab = np.empty((min(slab_depth, x), y, z), dtype=np.float32)
+
+    values = []
+    indices = []
+    for i in range(0, x, slab_depth):
+        slab_values = slab[:min(slab_depth, x - i)]
+        slab_values.fill(0.0)
+        grid.copyToArray(slab_values, ijk=(i0 + i, j0, k0))
+
+        slab_indices = np.nonzero(slab_values)
+        count = len(slab_indices[0])
+        if not count:
+            continue
+
+        values.append(slab_values[slab_indices])
+
+        ijk = np.empty((count, 3), dtype=np.uint32)
+        ijk[:, 0] = slab_indices[0] + i
+        ijk[:, 1] = slab_indices[1]
+        ijk[:, 2] = slab_indices[2]
+        indices.append(ijk)
+
+    return {
+        'size': size,
+        'values': np.concatenate(values) if values else np.empty(0, dtype=np.float32),
+        'indices': np.concatenate(indices) if indices else np.empty((0, 3), dtype=np.uint32),
+    }
+
+
 def create_grid_sampler_node(rpr_context, obj, grid_name, default_grid_name):
 
     grid = None
@@ -110,41 +189,28 @@ def create_grid_sampler_node(rpr_context, obj, grid_name, default_grid_name):
 
             import pyopenvdb as vdb
 
-            grids = vdb.readAllGridMetadata(vdb_file)
-            try:
-                grid = next((vdb.read(vdb_file, g.name) for g in grids if g.name == grid_name), None)
-
-            except Exception as err:
-                raise RuntimeError(err)
-
-            if grid is None:
+            grid_metadata = get_vdb_grids(vdb_file).get(grid_name, None)
+            if grid_metadata is None:
                 return None
 
             # TODO: add support for float vector grid
-            if grid.valueTypeName != 'float':
-                return
+            if grid_metadata.valueTypeName != 'float':
+                return None
 
-            size = grid.evalLeafDim()
-            values = np.zeros(shape=size, dtype=np.float32)
+            try:
+                grid = vdb.read(vdb_file, grid_name)
 
-            # ijk - specifies the index coordinates of the voxel to be copied to array index
-            # otherwise grid becomes shifted
-            grid.copyToArray(values, ijk=grid.evalLeafBoundingBox()[0])
-            indices = np.nonzero(values)
+            except Exception as err:
+                raise RuntimeError(err)
 
-            data = {
-                'size': size,
-                'values': values[indices],
-                'indices': np.ascontiguousarray(np.transpose(indices).astype('uint32')),
-            }
+            data = read_vdb_grid_data(grid)
 
         else:
-            if not helper_lib.is_openvdb_support:
+            if not helper_lib.is_openvdb_supported():
                 obj.data.grids.unload()
                 return None
 
-            grids = helper_lib.vdb_read_grids_list(vdb_file)
-            if grid_name not in grids:
+            if grid_name not in get_vdb_grids(vdb_file):
                 obj.data.grids.unload()
                 return None
 
@@ -167,6 +233,7 @@ def create_grid_sampler_node(rpr_context, obj, grid_name, default_grid_name):
     return node
 
 
+@profiler.profile('volume.sync')
 def sync(rpr_context, obj: bpy.types.Object):
     """ sync any volume attached to the object.  
         Note that volumes don't currently use motion blur """
@@ -12,8 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 #********************************************************************
+from collections import OrderedDict
 from dataclasses import dataclass, field
 from typing import Tuple
+import threading
 
 import numpy as np
 import math
@@ -29,7 +31,9 @@ from .image import ImagePixels
 from rprblender.engine.context import RPRContext
 from rprblender.engine.context_hybridpro import RPRContext as RPRContextHybridPro
 from rprblender.utils import helper_lib
+from rprblender import config
 
+from rprblender.utils import profiler
 from rprblender.utils import logging
 log = logging.Log(tag='export.world')
 
@@ -37,6 +41,14 @@ log = logging.Log(tag='export.world')
 WARNING_IMAGE_NOT_DEFINED_COLOR = (1.0, 0.0, 1.0)
 STUDIO_LIGHT_DEFAULT_COLOR = (0.051, 0.051, 0.051)  # Blender's default background color in viewport
 
+# key prefix of Sun & Sky image in rpr_context.images
+SUN_SKY_IMAGE_KEY = 'SunSky'
+
+# generated sky images by sky parameters, least recently used first
+_sky_images = OrderedDict()
+# helper_lib keeps sky parameters in global state
+_sky_images_lock = threading.Lock()
+
 
 def set_light_image(rpr_context, rpr_light, image_name):
     image_obj = bpy.data.images[image_name]
@@ -70,6 +82,38 @@ def remove_environment_lights(rpr_context):
         rpr_context.scene.remove_environment_light()
 
 
+def generate_sky_image(sun_sky: 'WorldData.SunSkyData'):
+    """
+    Returns sky image generated by helper_lib or None. Images are cached by all parameters
+    they depend on, cache is shared by all engines and limited by config.sky_image_cache_size
+    """
+    key = sun_sky.image_key()
+
+    with _sky_images_lock:
+        im = _sky_images.pop(key, None)
+        if im is None:
+            log("Generating sky image", key)
+            helper_lib.set_sun_horizontal_coordinate(sun_sky.azimuth, sun_sky.altitude)
+            helper_lib.set_sky_params(
+                sun_sky.turbidity, sun_sky.sun_glow, sun_sky.sun_disc,
+                sun_sky.horizon_height, sun_sky.horizon_blur, sun_sky.saturation,
+                sun_sky.filter_color, sun_sky.ground_color
+            )
+            im = helper_lib.generate_sky_image(sun_sky.resolution, sun_sky.resolution)
+            if im is None:
+                return None
+
+        _sky_images[key] = im
+
+        # evicting least recently used images, the last generated image is always kept
+        cache_size = sum(i.nbytes for i in _sky_images.values())
+        while cache_size > config.sky_image_cache_size and len(_sky_images) > 1:
+            _, evicted = _sky_images.popitem(last=False)
+            cache_size -= evicted.nbytes
+
+        return im
+
+
 def set_light_rotation(rpr_light, rotation: Tuple[float]) -> np.array:
     """ Calculates rotation matrix from gizmo rotation """
 
@@ -199,6 +243,12 @@ class WorldData:
             self.filter_color = tuple(sun_sky.filter_color)
             self.ground_color = tuple(sun_sky.ground_color)
 
+        def image_key(self):
+            """ Returns all parameters sky image depends on, intensity and rotation are set to light """
+            return (self.resolution, self.azimuth, self.altitude,
+                    self.turbidity, self.sun_glow, self.sun_disc, self.saturation,
+                    self.horizon_height, self.horizon_blur, self.filter_color, self.ground_color)
+
         def export(self, rpr_context, rotation):
             remove_environment_overrides(rpr_context)
 
@@ -207,19 +257,25 @@ class WorldData:
                 rpr_light = rpr_context.create_environment_light()
                 rpr_context.scene.add_environment_light(rpr_light)
 
-            helper_lib.set_sun_horizontal_coordinate(self.azimuth, self.altitude)
-            helper_lib.set_sky_params(
-                self.turbidity, self.sun_glow, self.sun_disc,
-                self.horizon_height, self.horizon_blur, self.saturation,
-                self.filter_color, self.ground_color
-            )
-
-            im = helper_lib.generate_sky_image(self.resolution, self.resolution)
-            rpr_image = rpr_context.create_image_data(None, im)
-            if isinstance(rpr_context, RPRContextHybridPro):  # Requires colorspace to be set explicitly
-                image.set_image_gamma(rpr_image, None, DEFAULT_COLORSPACE, rpr_context)
-
-            rpr_light.set_image(rpr_image)
+            # image of the same sky is reused by rpr_context, only the last sky image is kept
+            image_key = (SUN_SKY_IMAGE_KEY, self.image_key())
+            rpr_image = rpr_context.images.get(image_key, None)
+            if not rpr_image:
+                im = generate_sky_image(self)
+                if im is None:
+                    log.warn("Failed to generate sky image")
+                    return
+
+                for key in tuple(key for key in rpr_context.images
+                                 if isinstance(key, tuple) and key[0] == SUN_SKY_IMAGE_KEY):
+                    rpr_context.remove_image(key)
+
+                rpr_image = rpr_context.create_image_data(image_key, im)
+                if isinstance(rpr_context, RPRContextHybridPro):  # Requires colorspace to be set explicitly
+                    image.set_image_gamma(rpr_image, None, DEFAULT_COLORSPACE, rpr_context)
+
+            if rpr_light.image is not rpr_image:
+                rpr_light.set_image(rpr_image)
             set_light_rotation(rpr_light, (rotation[0], rotation[1], rotation[2] + self.azimuth))
 
 
@@ -424,6 +480,7 @@ class WorldData:
         rpr_context.scene.environment_light.set_group_id(self.group)
 
 
+@profiler.profile('world.sync')
 def sync(rpr_context: RPRContext, world: bpy.types.World):
     data = WorldData.init_from_world(world)
     data.export(rpr_context)
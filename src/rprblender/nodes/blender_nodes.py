@@ -28,6 +28,7 @@ from rprblender.export import image, material, volume
 from rprblender.utils.conversion import convert_kelvins_to_rgb
 from .node_parser import BaseNodeParser, RuleNodeParser, NodeParser, MaterialError
 from .node_item import NodeItem
+from . import lut
 from rprblender.engine.context_hybrid import RPRContext as RPRContextHybrid
 from rprblender.engine.context_hybridpro import RPRContext as RPRContextHybridPro
 from rprblender.engine.context import RPRContext2
@@ -139,6 +140,8 @@ def eval_curve(mapping: bpy.types.CurveMapping, curve_index: int, value: float)
 class ShaderNodeOutputMaterial(BaseNodeParser):
     # inputs: Surface, Volume, Displacement
 
+    exports_root = True
+
     def get_normal_node(self):
         """ Returns the normal node if displacement mode is set to bump 
             this returns a bumped normal, else returns a node_lookup N """
@@ -287,6 +290,8 @@ class ShaderNodeDisplacement(NodeParser):
 class NodeReroute(NodeParser):
     # Just pass through the input
 
+    is_pass_through = True
+
     def export(self):
         return self.get_input_link(0)
 
@@ -1326,7 +1331,7 @@ class ShaderNodeObjectInfo(NodeParser):
     def export_hybrid(self):
         if self.socket_out.name == 'Random':
             log.warn(f"Unsupported random object info in Hybrid modes")
-            return self.node_item(float(self.object.pass_index))
+            return self.node_item(float(self.object.pass_index) if self.object else 0.0)
         else:
             return self.export()
 
@@ -1877,11 +1882,7 @@ class ShaderNodeValToRGB(NodeParser):
 
             return self.node_item(val)
 
-        arr = np.fromiter(
-            (v for i in range(buffer_size)
-               for v in self.node.color_ramp.evaluate(i / (buffer_size - 1)))
-            , dtype=np.float32
-        ).reshape(-1, 4)
+        arr = lut.color_ramp_lut(self.node.color_ramp, buffer_size)
 
         # export the temperature buffer once to conserve memory
         rpr_buffer = self.rpr_context.create_buffer(arr, pyrpr.BUFFER_ELEMENT_TYPE_FLOAT32)
@@ -1997,8 +1998,7 @@ class ShaderNodeFloatCurve(NodeParser):
             out_val = eval_curve(mapping, 0, in_val.data)
 
         else:
-            arr = np.fromiter((eval_curve(mapping, 0, i / (BUFFER_SIZE - 1)) for i in range(BUFFER_SIZE)),
-                              dtype=np.float32).reshape(-1, 1)
+            arr = lut.float_curve_lut(mapping, BUFFER_SIZE)
             rpr_buffer = self.rpr_context.create_buffer(arr, pyrpr.BUFFER_ELEMENT_TYPE_FLOAT32)
 
             # apply mapping to each channel
@@ -2030,13 +2030,6 @@ class ShaderNodeRGBCurve(NodeParser):
     """
     def export(self):
         """ create a buffer from ramp data and sample it in nodes if connected """
-        def rgba(i):
-            c = eval_curve(mapping, 3, i / (BUFFER_SIZE - 1))
-            return (eval_curve(mapping, 0, c),
-                    eval_curve(mapping, 1, c),
-                    eval_curve(mapping, 2, c),
-                    1.0)
-
         BUFFER_SIZE = 256  # hard code, this is what cycles does
 
         in_col = self.get_input_value('Color')
@@ -2052,7 +2045,7 @@ class ShaderNodeRGBCurve(NodeParser):
             ) + (in_col.data[3],)
 
         else:
-            arr = np.fromiter((v for i in range(BUFFER_SIZE) for v in rgba(i)), dtype=np.float32).reshape(-1, 4)
+            arr = lut.rgb_curve_lut(mapping, BUFFER_SIZE)
             rpr_buffer = self.rpr_context.create_buffer(arr, pyrpr.BUFFER_ELEMENT_TYPE_FLOAT32)
 
             # apply mapping to each channel
@@ -2365,6 +2358,8 @@ class ShaderNodeSeparateXYZ(NodeParser):
 
 class ShaderNodeGroup(BaseNodeParser):
     """ Parse Group Node: find nested GroupOutput and walk from there  """
+    is_pass_through = True
+
     def export(self):
         # Group Node has node tree nested, to parse it we need to find active group output node
         # that mirrors internal inputs to external outputs. Sockets have exactly the same position, name and identifier
@@ -2406,6 +2401,8 @@ class NodeGroupInput(BaseNodeParser):
     Internal group node contains incoming links.
     Walk out of the group, parse the link if requested socket linked, otherwise check for default value
     """
+    is_pass_through = True
+
     def export(self):
         # The GroupNode input sockets are mirrored by GroupInput outputs with the same identifier, name and position
         # find mirrored socket by identifier
@@ -0,0 +1,381 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Lookup tables of color ramps and curve mappings, sampled by buffer sampler nodes.
+
+Color ramps with RGB blending are evaluated by NumPy for all samples at once, following
+BKE_colorband_evaluate(). Curve tables aren't available through Python API, they are built
+from curve points like Blender curvemap_make_table() does and evaluated by NumPy.
+Lookup tables are cached by control points content and shared by all engines,
+returned arrays are read-only.
+"""
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+from rprblender import config
+from rprblender.utils import BLENDER_VERSION
+
+from rprblender.utils import logging
+log = logging.Log(tag='export.lut')
+
+
+# number of samples, this is what cycles does
+LUT_SIZE = 256
+
+# Blender key_curve_position_weights() tension of cardinal spline
+CARDINAL_TENSION = 0.71
+
+# Blender CM_TABLE: curve table has CURVE_TABLE_SIZE + 1 samples with equal x distances
+CURVE_TABLE_SIZE = 256
+# Blender CM_RESOL: number of samples of bezier segment between two curve points
+CURVE_SEGMENT_SAMPLES = 32
+# Blender auto handle length factor, see calchandle_curvemap()
+AUTO_HANDLE_FACTOR = 2.5614
+
+FLT_EPSILON = float(np.finfo(np.float32).eps)
+
+# lookup tables: key -> np.array, least recently used tables are evicted first
+_luts = OrderedDict()
+_luts_lock = threading.Lock()
+
+
+def _get_cached(key, create):
+    with _luts_lock:
+        lut = _luts.pop(key, None)
+        if lut is None:
+            lut = create()
+            lut.setflags(write=False)
+
+        _luts[key] = lut
+        while len(_luts) > config.lut_cache_size:
+            _luts.popitem(last=False)
+
+        return lut
+
+
+def _samples(size):
+    return np.linspace(0.0, 1.0, size, dtype=np.float32)
+
+
+def color_ramp_key(color_ramp):
+    return (color_ramp.color_mode, color_ramp.interpolation, color_ramp.hue_interpolation,
+            tuple((elem.position, tuple(elem.color)) for elem in color_ramp.elements))
+
+
+def eval_color_ramp(color_ramp, values: np.array) -> np.array:
+    """ Evaluates color ramp for array of values, returns array of RGBA colors """
+    if color_ramp.color_mode != 'RGB':
+        # HSV and HSL blending interpolates hue, it is evaluated by Blender
+        return np.array([color_ramp.evaluate(val) for val in values.tolist()],
+                        dtype=np.float32).reshape(-1, 4)
+
+    elements = color_ramp.elements
+    positions = np.fromiter((elem.position for elem in elements), dtype=np.float32, count=len(elements))
+    colors = np.array([tuple(elem.color) for elem in elements], dtype=np.float32).reshape(-1, 4)
+    return _eval_color_ramp_rgb(positions, colors, color_ramp.interpolation, values)
+
+
+def _eval_color_ramp_rgb(positions, colors, interpolation, values):
+    count = len(positions)
+    if count == 1:
+        return np.repeat(colors, len(values), axis=0)
+
+    # index of the first element with position > value, elements are sorted by position
+    right = np.searchsorted(positions, values, side='right')
+    is_last = right == count
+    ind_right = np.minimum(right, count - 1)
+    ind_left = np.maximum(right - 1, 0)
+
+    if interpolation == 'CONSTANT':
+        # values before the first element get its color
+        return colors[ind_left]
+
+    # values out of elements range get color of the first or the last element,
+    # spline interpolation continues to (0, first) and (1, last) elements
+    pos_right = np.where(is_last, np.float32(1.0), positions[ind_right])
+    pos_left = np.where(right == 0, np.float32(0.0), positions[ind_left])
+    delta = pos_left - pos_right
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fac = np.where(delta != 0.0, (values - pos_right) / delta,
+                       np.where(is_last, np.float32(1.0), np.float32(0.0)))
+
+    if interpolation in ('B_SPLINE', 'CARDINAL'):
+        ind_next = np.where(right >= count - 1, ind_right, np.minimum(right + 1, count - 1))
+        ind_prev = np.where(right < 2, ind_left, right - 2)
+
+        t = np.clip(fac, 0.0, 1.0)[:, None]
+        t2 = t * t
+        t3 = t2 * t
+        if interpolation == 'CARDINAL':
+            fc = CARDINAL_TENSION
+            w0 = -fc * t3 + 2.0 * fc * t2 - fc * t
+            w1 = (2.0 - fc) * t3 + (fc - 3.0) * t2 + 1.0
+            w2 = (fc - 2.0) * t3 + (3.0 - 2.0 * fc) * t2 + fc * t
+            w3 = fc * t3 - fc * t2
+        else:
+            w0 = -t3 / 6.0 + 0.5 * t2 - 0.5 * t + 1.0 / 6.0
+            w1 = 0.5 * t3 - t2 + 2.0 / 3.0
+            w2 = -0.5 * t3 + 0.5 * t2 + 0.5 * t + 1.0 / 6.0
+            w3 = t3 / 6.0
+
+        res = w3 * colors[ind_prev] + w2 * colors[ind_left] + w1 * colors[ind_right] + w0 * colors[ind_next]
+        return np.clip(res, 0.0, 1.0).astype(np.float32)
+
+    if interpolation == 'EASE':
+        fac2 = fac * fac
+        fac = 3.0 * fac2 - 2.0 * fac2 * fac
+
+    fac = fac[:, None]
+    res = (1.0 - fac) * colors[ind_right] + fac * colors[ind_left]
+
+    # linear and ease interpolations don't extrapolate out of elements range
+    res[values <= positions[0]] = colors[0]
+    res[is_last] = colors[-1]
+    return res.astype(np.float32)
+
+
+def color_ramp_lut(color_ramp, size=LUT_SIZE) -> np.array:
+    """ Returns RGBA lookup table of color ramp for values in [0, 1] """
+    return _get_cached(('color_ramp', size, color_ramp_key(color_ramp)),
+                       lambda: eval_color_ramp(color_ramp, _samples(size)))
+
+
+def curve_mapping_key(mapping):
+    # extend was moved from CurveMap to CurveMapping in Blender 2.82
+    return (mapping.use_clip, mapping.clip_min_x, mapping.clip_max_x,
+            mapping.clip_min_y, mapping.clip_max_y, getattr(mapping, 'extend', None),
+            tuple((getattr(curve, 'extend', None),
+                   tuple((tuple(point.location), point.handle_type) for point in curve.points))
+                  for curve in mapping.curves))
+
+
+CurveTable = namedtuple('CurveTable', ('min_x', 'step', 'table_x', 'table_y',
+                                       'ext_in', 'ext_out', 'extrapolate'))
+
+
+def _curve_handles(points, handle_types):
+    """
+    Returns (left, right) bezier handles of curve points,
+    port of Blender calchandle_curvemap() and end handles correction of curvemap_make_table()
+    """
+    count = len(points)
+    left = np.zeros((count, 2))
+    right = np.zeros((count, 2))
+
+    for i in range(count):
+        p2 = points[i]
+        prev_point = points[i - 1] if i > 0 else None
+        next_point = points[i + 1] if i < count - 1 else None
+
+        # missing neighbour of end point is mirrored
+        p1 = prev_point if prev_point is not None else 2.0 * p2 - next_point
+        p3 = next_point if next_point is not None else 2.0 * p2 - p1
+
+        dvec_a = p2 - p1
+        dvec_b = p3 - p2
+        len_a = np.hypot(*dvec_a) or 1.0
+        len_b = np.hypot(*dvec_b) or 1.0
+
+        if handle_types[i] == 'VECTOR':
+            left[i] = p2 - dvec_a / 3.0
+            right[i] = p2 + dvec_b / 3.0
+            continue
+
+        tvec = dvec_b / len_b + dvec_a / len_a
+        tlen = np.hypot(*tvec) * AUTO_HANDLE_FACTOR
+        if tlen == 0.0:
+            continue
+
+        left[i] = p2 - tvec * (len_a / tlen)
+        right[i] = p2 + tvec * (len_b / tlen)
+
+        if handle_types[i] == 'AUTO_CLAMPED' and prev_point is not None and next_point is not None:
+            # handles are horizontal in extremum, otherwise they don't go beyond y of neighbours
+            ydiff1 = prev_point[1] - p2[1]
+            ydiff2 = next_point[1] - p2[1]
+            if (ydiff1 <= 0.0 and ydiff2 <= 0.0) or (ydiff1 >= 0.0 and ydiff2 >= 0.0):
+                left[i, 1] = right[i, 1] = p2[1]
+            elif ydiff1 <= 0.0:
+                left[i, 1] = max(left[i, 1], prev_point[1])
+                right[i, 1] = min(right[i, 1], next_point[1])
+            else:
+                left[i, 1] = min(left[i, 1], prev_point[1])
+                right[i, 1] = max(right[i, 1], next_point[1])
+
+    if count > 2:
+        # first and last auto handles point to the closest handle instead of center of next_point/prev_point point
+        if handle_types[0] == 'AUTO':
+            vec = left[1].copy()
+            vec[0] = max(vec[0], points[0][0])
+            vec -= points[0]
+            vec_len = np.hypot(*vec)
+            if vec_len > FLT_EPSILON:
+                vec *= np.hypot(*(right[0] - points[0])) / vec_len
+                right[0] = points[0] + vec
+                left[0] = points[0] - vec
+
+        if handle_types[-1] == 'AUTO':
+            vec = right[-2].copy()
+            vec[0] = min(vec[0], points[-1][0])
+            vec -= points[-1]
+            vec_len = np.hypot(*vec)
+            if vec_len > FLT_EPSILON:
+                vec *= np.hypot(*(left[-1] - points[-1])) / vec_len
+                left[-1] = points[-1] + vec
+                right[-1] = points[-1] - vec
+
+    return left, right
+
+
+def _curve_segments(points, left, right):
+    """ Returns (N, 2) array of bezier segments samples, CURVE_SEGMENT_SAMPLES per segment """
+    t = np.linspace(0.0, 1.0, CURVE_SEGMENT_SAMPLES)[:, np.newaxis]
+    weights = ((1.0 - t) ** 3, 3.0 * (1.0 - t) ** 2 * t, 3.0 * (1.0 - t) * t ** 2, t ** 3)
+
+    segments = []
+    for i in range(len(points) - 1):
+        v1, v2, v3, v4 = points[i], right[i], left[i + 1], points[i + 1]
+
+        # correct_bezpart(): handles crossing each other by x are shortened proportionally
+        h1 = v1 - v2
+        h2 = v4 - v3
+        handles_len = abs(h1[0]) + abs(h2[0])
+        if handles_len != 0.0 and handles_len > v4[0] - v1[0]:
+            fac = (v4[0] - v1[0]) / handles_len
+            v2 = v1 - fac * h1
+            v3 = v4 - fac * h2
+
+        segments.append(weights[0] * v1 + weights[1] * v2 + weights[2] * v3 + weights[3] * v4)
+
+    return np.concatenate(segments)
+
+
+def _curve_extend(x, first, last, ext_in, ext_out, extrapolate):
+    """ Returns values of curve out of range of its first and last points, port of curvemap_calc_extend() """
+    if not extrapolate:
+        y_in, y_out = first[1], last[1]
+
+    else:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            y_in = first[1] + ext_in[1] * (x - first[0]) / ext_in[0] if ext_in[0] != 0.0 else \
+                first[1] + ext_in[1] * 10000.0
+            y_out = last[1] + ext_out[1] * (x - last[0]) / ext_out[0] if ext_out[0] != 0.0 else \
+                last[1] - ext_out[1] * 10000.0
+
+    return np.where(x <= first[0], y_in, np.where(x >= last[0], y_out, 0.0))
+
+
+def curve_table(mapping, curve) -> CurveTable:
+    """ Builds table of curve with equal x distances, port of Blender curvemap_make_table() """
+    curve_points = curve.points
+    points = np.array([tuple(point.location) for point in curve_points], dtype=np.float64).reshape(-1, 2)
+    handle_types = [point.handle_type for point in curve_points]
+
+    # extend was moved from CurveMap to CurveMapping in Blender 2.82
+    extend = mapping.extend if BLENDER_VERSION >= '2.82' else curve.extend
+    extrapolate = extend == 'EXTRAPOLATED'
+
+    left, right = _curve_handles(points, handle_types)
+    samples = _curve_segments(points, left, right)
+
+    # first and last handles directions of unit length are used for extrapolation
+    ext_in = left[0] - points[0]
+    ext_out = points[-1] - right[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ext_in /= np.hypot(*ext_in)
+        ext_out /= np.hypot(*ext_out)
+
+    # table covers clipping rect and all points
+    min_x = min(mapping.clip_min_x, points[:, 0].min())
+    max_x = max(mapping.clip_max_x, points[:, 0].max())
+    step = (max_x - min_x) / CURVE_TABLE_SIZE
+    table_x = min_x + step * np.arange(CURVE_TABLE_SIZE + 1)
+
+    # index of the first sample with x greater than table x, it is looked for by sequential scan
+    # of samples in Blender, which is the same as search in running maximum of samples x
+    xs, ys = samples[:, 0], samples[:, 1]
+    last = len(xs) - 1
+    ind = np.minimum(np.searchsorted(np.maximum.accumulate(xs), table_x, side='right'), last)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fac1 = xs[ind] - xs[ind - 1]
+        fac = np.where(fac1 > FLT_EPSILON, (xs[ind] - table_x) / fac1, 0.0)
+    table_y = fac * ys[ind - 1] + (1.0 - fac) * ys[ind]
+
+    # values out of samples range are extrapolated, except ones exactly on the end points
+    outside = (ind == 0) | ((ind == last) & (table_x >= xs[last]))
+    extended = np.where(np.abs(table_x - xs[ind]) <= 1e-6, ys[ind],
+                        _curve_extend(table_x, samples[0], samples[-1], ext_in, ext_out, extrapolate))
+    table_y = np.where(outside, extended, table_y)
+
+    return CurveTable(min_x, step, table_x, table_y, ext_in, ext_out, extrapolate)
+
+
+def eval_curve_table(table: CurveTable, values: np.array) -> np.array:
+    """ Evaluates curve table for array of values, port of Blender BKE_curvemap_evaluateF() """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fi = (values - table.min_x) / table.step
+
+    ind = np.clip(np.floor(fi), 0, CURVE_TABLE_SIZE - 1).astype(np.int32)
+    fac = fi - ind
+    res = (1.0 - fac) * table.table_y[ind] + fac * table.table_y[ind + 1]
+
+    outside = (fi < 0.0) | (fi > CURVE_TABLE_SIZE)
+    if outside.any():
+        first = (table.table_x[0], table.table_y[0])
+        last = (table.table_x[-1], table.table_y[-1])
+        res = np.where(outside, _curve_extend(values, first, last, table.ext_in, table.ext_out,
+                                              table.extrapolate), res)
+
+    return res
+
+
+def eval_curve_array(mapping, curve_index: int, values: np.array) -> np.array:
+    """ Evaluates curve of mapping for array of values, clips to limits if needed """
+    if mapping.use_clip:
+        values = np.clip(values, mapping.clip_min_x, mapping.clip_max_x)
+
+    table = curve_table(mapping, mapping.curves[curve_index])
+    res = eval_curve_table(table, values.astype(np.float64)).astype(np.float32)
+
+    if mapping.use_clip:
+        res = np.clip(res, mapping.clip_min_y, mapping.clip_max_y)
+
+    return res
+
+
+def float_curve_lut(mapping, size=LUT_SIZE) -> np.array:
+    """ Returns lookup table of the first curve of mapping for values in [0, 1] """
+    return _get_cached(('float_curve', size, curve_mapping_key(mapping)),
+                       lambda: eval_curve_array(mapping, 0, _samples(size)).reshape(-1, 1))
+
+
+def rgb_curve_lut(mapping, size=LUT_SIZE) -> np.array:
+    """
+    Returns RGBA lookup table of RGB curves mapping for values in [0, 1]:
+    combined curve is applied before curve of every channel
+    """
+    def create():
+        combined = eval_curve_array(mapping, 3, _samples(size))
+
+        lut = np.ones((size, 4), dtype=np.float32)
+        for i in range(3):
+            lut[:, i] = eval_curve_array(mapping, i, combined)
+
+        return lut
+
+    return _get_cached(('rgb_curve', size, curve_mapping_key(mapping)), create)
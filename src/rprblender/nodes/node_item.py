@@ -22,6 +22,72 @@ from rprblender.utils import logging
 log = logging.Log(tag='export.node')
 
 
+# operations which don't depend on order of operands
+COMMUTATIVE_OPS = {
+    pyrpr.MATERIAL_NODE_OP_ADD, pyrpr.MATERIAL_NODE_OP_MUL,
+    pyrpr.MATERIAL_NODE_OP_MIN, pyrpr.MATERIAL_NODE_OP_MAX,
+    pyrpr.MATERIAL_NODE_OP_EQUAL, pyrpr.MATERIAL_NODE_OP_NOT_EQUAL,
+    pyrpr.MATERIAL_NODE_OP_DOT3, pyrpr.MATERIAL_NODE_OP_DOT4,
+}
+
+ARITHMETIC_INPUTS = (pyrpr.MATERIAL_INPUT_COLOR0, pyrpr.MATERIAL_INPUT_COLOR1, pyrpr.MATERIAL_INPUT_COLOR2)
+
+
+def _is_constant(data, value):
+    """ Checks if data is a constant equal to value in all channels. pyrpr sets w=1.0 for 3 channel vectors """
+    if isinstance(data, (float, int)):
+        return data == value
+
+    if isinstance(data, tuple):
+        return all(val == value for val in data) and (len(data) == 4 or value == 1.0)
+
+    return False
+
+
+def _get_arithmetic_inputs(data, rpr_operation):
+    """ Returns inputs of arithmetic node data with rpr_operation, otherwise None """
+    if isinstance(data, pyrpr.MaterialNode) and data.type == pyrpr.MATERIAL_NODE_ARITHMETIC and \
+            data.inputs.get(pyrpr.MATERIAL_INPUT_OP, None) == rpr_operation:
+        return data.inputs
+
+    return None
+
+
+def _simplify(rpr_operation, data, other_data):
+    """ Returns operand if operation with node doesn't change it, otherwise None """
+    if rpr_operation == pyrpr.MATERIAL_NODE_OP_ADD:
+        if _is_constant(other_data, 0.0):
+            return data
+        if _is_constant(data, 0.0):
+            return other_data
+
+    elif rpr_operation == pyrpr.MATERIAL_NODE_OP_MUL:
+        if _is_constant(other_data, 1.0):
+            return data
+        if _is_constant(data, 1.0):
+            return other_data
+
+    elif rpr_operation == pyrpr.MATERIAL_NODE_OP_SUB:
+        if _is_constant(other_data, 0.0):
+            return data
+
+        # double negation: 0 - (0 - x) = x
+        if _is_constant(data, 0.0):
+            inputs = _get_arithmetic_inputs(other_data, pyrpr.MATERIAL_NODE_OP_SUB)
+            if inputs and _is_constant(inputs.get(pyrpr.MATERIAL_INPUT_COLOR0, None), 0.0):
+                return inputs.get(pyrpr.MATERIAL_INPUT_COLOR1, None)
+
+    elif rpr_operation in (pyrpr.MATERIAL_NODE_OP_DIV, pyrpr.MATERIAL_NODE_OP_POW):
+        if _is_constant(other_data, 1.0):
+            return data
+
+    elif rpr_operation in (pyrpr.MATERIAL_NODE_OP_MIN, pyrpr.MATERIAL_NODE_OP_MAX):
+        if data is other_data:
+            return data
+
+    return None
+
+
 class NodeItem:
     ''' This class is a wrapper used for doing operations on material nodes.
         rpr_context is referenced to create new nodes 
@@ -43,6 +109,25 @@ class NodeItem:
         if value is not None:
             self.data.set_input(name, value.data if isinstance(value, NodeItem) else value)
 
+    def _arithmetic_node(self, rpr_operation, *operands):
+        """ Returns arithmetic node of operation, existing node is reused for the same operands """
+        # values are compared by value and nodes by identity, key keeps operand nodes alive
+        # only while arithmetic node is alive, because they are removed together
+        node_key = (rpr_operation, frozenset(operands) if rpr_operation in COMMUTATIVE_OPS else operands)
+
+        arithmetic_nodes = self.rpr_context.arithmetic_nodes
+        result_data = arithmetic_nodes.get(node_key, None)
+        if result_data is not None:
+            return result_data
+
+        result_data = self.rpr_context.create_material_node(pyrpr.MATERIAL_NODE_ARITHMETIC)
+        result_data.set_input(pyrpr.MATERIAL_INPUT_OP, rpr_operation)
+        for name, data in zip(ARITHMETIC_INPUTS, operands):
+            result_data.set_input(name, data)
+
+        arithmetic_nodes[node_key] = result_data
+        return result_data
+
     ###### MATH OPS ######
     def _arithmetic_helper(self, other, rpr_operation, func):
         ''' helper function for overridden math functions.
@@ -55,9 +140,7 @@ class NodeItem:
             elif isinstance(self.data, tuple):
                 result_data = tuple(map(func, self.data))
             else:
-                result_data = self.rpr_context.create_material_node(pyrpr.MATERIAL_NODE_ARITHMETIC)
-                result_data.set_input(pyrpr.MATERIAL_INPUT_OP, rpr_operation)
-                result_data.set_input(pyrpr.MATERIAL_INPUT_COLOR0, self.data)
+                result_data = self._arithmetic_node(rpr_operation, self.data)
 
         else:
             other_data = other.data if isinstance(other, NodeItem) else other
@@ -80,10 +163,9 @@ class NodeItem:
                     result_data = tuple(map(func, data, other_data))
 
             else:
-                result_data = self.rpr_context.create_material_node(pyrpr.MATERIAL_NODE_ARITHMETIC)
-                result_data.set_input(pyrpr.MATERIAL_INPUT_OP, rpr_operation)
-                result_data.set_input(pyrpr.MATERIAL_INPUT_COLOR0, self.data)
-                result_data.set_input(pyrpr.MATERIAL_INPUT_COLOR1, other_data)
+                result_data = _simplify(rpr_operation, self.data, other_data)
+                if result_data is None:
+                    result_data = self._arithmetic_node(rpr_operation, self.data, other_data)
 
         return NodeItem(self.rpr_context, result_data)
 
@@ -194,9 +276,7 @@ class NodeItem:
                 3: pyrpr.MATERIAL_NODE_OP_SELECT_W,
             }[key]
 
-            result_data = self.rpr_context.create_material_node(pyrpr.MATERIAL_NODE_ARITHMETIC)
-            result_data.set_input(pyrpr.MATERIAL_INPUT_OP, rpr_key)
-            result_data.set_input(pyrpr.MATERIAL_INPUT_COLOR0, self.data)
+            result_data = self._arithmetic_node(rpr_key, self.data)
 
         return NodeItem(self.rpr_context, result_data)
 
@@ -227,11 +307,8 @@ class NodeItem:
         if isinstance(self.data, float):
             result_data = if_data if bool(self.data) else else_data
         else:
-            result_data = self.rpr_context.create_material_node(pyrpr.MATERIAL_NODE_ARITHMETIC)
-            result_data.set_input(pyrpr.MATERIAL_INPUT_OP, pyrpr.MATERIAL_NODE_OP_TERNARY)
-            result_data.set_input(pyrpr.MATERIAL_INPUT_COLOR0, self.data)
-            result_data.set_input(pyrpr.MATERIAL_INPUT_COLOR1, if_data)
-            result_data.set_input(pyrpr.MATERIAL_INPUT_COLOR2, else_data)
+            result_data = self._arithmetic_node(pyrpr.MATERIAL_NODE_OP_TERNARY,
+                                                self.data, if_data, else_data)
 
         return NodeItem(self.rpr_context, result_data)
 
@@ -257,8 +334,29 @@ class NodeItem:
 
     def clamp(self, min_val=0.0, max_val=1.0):
         ''' clamp data to min/max '''
+        if self._is_clamped(min_val, max_val):
+            return self
+
         return self.min(max_val).max(min_val)
 
+    def _is_clamped(self, min_val, max_val):
+        ''' Checks if data is a node already clamped to range within min_val/max_val '''
+        if not isinstance(min_val, float) or not isinstance(max_val, float):
+            return False
+
+        max_inputs = _get_arithmetic_inputs(self.data, pyrpr.MATERIAL_NODE_OP_MAX)
+        if not max_inputs:
+            return False
+
+        min_inputs = _get_arithmetic_inputs(max_inputs.get(pyrpr.MATERIAL_INPUT_COLOR0, None),
+                                            pyrpr.MATERIAL_NODE_OP_MIN)
+        if not min_inputs:
+            return False
+
+        low = max_inputs.get(pyrpr.MATERIAL_INPUT_COLOR1, None)
+        high = min_inputs.get(pyrpr.MATERIAL_INPUT_COLOR1, None)
+        return isinstance(low, float) and isinstance(high, float) and min_val <= low <= high <= max_val
+
     def to_bw(self):
         ''' Apply RGB to BW conversion for "Value" output '''
         # RGB to BW conversion constants by R-G-B channels
@@ -13,10 +13,12 @@
 # limitations under the License.
 #********************************************************************
 from abc import ABCMeta, abstractmethod
+import hashlib
 
 import bpy
 import pyrpr
 
+from rprblender import config
 from rprblender.engine.context import RPRContext, RPRContext2
 from rprblender.engine.context_hybrid import RPRContext as RPRContextHybrid
 from rprblender.engine.context_hybridpro import RPRContext as RPRContextHybridPro
@@ -33,6 +35,51 @@ def key(material_key, node, socket_out, group_nodes: list) -> tuple:
     return (material_key, node.name, socket_out.name if socket_out else None)
 
 
+# depth of nested node properties compared by value, nodes with deeper properties aren't shared
+STRUCTURE_KEY_MAX_DEPTH = 6
+
+# properties of ShaderNode which don't affect export, filled on first use
+_base_node_properties = None
+
+
+class _UnkeyedValue(Exception):
+    """ Node property can't be compared by value """
+    pass
+
+
+def _value_key(value, depth=0):
+    """ Returns hashable representation of node property or socket default value """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+
+    if isinstance(value, bpy.types.ID):
+        return type(value).__name__, value.name_full
+
+    if isinstance(value, bpy.types.bpy_struct):
+        if depth >= STRUCTURE_KEY_MAX_DEPTH:
+            raise _UnkeyedValue(value)
+
+        return tuple((prop.identifier, _value_key(getattr(value, prop.identifier, None), depth + 1))
+                     for prop in value.bl_rna.properties if prop.identifier != 'rna_type')
+
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+
+    # arrays, vectors, colors and collections
+    return tuple(_value_key(val, depth + 1) for val in value)
+
+
+def _node_properties_key(node):
+    global _base_node_properties
+    if _base_node_properties is None:
+        # node_tree of group node is compared by structure of its nodes
+        _base_node_properties = frozenset(prop.identifier for prop in bpy.types.ShaderNode.bl_rna.properties) \
+            | {'node_tree'}
+
+    return tuple((prop.identifier, _value_key(getattr(node, prop.identifier, None)))
+                 for prop in node.bl_rna.properties if prop.identifier not in _base_node_properties)
+
+
 class MaterialError(BaseException):
     """ Unsupported shader nodes setup """
     pass
@@ -44,6 +91,11 @@ class BaseNodeParser(metaclass=ABCMeta):
     Subclasses should override only export() function.
     """
 
+    # parser exports node linked to material output, this node gets material id and name
+    exports_root = False
+    # export() returns node of input link, like reroute and group nodes
+    is_pass_through = False
+
     def __init__(self, rpr_context: RPRContext, material: bpy.types.Material,
                  node: bpy.types.Node, socket_out: bpy.types.NodeSocket, group_nodes=(), *, data):
         self.rpr_context = rpr_context
@@ -61,12 +113,17 @@ class BaseNodeParser(metaclass=ABCMeta):
 
     @property
     def normal_node(self):
-        return self.data.get('normal_node')
+        return self._get_normal_node()
 
     @normal_node.setter
     def normal_node(self, node):
         self.data['normal_node'] = node
 
+    def _get_normal_node(self):
+        # counting reads of normal node, export of nodes which read it depends on material normal node
+        self.data['normal_node_reads'] = self.data.get('normal_node_reads', 0) + 1
+        return self.data.get('normal_node')
+
     @property
     def object(self):
         return self.data['object']
@@ -94,17 +151,143 @@ class BaseNodeParser(metaclass=ABCMeta):
 
         rpr_node = self.rpr_context.material_nodes.get(node_key, None)
         if rpr_node:
+            if node_key in self.data.get('normal_dependent_keys', ()):
+                self._get_normal_node()
             return rpr_node
 
         # getting corresponded NodeParser class
         node_parser_class = get_node_parser_class(node.bl_idname)
-        if node_parser_class:
-            node_parser = node_parser_class(self.rpr_context, self.material, node, socket_out,
-                                            group_nodes, data=self.data)
-            return node_parser.final_export()
+        if not node_parser_class:
+            log.warn("Ignoring unsupported node", node, self.material)
+            return None
 
-        log.warn("Ignoring unsupported node", node, self.material)
-        return None
+        # check if the same subgraph was already parsed by this or another material,
+        # material root isn't shared, because it gets material id and name
+        structure_key = self._get_structure_key(node, socket_out, group_nodes) \
+            if config.material_node_cache and not self.exports_root else None
+        if structure_key:
+            normal_node_key = (structure_key, id(self.data.get('normal_node')))
+            rpr_node = self.rpr_context.get_material_node_structure(self.material_key[0], (structure_key, None))
+            if rpr_node is None:
+                rpr_node = self.rpr_context.get_material_node_structure(self.material_key[0], normal_node_key)
+                if rpr_node is not None:
+                    self._get_normal_node()
+
+            if rpr_node is not None:
+                self.rpr_context.set_material_node_key(node_key, rpr_node)
+                return rpr_node
+
+        normal_node_reads = self.data.get('normal_node_reads', 0)
+
+        node_parser = node_parser_class(self.rpr_context, self.material, node, socket_out,
+                                        group_nodes, data=self.data)
+        # pass through node linked to material output returns material root
+        node_parser.exports_root = self.exports_root and node_parser.is_pass_through
+        rpr_node = node_parser.final_export()
+
+        is_normal_dependent = self.data.get('normal_node_reads', 0) != normal_node_reads
+        if is_normal_dependent:
+            self.data.setdefault('normal_dependent_keys', set()).add(node_key)
+
+        if structure_key and isinstance(rpr_node, pyrpr.MaterialNode):
+            self.rpr_context.set_material_node_structure(
+                self.material_key[0], normal_node_key if is_normal_dependent else (structure_key, None),
+                rpr_node)
+
+        return rpr_node
+
+    def _get_structure_key(self, node, socket_out, group_nodes):
+        """
+        Returns structure key of node subgraph: digest of node type, properties, input values
+        and structure keys of linked nodes. Nodes with the same structure key are exported
+        to the same material nodes. Returns None if subgraph can't be shared.
+        """
+        structure_keys = self.data.setdefault('structure_keys', {})
+        node_id = (node.as_pointer(), socket_out.identifier if socket_out else None,
+                   tuple(group_node.as_pointer() for group_node in group_nodes))
+        if node_id in structure_keys:
+            return structure_keys[node_id]
+
+        # None prevents infinite recursion in link loops
+        structure_keys[node_id] = None
+
+        try:
+            parts = self._get_structure_parts(node, socket_out, group_nodes)
+
+        except _UnkeyedValue:
+            parts = None
+
+        structure_key = hashlib.blake2b(repr(parts).encode(), digest_size=16).digest() \
+            if parts is not None else None
+
+        structure_keys[node_id] = structure_key
+        return structure_key
+
+    def _get_structure_parts(self, node, socket_out, group_nodes):
+        if node.bl_idname == 'NodeGroupInput':
+            # input of group node is linked outside of the group
+            if not group_nodes:
+                return None
+
+            socket_in = next((entry for entry in group_nodes[-1].inputs
+                              if entry.identifier == socket_out.identifier), None)
+            return self._get_input_structure(socket_in, group_nodes[:-1]) if socket_in else None
+
+        obj = self.data['object']
+        parts = [node.bl_idname, socket_out.identifier if socket_out else None, node.mute,
+                 obj.name_full if obj else None, _node_properties_key(node)]
+
+        # node exports which depend on material or scene, not only on node data
+        if node.bl_idname == 'ShaderNodeObjectInfo':
+            parts.append(self.material.pass_index)
+
+        image_user = getattr(node, 'image_user', None)
+        if image_user and not image_user.use_auto_refresh:
+            depsgraph = self.rpr_context.blender_data.get('depsgraph', None)
+            parts.append(depsgraph.scene.frame_current if depsgraph else None)
+
+        if node.bl_idname == 'ShaderNodeGroup' and not node.mute:
+            # group output is exported by linked node inside the group
+            output_node = next((entry for entry in node.node_tree.nodes
+                                if entry.type == 'GROUP_OUTPUT' and entry.is_active_output), None) \
+                if node.node_tree else None
+            if not output_node:
+                return None
+
+            socket_in = next((entry for entry in output_node.inputs
+                              if entry.identifier == socket_out.identifier), None)
+            input_parts = self._get_input_structure(socket_in, group_nodes + (node,)) if socket_in else None
+            if input_parts is None:
+                return None
+
+            parts.append(input_parts)
+            return parts
+
+        parts.append(tuple(_value_key(getattr(entry, 'default_value', None)) for entry in node.outputs))
+        for socket_in in node.inputs:
+            input_parts = self._get_input_structure(socket_in, group_nodes)
+            if input_parts is None:
+                return None
+
+            parts.append(input_parts)
+
+        return parts
+
+    def _get_input_structure(self, socket_in, group_nodes):
+        if not socket_in.is_linked:
+            return (socket_in.identifier, socket_in.enabled,
+                    _value_key(getattr(socket_in, 'default_value', None)))
+
+        link = socket_in.links[0]
+        if not link.is_valid or link.is_hidden:
+            return socket_in.identifier, link.is_valid, link.is_hidden
+
+        linked_key = self._get_structure_key(link.from_node, link.from_socket, group_nodes)
+        if linked_key is None:
+            return None
+
+        # socket types define if link is allowed
+        return socket_in.identifier, socket_in.bl_idname, link.from_socket.bl_idname, linked_key
 
     def _parse_val(self, val):
         """ Turn a blender node val or default value for input into something that works well with rpr """
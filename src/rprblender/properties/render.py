@@ -37,7 +37,7 @@ from rprblender import config
 from rprblender import utils
 from rprblender.utils.user_settings import get_user_settings, on_settings_changed
 from . import RPR_Properties
-from rprblender.engine import context
+from rprblender.engine import context, is_plugin_available
 from rprblender.engine.context_hybridpro import RPRContext as RPRContextHybridPro
 from rprblender.engine.context_hybrid import RPRContext as RPRContextHybrid
 
@@ -477,19 +477,19 @@ class RPR_RenderProperties(RPR_Properties):
     )
 
     render_quality_items = []
-    if pyrpr2.Context.plugin_id >= 0:
+    if is_plugin_available(pyrpr2.Context):
         render_quality_items += [
             ('FULL2', "Final", "Final render quality, including hardware ray tracing support"),
         ]
-    if pyrpr.Context.plugin_id >= 0:
+    if is_plugin_available(pyrpr.Context):
         render_quality_items += [
             ('FULL', "Legacy", "Legacy render quality"),
         ]
-    if pyhybridpro.Context.plugin_id >= 0:
+    if is_plugin_available(pyhybridpro.Context):
         render_quality_items += [
             ('HYBRIDPRO', "Interactive", "Interactive render quality, including hardware ray tracing support")
         ]
-    if pyhybrid.Context.plugin_id >= 0:
+    if is_plugin_available(pyhybrid.Context):
         render_quality_items += [
             ('HIGH', "Interactive", "High render quality"),
         ]
@@ -600,6 +600,13 @@ class RPR_RenderProperties(RPR_Properties):
         default=False,
     )
 
+    geometry_instancing: BoolProperty(
+        name="Instance Identical Geometry",
+        description="Export meshes with identical geometry data as instances of one mesh to save memory.\n"
+                    "Increases sync time as all mesh data has to be hashed",
+        default=False,
+    )
+
     motion_blur_in_velocity_aov: BoolProperty(
         name="Only in Velocity AOV",
         description="Apply Motion Blur in Velocity AOV only\nOnly for Full render quality",
@@ -25,6 +25,7 @@ from bpy.props import (
 import pyrpr
 import math
 
+from rprblender.engine.context import AOV_CONSUMER_DISPLAY, AOV_CONSUMER_FINAL
 from rprblender.utils import logging
 from . import RPR_Properties
 
@@ -499,9 +500,9 @@ class RPR_ViewLayerProperites(RPR_Properties):
 
         log(f"Syncing view layer: {view_layer.name}")
 
-        # should always be enabled
+        # should always be enabled. Render passes except color are read only to final render result
         rpr_context.enable_aov(pyrpr.AOV_COLOR)
-        rpr_context.enable_aov(pyrpr.AOV_DEPTH)
+        rpr_context.enable_aov(pyrpr.AOV_DEPTH, AOV_CONSUMER_FINAL)
 
         for i, enable_aov in enumerate(self.enable_aovs):
             if not enable_aov:
@@ -519,20 +520,21 @@ class RPR_ViewLayerProperites(RPR_Properties):
                 continue
 
             rpr_engine.add_pass(aov['name'], len(aov['channel']), aov['channel'], layer=view_layer.name)
-            rpr_context.enable_aov(aov['rpr'])
+            rpr_context.enable_aov(aov['rpr'], AOV_CONSUMER_DISPLAY if aov['rpr'] == pyrpr.AOV_COLOR
+                                   else AOV_CONSUMER_FINAL)
 
         if cryptomatte_allowed:
             if self.crytomatte_aov_material:
                 for i in range(3):
                     aov = self.cryptomatte_aovs_info[i]
                     rpr_engine.add_pass(aov['name'], len(aov['channel']), aov['channel'], layer=view_layer.name)
-                    rpr_context.enable_aov(aov['rpr'])
+                    rpr_context.enable_aov(aov['rpr'], AOV_CONSUMER_FINAL)
 
             if self.crytomatte_aov_object:
                 for i in range(3, 6):
                     aov = self.cryptomatte_aovs_info[i]
                     rpr_engine.add_pass(aov['name'], len(aov['channel']), aov['channel'], layer=view_layer.name)
-                    rpr_context.enable_aov(aov['rpr'])
+                    rpr_context.enable_aov(aov['rpr'], AOV_CONSUMER_FINAL)
         
         if self.use_contour_render:
             aov = self.contour_info
@@ -170,6 +170,14 @@ class RPR_RENDER_PT_limits(RPR_Panel):
         col.enabled = context.view_layer.rpr.use_contour_render and rpr.final_render_mode == 'FULL2'
         col.prop(limits, 'contour_render_samples', slider=False)
 
+        # keeps synced scene between animation frames
+        col = self.layout.column(align=True)
+        col.enabled = rpr.final_render_mode in ('FULL', 'FULL2')
+        col.prop(context.scene.render, 'use_persistent_data', text="Persistent Data")
+
+        col = self.layout.column(align=True)
+        col.prop(rpr, 'geometry_instancing')
+
 
 class RPR_RENDER_PT_viewport_limits(RPR_Panel):
     bl_label = "Viewport & Preview"
@@ -83,7 +83,8 @@ def rif_ver_str(full: bool = False) -> str:
     Return readable RIF version as #.#.#
     Add build version hex number in full mode
     """
-    import pyrprimagefilters
+    from rprblender.engine import init_rif
+    pyrprimagefilters = init_rif()
     version = f"{pyrprimagefilters.VERSION_MAJOR}.{pyrprimagefilters.VERSION_MINOR}.{pyrprimagefilters.VERSION_REVISION}"
     if full and pyrprimagefilters.COMMIT_INFO:
         version += f" build {hex(pyrprimagefilters.COMMIT_INFO)}"
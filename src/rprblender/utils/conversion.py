@@ -14,6 +14,8 @@
 #********************************************************************
 import math
 
+import numpy as np
+
 
 def convert_kelvins_to_rgb_bartlett(color_temperature: float) -> tuple:
     """
@@ -149,5 +151,100 @@ def get_cryptomatte_name(name: str) -> str:
     return name.replace("(", "").replace(")", "").replace(", ", "_").replace("'", "")
 
 
+MURMUR3_BATCH_SIZE = 65536
+
+# (cryptomatte name, hash) by name, names of objects and materials are mostly the same between syncs
+_cryptomatte_hashes = {}
+
+
+def _rotl32(x, r):
+    return (x << np.uint32(r)) | (x >> np.uint32(32 - r))
+
+
+def _murmurh3_32_blocks(words, lengths, seed):
+    """
+    murmurh3_32 of zero padded keys sorted by length.
+    words are (n, m) little endian uint32 blocks of keys, lengths are sorted key lengths in bytes.
+    """
+    c1 = np.uint32(0xcc9e2d51)
+    c2 = np.uint32(0x1b873593)
+
+    h1 = np.full(len(lengths), seed, dtype=np.uint32)
+    for i in range(words.shape[1]):
+        # keys are sorted by length, so keys with block i form a suffix of array
+        tail_start, body_start = np.searchsorted(lengths, (i * 4 + 1, i * 4 + 4))
+
+        k1 = words[tail_start:, i] * c1
+        k1 = _rotl32(k1, 15)
+        k1 *= c2
+
+        # tail block: the rest of padded word is zero, same as in tail of reference implementation
+        h1[tail_start:body_start] ^= k1[:body_start - tail_start]
+
+        # body block
+        h = h1[body_start:] ^ k1[body_start - tail_start:]
+        h = _rotl32(h, 13)
+        h1[body_start:] = h * np.uint32(5) + np.uint32(0xe6546b64)
+
+    h1 ^= lengths.astype(np.uint32)
+
+    # fmix
+    h1 ^= h1 >> np.uint32(16)
+    h1 *= np.uint32(0x85ebca6b)
+    h1 ^= h1 >> np.uint32(13)
+    h1 *= np.uint32(0xc2b2ae35)
+    h1 ^= h1 >> np.uint32(16)
+
+    # hash modified to match core results, same as in murmurh3_32()
+    h1[(h1 >> np.uint32(23)) & np.uint32(255) == 0] ^= np.uint32(1 << 23)
+
+    return h1
+
+
+def murmurh3_32_batch(keys, seed=0x0) -> np.ndarray:
+    """
+    Vectorized murmurh3_32 of sequence of strings, returns uint32 array of hashes.
+    Keys are sorted by length and hashed by batches of similar length, so a few long names
+    don't increase size of padded arrays.
+    """
+    encoded = [key.encode() for key in keys]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    hashes = np.empty(len(encoded), dtype=np.uint32)
+
+    order = np.argsort(lengths, kind='stable')
+    for start in range(0, len(order), MURMUR3_BATCH_SIZE):
+        indices = order[start:start + MURMUR3_BATCH_SIZE]
+        batch_lengths = lengths[indices]
+        width = max((int(batch_lengths[-1]) + 3) // 4 * 4, 4)
+
+        # fixed size bytes array is zero padded
+        data = np.array([encoded[i] for i in indices.tolist()], dtype=f'S{width}')
+        words = data.view('<u4').reshape(len(indices), width // 4)
+        hashes[indices] = _murmurh3_32_blocks(words, batch_lengths, seed)
+
+    return hashes
+
+
 def get_cryptomatte_hash(name: str) -> str:
-    return "%08x" % murmurh3_32(str(name))
+    name = str(name)
+    entry = _cryptomatte_hashes.get(name, None)
+    if entry is None:
+        entry = get_cryptomatte_name(name), "%08x" % murmurh3_32(name)
+        _cryptomatte_hashes[name] = entry
+
+    return entry[1]
+
+
+def get_cryptomatte_hashes(names) -> dict:
+    """
+    Returns cryptomatte manifest {cryptomatte name: hash} of names.
+    Hashes of new names are calculated by one murmurh3_32_batch() call and cached.
+    """
+    names = tuple(map(str, names))
+    new_names = tuple(set(names).difference(_cryptomatte_hashes))
+    if new_names:
+        hashes = murmurh3_32_batch(new_names).tolist()
+        _cryptomatte_hashes.update(
+            (name, (get_cryptomatte_name(name), "%08x" % h)) for name, h in zip(new_names, hashes))
+
+    return dict(map(_cryptomatte_hashes.__getitem__, names))
@@ -20,6 +20,11 @@ import ctypes
 import sys
 from ctypes import cdll
 
+from rprblender import config
+
+from . import logging
+log = logging.Log(tag='utils.gl')
+
 
 if sys.platform == 'linux':
     gl = cdll.LoadLibrary('libGL.so')
@@ -30,12 +35,135 @@ else:
     gl = ctypes.windll.opengl32
 
 
+GL_HALF_FLOAT = 0x140B
+GL_UNSIGNED_BYTE = 0x1401
+GL_SRGB8_ALPHA8 = 0x8C43
+GL_PIXEL_UNPACK_BUFFER = 0x88EC
+GL_STREAM_DRAW = 0x88E0
+GL_MAP_WRITE_BIT = 0x0002
+GL_MAP_INVALIDATE_BUFFER_BIT = 0x0008
+
+# texture formats: (numpy dtype, internal format, upload type)
+TEXTURE_FORMATS = {
+    'FLOAT': (np.float32, bgl.GL_RGBA if platform.system() == 'Darwin' else bgl.GL_RGBA16F, bgl.GL_FLOAT),
+    'HALF_FLOAT': (np.float16, bgl.GL_RGBA16F, GL_HALF_FLOAT),
+    # sRGB encoded color, clamped to [0, 1], texture sampling decodes it back to linear
+    'BYTE': (np.uint8, GL_SRGB8_ALPHA8, GL_UNSIGNED_BYTE),
+}
+
+# OpenGL functions which are not exported by opengl32.dll, loaded by get_gl_function()
+_gl_functions = {}
+
+
+def get_gl_function(name, restype, *argtypes):
+    """ Returns ctypes function of OpenGL extension or newer than 1.1 version, requires current GL context """
+    func = _gl_functions.get(name, None)
+    if func:
+        return func
+
+    if sys.platform == 'win32':
+        gl.wglGetProcAddress.restype = ctypes.c_void_p
+        gl.wglGetProcAddress.argtypes = (ctypes.c_char_p,)
+        address = gl.wglGetProcAddress(name.encode())
+        if not address:
+            raise RuntimeError("OpenGL function isn't available", name)
+
+        func = ctypes.WINFUNCTYPE(restype, *argtypes)(address)
+
+    else:
+        func = getattr(gl, name)
+        func.restype = restype
+        func.argtypes = argtypes
+
+    _gl_functions[name] = func
+    return func
+
+
+def encode_srgb(image: np.array, out: np.array):
+    """ Writes sRGB encoded 8-bit image to out, color is clamped to [0, 1], alpha is kept linear """
+    color = np.clip(image[:, :, :3], 0.0, 1.0)
+    color = np.where(color <= 0.0031308, color * 12.92, 1.055 * np.power(color, 1.0 / 2.4) - 0.055)
+    np.multiply(color, 255.0, out=color)
+    color += 0.5
+    out[:, :, :3] = color
+
+    alpha = np.clip(image[:, :, 3], 0.0, 1.0)
+    alpha *= 255.0
+    alpha += 0.5
+    out[:, :, 3] = alpha
+
+
+class PixelUnpackBuffers:
+    """
+    Double buffered pixel unpack buffers for streaming texture uploads. Image is written to
+    mapped buffer and glTexSubImage2D() reads it asynchronously, while next upload
+    uses the other buffer.
+    """
+
+    def __init__(self):
+        self.buffers = bgl.Buffer(bgl.GL_INT, 2)
+        bgl.glGenBuffers(2, self.buffers)
+        self.index = 0
+
+        self._buffer_data = get_gl_function(
+            'glBufferData', None, ctypes.c_uint, ctypes.c_ssize_t, ctypes.c_void_p, ctypes.c_uint)
+        self._map_buffer_range = get_gl_function(
+            'glMapBufferRange', ctypes.c_void_p,
+            ctypes.c_uint, ctypes.c_ssize_t, ctypes.c_ssize_t, ctypes.c_uint)
+        self._unmap_buffer = get_gl_function('glUnmapBuffer', ctypes.c_ubyte, ctypes.c_uint)
+
+    def delete(self):
+        if self.buffers is not None:
+            bgl.glDeleteBuffers(2, self.buffers)
+            self.buffers = None
+
+    def __del__(self):
+        self.delete()
+
+    def map(self, nbytes):
+        """ Binds next buffer and returns its mapped memory as numpy uint8 array, None if failed """
+        self.index ^= 1
+        bgl.glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self.buffers[self.index])
+
+        # orphaning previous storage, driver keeps it until pending upload is finished
+        self._buffer_data(GL_PIXEL_UNPACK_BUFFER, nbytes, None, GL_STREAM_DRAW)
+        address = self._map_buffer_range(GL_PIXEL_UNPACK_BUFFER, 0, nbytes,
+                                         GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT)
+        if not address:
+            bgl.glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+            return None
+
+        return np.ctypeslib.as_array((ctypes.c_ubyte * nbytes).from_address(address))
+
+    def unmap(self):
+        self._unmap_buffer(GL_PIXEL_UNPACK_BUFFER)
+
+    @staticmethod
+    def unbind():
+        bgl.glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+
+
 class GLTexture:
+    """
+    Texture with rendered image. Texture is recreated only when image size or format changes.
+    set_image() skips upload of the same image or image of the same generation.
+    Upload format and pixel unpack buffers usage are set by config.viewport_texture_format
+    and config.viewport_use_pbo.
+    """
     channels = 4
 
-    def __init__(self):
+    def __init__(self, texture_format=None, use_pbo=None):
         self.image = None
         self.texture_id = 0
+        self.shape = None
+        self.generation = None
+
+        self.format = texture_format or config.viewport_texture_format
+        self.use_pbo = config.viewport_use_pbo if use_pbo is None else use_pbo
+        self.unpack_buffers = None
+
+        # buffer for converting image to upload format without pixel unpack buffers
+        self.upload_buffer = None
 
     def _create(self):
         textures = bgl.Buffer(bgl.GL_INT, [1,])
@@ -48,16 +176,17 @@ class GLTexture:
         bgl.glTexParameteri(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_WRAP_S, bgl.GL_REPEAT)
         bgl.glTexParameteri(bgl.GL_TEXTURE_2D, bgl.GL_TEXTURE_WRAP_T, bgl.GL_REPEAT)
 
-        height, width, channels = self.image.shape
-        bgl.glTexImage2D(
-            bgl.GL_TEXTURE_2D, 0, bgl.GL_RGBA if platform.system() == 'Darwin' else bgl.GL_RGBA16F,
+        height, width, channels = self.shape
+        _, internal_format, upload_type = TEXTURE_FORMATS[self.format]
+        gl.glTexImage2D(
+            bgl.GL_TEXTURE_2D, 0, internal_format,
             width, height, 0,
-            bgl.GL_RGBA, bgl.GL_FLOAT,
-            bgl.Buffer(bgl.GL_FLOAT, [width, height, channels])
+            bgl.GL_RGBA, upload_type,
+            None
         )
 
     def __del__(self):
-        if self.image is not None:
+        if self.texture_id:
             self._delete()
 
     def _delete(self):
@@ -65,25 +194,182 @@ class GLTexture:
         bgl.glDeleteTextures(1, textures)
         self.texture_id = 0
         self.image = None
+        self.shape = None
+        self.generation = None
+        self.upload_buffer = None
+
+        if self.unpack_buffers:
+            self.unpack_buffers.delete()
+            self.unpack_buffers = None
 
-    def set_image(self, image: np.array):
-        if self.image is image:
+    def set_image(self, image: np.array, generation=None):
+        """
+        Uploads image to texture. generation is a counter of rendered frames image was read from,
+        image of already uploaded generation isn't uploaded again
+        """
+        if self.image is image or (generation is not None and generation == self.generation
+                                   and self.shape == image.shape):
             return
 
-        if self.image is None:
-            self.image = image
-            self._create()
-        elif self.image.shape != image.shape:
-            self._delete()
-            self.image = image
+        if self.shape != image.shape:
+            if self.texture_id:
+                self._delete()
+
+            self.shape = image.shape
             self._create()
-        else:
-            self.image = image
+
+        self.image = image
+        self.generation = generation
 
         bgl.glBindTexture(bgl.GL_TEXTURE_2D, self.texture_id)
+        if self.use_pbo:
+            try:
+                if self._upload_pbo(image):
+                    return
+
+            except (AttributeError, RuntimeError) as err:
+                log.warn("Pixel unpack buffers aren't available, uploading texture directly", err)
+                self.use_pbo = False
+
+        self._upload(image)
+
+    def _convert(self, image, out):
+        if self.format == 'BYTE':
+            encode_srgb(image, out)
+        else:
+            np.copyto(out, image, casting='unsafe')
+
+    def _upload(self, image):
+        dtype, _, upload_type = TEXTURE_FORMATS[self.format]
+        if image.dtype != dtype or not image.flags.c_contiguous:
+            if self.upload_buffer is None or self.upload_buffer.shape != image.shape \
+                    or self.upload_buffer.dtype != dtype:
+                self.upload_buffer = np.empty(image.shape, dtype=dtype)
+
+            self._convert(image, self.upload_buffer)
+            image = self.upload_buffer
+
+        gl.glTexSubImage2D(
+            bgl.GL_TEXTURE_2D, 0,
+            0, 0, image.shape[1], image.shape[0],
+            bgl.GL_RGBA, upload_type,
+            ctypes.c_void_p(image.ctypes.data)
+        )
+
+    def _upload_pbo(self, image):
+        """ Streams image through pixel unpack buffer, returns False if buffer can't be mapped """
+        dtype, _, upload_type = TEXTURE_FORMATS[self.format]
+        if self.unpack_buffers is None:
+            self.unpack_buffers = PixelUnpackBuffers()
+
+        nbytes = image.shape[0] * image.shape[1] * image.shape[2] * np.dtype(dtype).itemsize
+        data = self.unpack_buffers.map(nbytes)
+        if data is None:
+            return False
+
+        try:
+            # image is converted directly to mapped memory
+            self._convert(image, data.view(dtype).reshape(image.shape))
+
+        finally:
+            self.unpack_buffers.unmap()
+
         gl.glTexSubImage2D(
             bgl.GL_TEXTURE_2D, 0,
-            0, 0, self.image.shape[1], self.image.shape[0],
-            bgl.GL_RGBA, bgl.GL_FLOAT,
-            ctypes.c_void_p(self.image.ctypes.data)
+            0, 0, image.shape[1], image.shape[0],
+            bgl.GL_RGBA, upload_type,
+            None
         )
+        self.unpack_buffers.unbind()
+        return True
+
+
+class GLQuad:
+    """
+    Textured quad drawn by current shader program with "pos" and "texCoord" attributes.
+    Vertex array and vertex buffers are created once and kept between draws, positions are
+    updated only when drawn rectangle changes.
+    """
+
+    def __init__(self):
+        self.vertex_array = None
+        self.vertex_buffers = None
+        self.rect = None
+        self.program = None
+        self.locations = ()
+
+    def _create(self):
+        self.vertex_array = bgl.Buffer(bgl.GL_INT, 1)
+        bgl.glGenVertexArrays(1, self.vertex_array)
+
+        self.vertex_buffers = bgl.Buffer(bgl.GL_INT, 2)
+        bgl.glGenBuffers(2, self.vertex_buffers)
+
+        position = bgl.Buffer(bgl.GL_FLOAT, 8)
+        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.vertex_buffers[0])
+        bgl.glBufferData(bgl.GL_ARRAY_BUFFER, 32, position, bgl.GL_DYNAMIC_DRAW)
+
+        texcoord = [0.0, 0.0, 1.0, 0.0, 1.0, 1.0, 0.0, 1.0]
+        texcoord = bgl.Buffer(bgl.GL_FLOAT, len(texcoord), texcoord)
+        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.vertex_buffers[1])
+        bgl.glBufferData(bgl.GL_ARRAY_BUFFER, 32, texcoord, bgl.GL_STATIC_DRAW)
+        bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
+
+    def __del__(self):
+        if self.vertex_array is not None:
+            self._delete()
+
+    def _delete(self):
+        bgl.glDeleteBuffers(2, self.vertex_buffers)
+        bgl.glDeleteVertexArrays(1, self.vertex_array)
+        self.vertex_array = None
+        self.vertex_buffers = None
+        self.rect = None
+        self.program = None
+        self.locations = ()
+
+    def draw(self, texture_id, x, y, width, height):
+        if self.vertex_array is None:
+            self._create()
+
+        shader_program = bgl.Buffer(bgl.GL_INT, 1)
+        bgl.glGetIntegerv(bgl.GL_CURRENT_PROGRAM, shader_program)
+
+        rect = (x, y, width, height)
+        if rect != self.rect:
+            position = [x, y, x + width, y, x + width, y + height, x, y + height]
+            position = bgl.Buffer(bgl.GL_FLOAT, len(position), position)
+            bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.vertex_buffers[0])
+            bgl.glBufferSubData(bgl.GL_ARRAY_BUFFER, 0, 32, position)
+            bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
+            self.rect = rect
+
+        bgl.glActiveTexture(bgl.GL_TEXTURE0)
+        bgl.glBindTexture(bgl.GL_TEXTURE_2D, texture_id)
+
+        bgl.glBindVertexArray(self.vertex_array[0])
+
+        # attribute locations are stored in vertex array, they are set again for another program
+        if shader_program[0] != self.program:
+            for location in self.locations:
+                bgl.glDisableVertexAttribArray(location)
+
+            texturecoord_location = bgl.glGetAttribLocation(shader_program[0], "texCoord")
+            position_location = bgl.glGetAttribLocation(shader_program[0], "pos")
+            self.locations = (texturecoord_location, position_location)
+
+            bgl.glEnableVertexAttribArray(texturecoord_location)
+            bgl.glEnableVertexAttribArray(position_location)
+
+            bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.vertex_buffers[0])
+            bgl.glVertexAttribPointer(position_location, 2, bgl.GL_FLOAT, bgl.GL_FALSE, 0, None)
+            bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, self.vertex_buffers[1])
+            bgl.glVertexAttribPointer(texturecoord_location, 2, bgl.GL_FLOAT, bgl.GL_FALSE, 0, None)
+            bgl.glBindBuffer(bgl.GL_ARRAY_BUFFER, 0)
+
+            self.program = shader_program[0]
+
+        bgl.glDrawArrays(bgl.GL_TRIANGLE_FAN, 0, 4)
+
+        bgl.glBindVertexArray(0)
+        bgl.glBindTexture(bgl.GL_TEXTURE_2D, 0)
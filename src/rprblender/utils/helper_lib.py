@@ -13,6 +13,7 @@
 # limitations under the License.
 #********************************************************************
 import ctypes
+import threading
 import numpy as np
 import math
 
@@ -24,6 +25,7 @@ log = logging.Log(tag='utils.helper_lib')
 
 is_openvdb_support = False
 lib = None
+_init_lock = threading.Lock()
 
 
 class VdbGridData(ctypes.Structure):
@@ -32,9 +34,8 @@ class VdbGridData(ctypes.Structure):
                 ('values', ctypes.c_void_p), ('valuesSize', ctypes.c_int)]
 
 
-def init():
-    global lib, is_openvdb_support
-
+def _load_lib():
+    """ Loads helper library, returns (lib, is_openvdb_support) """
     lib_dir = package_root_dir()
 
     if IS_DEBUG_MODE:
@@ -44,53 +45,79 @@ def init():
 
     if IS_WIN:
         try:
-            lib = ctypes.CDLL(str(lib_dir / "RPRBlenderHelper_vdb.dll"))
-            is_openvdb_support = True
+            return ctypes.CDLL(str(lib_dir / "RPRBlenderHelper_vdb.dll")), True
 
         except OSError as e:
-            lib = ctypes.CDLL(str(lib_dir / "RPRBlenderHelper.dll"))
+            return ctypes.CDLL(str(lib_dir / "RPRBlenderHelper.dll")), False
+
+    if IS_MAC:
+        return ctypes.CDLL(str(lib_dir / "libRPRBlenderHelper.dylib")), False
+
+    return ctypes.CDLL(str(lib_dir / "libRPRBlenderHelper.so")), False
+
+
+def init():
+    """ Loads helper library, it is called on first use of library functions """
+    global lib, is_openvdb_support
+
+    if lib is not None:
+        return
+
+    with _init_lock:
+        if lib is not None:
+            return
+
+        helper_lib, openvdb_support = _load_lib()
+        log("is_openvdb_support", openvdb_support)
+
+        # Sun & Sky functions
+        helper_lib.set_sun_horizontal_coordinate.argtypes = [ctypes.c_float, ctypes.c_float]
+
+        helper_lib.set_sun_time_location.argtypes = [ctypes.c_float, ctypes.c_float,
+                                                     ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                                     ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                                     ctypes.c_float, ctypes.c_bool]
 
-    elif IS_MAC:
-        lib = ctypes.CDLL(str(lib_dir / "libRPRBlenderHelper.dylib"))
+        helper_lib.set_sky_params.argtypes = [ctypes.c_float, ctypes.c_float, ctypes.c_float,
+                                              ctypes.c_float, ctypes.c_float, ctypes.c_float,
+                                              ctypes.c_void_p, ctypes.c_void_p]
 
-    else:
-        lib = ctypes.CDLL(str(lib_dir / "libRPRBlenderHelper.so"))
+        helper_lib.generate_sky_image.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
+        helper_lib.generate_sky_image.restype = ctypes.c_bool
 
-    log("is_openvdb_support", is_openvdb_support)
+        helper_lib.get_sun_azimuth.restype = ctypes.c_float
+        helper_lib.get_sun_altitude.restype = ctypes.c_float
 
-    # Sun & Sky functions
-    lib.set_sun_horizontal_coordinate.argtypes = [ctypes.c_float, ctypes.c_float]
+        if openvdb_support:
+            # OpenVdb functions
+            helper_lib.vdb_read_grids_list.argtypes = [ctypes.c_char_p]
+            helper_lib.vdb_read_grids_list.restype = ctypes.c_char_p
 
-    lib.set_sun_time_location.argtypes = [ctypes.c_float, ctypes.c_float,
-                                          ctypes.c_int, ctypes.c_int, ctypes.c_int,
-                                          ctypes.c_int, ctypes.c_int, ctypes.c_int,
-                                          ctypes.c_float, ctypes.c_bool]
+            helper_lib.vdb_read_grid_data.argtypes = [ctypes.c_char_p, ctypes.c_char_p,
+                                                      ctypes.POINTER(VdbGridData)]
+            helper_lib.vdb_read_grid_data.restype = ctypes.c_bool
 
-    lib.set_sky_params.argtypes = [ctypes.c_float, ctypes.c_float, ctypes.c_float, 
-                                   ctypes.c_float, ctypes.c_float, ctypes.c_float,
-                                   ctypes.c_void_p, ctypes.c_void_p]
+            helper_lib.vdb_free_grid_data.argtypes = [ctypes.POINTER(VdbGridData)]
 
-    lib.generate_sky_image.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_void_p]
-    lib.generate_sky_image.restype = ctypes.c_bool
+            helper_lib.vdb_get_last_error.restype = ctypes.c_char_p
 
-    lib.get_sun_azimuth.restype = ctypes.c_float
-    lib.get_sun_altitude.restype = ctypes.c_float
+        # lib is assigned after its functions are set up, it is checked by other threads without lock
+        is_openvdb_support = openvdb_support
+        lib = helper_lib
 
-    if is_openvdb_support:
-        # OpenVdb functions
-        lib.vdb_read_grids_list.argtypes = [ctypes.c_char_p]
-        lib.vdb_read_grids_list.restype = ctypes.c_char_p
 
-        lib.vdb_read_grid_data.argtypes = [ctypes.c_char_p, ctypes.c_char_p, ctypes.POINTER(VdbGridData)]
-        lib.vdb_read_grid_data.restype = ctypes.c_bool
+def get_lib():
+    init()
+    return lib
 
-        lib.vdb_free_grid_data.argtypes = [ctypes.POINTER(VdbGridData)]
 
-        lib.vdb_get_last_error.restype = ctypes.c_char_p
+def is_openvdb_supported():
+    init()
+    return is_openvdb_support
 
 
 def set_sun_horizontal_coordinate(azimuth: float, altitude: float):
-    lib.set_sun_horizontal_coordinate(math.degrees(azimuth), math.degrees(altitude))
+    get_lib().set_sun_horizontal_coordinate(math.degrees(azimuth), math.degrees(altitude))
 
 
 def set_sun_time_location(
@@ -99,7 +126,7 @@ def set_sun_time_location(
         hours: int, minutes: int, seconds: int,
         time_zone: float, daylight_savings: bool
 ):
-    lib.set_sun_time_location(
+    get_lib().set_sun_time_location(
         latitude, longitude,
         year, month, day, hours, minutes, seconds,
         time_zone, daylight_savings
@@ -114,7 +141,7 @@ def set_sky_params(
     filter_color_arr = np.array(filter_color, dtype=np.float32)
     ground_color_arr = np.array(ground_color, dtype=np.float32)
 
-    lib.set_sky_params(
+    get_lib().set_sky_params(
         turbidity, sun_glow, sun_disc,
         horizon_height, horizon_blur, saturation,
         ctypes.c_void_p(filter_color_arr.ctypes.data), ctypes.c_void_p(ground_color_arr.ctypes.data)
@@ -123,20 +150,21 @@ def set_sky_params(
 
 def generate_sky_image(width, height) -> np.array:
     im = np.ones((width, height, 3), dtype=np.float32)
-    if not lib.generate_sky_image(width, height, ctypes.c_void_p(im.ctypes.data)):
+    if not get_lib().generate_sky_image(width, height, ctypes.c_void_p(im.ctypes.data)):
         return None
 
     return im
 
 
 def get_sun_horizontal_coordinate() -> (float, float):
+    lib = get_lib()
     return lib.get_sun_azimuth(), lib.get_sun_altitude()
 
 
 def vdb_read_grids_list(vdb_file):
-    grids_list = lib.vdb_read_grids_list(vdb_file.encode('utf8'))
+    grids_list = get_lib().vdb_read_grids_list(vdb_file.encode('utf8'))
     if not grids_list:
-        err_str = lib.vdb_get_last_error().decode('utf8')
+        err_str = get_lib().vdb_get_last_error().decode('utf8')
         raise RuntimeError(err_str)
 
     return tuple(grids_list.decode('utf8').split('\n'))
@@ -145,11 +173,11 @@ def vdb_read_grids_list(vdb_file):
 def vdb_read_grid_data(vdb_file, grid_name):
     data = VdbGridData()
 
-    res = lib.vdb_read_grid_data(vdb_file.encode('utf8'), grid_name.encode('utf8'),
-                                 ctypes.byref(data))
+    res = get_lib().vdb_read_grid_data(vdb_file.encode('utf8'), grid_name.encode('utf8'),
+                                       ctypes.byref(data))
 
     if not res:
-        err_str = lib.vdb_get_last_error().decode('utf8')
+        err_str = get_lib().vdb_get_last_error().decode('utf8')
         raise RuntimeError(err_str)
 
     indices = np.frombuffer((ctypes.c_uint32 * data.indicesSize).from_address(data.indices),
@@ -162,6 +190,6 @@ def vdb_read_grid_data(vdb_file, grid_name):
         'values': values
     }
 
-    lib.vdb_free_grid_data(ctypes.byref(data))
+    get_lib().vdb_free_grid_data(ctypes.byref(data))
 
     return res
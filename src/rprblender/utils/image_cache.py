@@ -0,0 +1,214 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Persistent on-disk cache of converted images shared between Blender processes.
+
+Cached files are named by a content hash of the source data (pixels, packed or source file bytes)
+together with the conversion settings, so the same texture is converted only once for any
+number of renders, exports and Blender launches. Files are written atomically and the cache
+is limited by config.image_cache_size_limit, least recently used files are evicted first.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from rprblender import config
+from . import PID
+
+from . import logging
+log = logging.Log(tag='utils.image_cache')
+
+
+TEMP_SUFFIX = '.tmp'
+STALE_TEMP_FILE_AGE = 3600.0    # seconds
+
+# statistics of current process
+stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0,
+    'bytes_written': 0,
+}
+
+# file content hashes by (path, size, mtime), so the same file is read only once per process
+_file_hashes = {}
+
+# cache files used by current process, they are never evicted by it
+_used_paths = set()
+
+# estimated size of files in cache dir: dir -> bytes. Dir is scanned on the first write and when
+# the estimate exceeds size limit, then files written by other processes are counted too
+_cache_sizes = {}
+
+
+def get_cache_dir() -> Path:
+    """ Returns image cache dir. Creates it if needed """
+    cache_dir = Path(config.image_cache_dir) if config.image_cache_dir else \
+        Path(tempfile.gettempdir()) / "rprblender_cache" / "images"
+
+    if not cache_dir.is_dir():
+        log("Creating image cache dir", cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+
+    return cache_dir
+
+
+def hash_key(*parts) -> str:
+    """ Returns hex digest of key parts. Parts could be bytes, numpy arrays or any printable values """
+    h = hashlib.blake2b(digest_size=20)
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            h.update(str((part.dtype, part.shape)).encode())
+            h.update(np.ascontiguousarray(part).data)
+        elif isinstance(part, (bytes, bytearray, memoryview)):
+            h.update(part)
+        else:
+            h.update(repr(part).encode())
+
+        # separator between parts, so ('ab', 'c') and ('a', 'bc') give different keys
+        h.update(b'\0')
+
+    return h.hexdigest()
+
+
+def hash_file(file_path) -> str:
+    """ Returns hex digest of file content """
+    stat = os.stat(file_path)
+    file_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+
+    file_hash = _file_hashes.get(file_key, None)
+    if file_hash:
+        return file_hash
+
+    h = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+
+    file_hash = h.hexdigest()
+    _file_hashes[file_key] = file_hash
+    return file_hash
+
+
+def get_cached_file(key: str, extension: str, write_file) -> str:
+    """
+    Returns path of cached file by key. If there is no such file, write_file(path) is called
+    to create it. The file is written to temporary path and then renamed to make it visible
+    to other processes only after it is completely written.
+    """
+    cache_dir = get_cache_dir()
+    path = cache_dir / f"{key}.{extension}"
+    _used_paths.add(str(path))
+
+    if path.is_file():
+        stats['hits'] += 1
+        try:
+            # updating modification time as last usage time for LRU eviction
+            os.utime(path)
+        except OSError:
+            pass
+
+        return str(path)
+
+    stats['misses'] += 1
+
+    temp_path = cache_dir / f"{key}.{PID}{TEMP_SUFFIX}.{extension}"
+    try:
+        write_file(str(temp_path))
+        os.replace(temp_path, path)
+
+    finally:
+        if temp_path.is_file():
+            temp_path.unlink()
+
+    size = path.stat().st_size
+    stats['bytes_written'] += size
+    log("Cached", path)
+
+    evict(size)
+
+    return str(path)
+
+
+def evict(added_size=0):
+    """
+    Removes least recently used files until cache size fits config.image_cache_size_limit.
+    added_size is size of just written file, cache dir is scanned only if estimated size exceeds the limit
+    """
+    size_limit = config.image_cache_size_limit
+    if size_limit is None:
+        return
+
+    cache_dir = get_cache_dir()
+    cache_size = _cache_sizes.get(cache_dir, None)
+    if cache_size is not None:
+        cache_size += added_size
+        _cache_sizes[cache_dir] = cache_size
+        if cache_size <= size_limit:
+            return
+
+    now = time.time()
+    entries = []
+    cache_size = 0
+    for entry in os.scandir(cache_dir):
+        if not entry.is_file():
+            continue
+
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+
+        if TEMP_SUFFIX in entry.name:
+            # temporary file left by crashed process
+            if now - stat.st_mtime > STALE_TEMP_FILE_AGE:
+                _remove_file(entry.path)
+            continue
+
+        cache_size += stat.st_size
+        if entry.path not in _used_paths:
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    if cache_size > size_limit:
+        entries.sort()
+        for _, size, path in entries:
+            if not _remove_file(path):
+                continue
+
+            stats['evictions'] += 1
+            cache_size -= size
+            if cache_size <= size_limit:
+                break
+
+    _cache_sizes[cache_dir] = cache_size
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+        return True
+
+    except OSError:
+        # file could be removed or opened by another process
+        return False
+
+
+def log_stats():
+    log.info("Image cache: {hits} hits, {misses} misses, {evictions} evictions, "
+             "{bytes_written} bytes written".format(**stats))
@@ -13,27 +13,84 @@
 # limitations under the License.
 #********************************************************************
 import sys
+import queue
 import logging
+import logging.handlers
 from logging import *
 
 from . import package_root_dir
 
 
+class QueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts log records to queue, they are written to handlers by background thread of listener.
+    Listener thread is started by the first record and stopped when handler is closed, that is
+    done by logging.shutdown() at exit and on addon reload. Messages are already formatted
+    by _log(), therefore record isn't formatted and copied here
+    """
+
+    def __init__(self, *handlers):
+        log_queue = queue.SimpleQueue()
+        super().__init__(log_queue)
+        self.listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.is_listening = False
+        self.is_closed = False
+
+    def prepare(self, record):
+        if record.exc_info or record.args:
+            return super().prepare(record)
+
+        return record
+
+    def emit(self, record):
+        # emit() is called under self.lock
+        if not self.is_listening and not self.is_closed:
+            self.listener.start()
+            self.is_listening = True
+
+        super().emit(record)
+
+    def close(self):
+        with self.lock:
+            self.is_closed = True
+            if self.is_listening:
+                # writes records which are left in queue
+                self.listener.stop()
+                self.is_listening = False
+
+        super().close()
+
+
 file = logging.FileHandler(filename=str(package_root_dir()/'rprblender.log'),  # TODO: Add creation time to this log name. Could be configurable.
                            mode='w',
-                           encoding='utf-8')
+                           encoding='utf-8',
+                           delay=True)
 file.setFormatter(logging.Formatter('%(asctime)s %(name)s [%(thread)d]: %(levelname)s %(message)s'))
 
 
 console = logging.StreamHandler(stream=sys.stdout)
-logger = logging.getLogger('rpr')  # root logger for the addon
-logger.addHandler(console)
 console.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s [%(thread)d]:  %(message)s'))
+# console shows records of the addon loggers only
+console.addFilter(logging.Filter('rpr'))
+
+logger = logging.getLogger('rpr')  # root logger for the addon
+
+# records are written to file and console by background thread
+queue_handler = QueueHandler(file, console)
+
+# on addon reload handler of previously loaded module is replaced, closing stops its listener
+for handler in logging.root.handlers[:]:
+    if isinstance(handler, logging.handlers.QueueHandler) and type(handler).__module__ == __name__:
+        logging.root.removeHandler(handler)
+        handler.close()
 
-logging.basicConfig(level=logging.DEBUG, handlers=[file])
+logging.basicConfig(level=logging.DEBUG, handlers=[queue_handler])
 
 console_filter = None
 
+# minimal level of records which could be written to any handler, see is_enabled()
+min_level = logging.DEBUG
+
 
 class Filter(logging.Filter):
 
@@ -51,13 +108,16 @@ class Filter(logging.Filter):
         return super().filter(record)
 
 
-def is_level_allowed(levelno):
-    if not console_filter:
-        return True
-    if console_filter.level_show_min is not None:
-        if levelno < console_filter.level_show_min:
-            return False
-    return True
+def _update_min_level():
+    global min_level
+    console_level = console_filter.level_show_min \
+        if console_filter and console_filter.level_show_min is not None else logging.DEBUG
+    min_level = min(console_level, file.level or logging.DEBUG)
+
+
+def is_enabled(levelno):
+    """ Cheap check if records of levelno are written, callers could use it to skip preparing log data """
+    return levelno >= min_level
 
 
 def limit_log(name, level_show_always=logging.INFO, level_show_min=logging.DEBUG):
@@ -69,6 +129,15 @@ def limit_log(name, level_show_always=logging.INFO, level_show_min=logging.DEBUG
         console_filter = Filter('rpr.'+name, level_show_always, level_show_min)
         console.addFilter(console_filter)
 
+    console.setLevel(console_filter.level_show_min or logging.NOTSET if console_filter else logging.NOTSET)
+    _update_min_level()
+
+
+def set_file_level(levelno):
+    """ Sets minimal level of records written to rprblender.log """
+    file.setLevel(levelno)
+    _update_min_level()
+
 
 def get_logger(tag):
     return logger.getChild(tag) if tag else logger
@@ -80,27 +149,27 @@ def _log(log_fun, args):
 
 
 def debug(*args, tag='default'):
-    if is_level_allowed(logging.DEBUG):
+    if is_enabled(logging.DEBUG):
         _log(get_logger(tag).debug, args)
 
 
 def info(*args, tag='default'):
-    if is_level_allowed(logging.INFO):
+    if is_enabled(logging.INFO):
         _log(get_logger(tag).info, args)
 
 
 def warn(*args, tag='default'):
-    if is_level_allowed(logging.WARN):
+    if is_enabled(logging.WARN):
         _log(get_logger(tag).warning, args)
 
 
 def error(*args, tag='default'):
-    if is_level_allowed(logging.ERROR):
+    if is_enabled(logging.ERROR):
         _log(get_logger(tag).error, args)
 
 
 def critical(*args, tag='default'):
-    if is_level_allowed(logging.CRITICAL):
+    if is_enabled(logging.CRITICAL):
         _log(get_logger(tag).critical, args)
 
 
@@ -125,24 +194,35 @@ class Log:
             self.__default_level = level
             self.__default_method_name = method
 
+        self.__logger = get_logger(self.__tag)
+
+    def is_enabled(self, levelno=None):
+        """ Returns True if records of levelno (default level of this Log if None) are written """
+        return is_enabled(self.__default_level if levelno is None else levelno)
+
     def __call__(self, *args):
-        if is_level_allowed(self.__default_level):
-            _log(getattr(get_logger(self.__tag), self.__default_method_name), args)
+        if is_enabled(self.__default_level):
+            _log(getattr(self.__logger, self.__default_method_name), args)
 
     def info(self, *args):
-        info(*args, tag=self.__tag)
+        if is_enabled(logging.INFO):
+            _log(self.__logger.info, args)
 
     def debug(self, *args):
-        debug(*args, tag=self.__tag)
+        if is_enabled(logging.DEBUG):
+            _log(self.__logger.debug, args)
 
     def warn(self, *args):
-        warn(*args, tag=self.__tag)
+        if is_enabled(logging.WARN):
+            _log(self.__logger.warning, args)
 
     def error(self, *args):
-        error(*args, tag=self.__tag)
+        if is_enabled(logging.ERROR):
+            _log(self.__logger.error, args)
 
     def critical(self, *args):
-        critical(*args, tag=self.__tag)
+        if is_enabled(logging.CRITICAL):
+            _log(self.__logger.critical, args)
 
 
 def dump_args(func):
@@ -0,0 +1,101 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from rprblender import config
+
+from . import profiler
+from . import logging
+log = logging.Log(tag='utils.pipeline')
+
+
+class SyncPipeline:
+    """
+    Two-stage sync pipeline.
+    Caller reads bpy data in main thread and submits process() function, which does NumPy work
+    in worker thread (NumPy releases GIL for heavy operations). Then finish() function is called
+    in main thread with process() result. finish() functions are called in submission order,
+    so core objects are created in the same order as without pipeline.
+    """
+
+    def __init__(self, num_threads=None):
+        if not num_threads:
+            num_threads = config.sync_threads or os.cpu_count() or 1
+
+        self.executor = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix='RPRSync')
+        self.max_pending = num_threads * 4
+
+        # deque of (key, future, finish)
+        self.pending = deque()
+        self.pending_keys = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def is_pending(self, key):
+        return key in self.pending_keys
+
+    def submit(self, process, finish, key=None):
+        """
+        Submits process() to worker thread, finish(result) is called later in main thread.
+        If process is None then finish(None) is called after all previously submitted tasks
+        """
+        future = self.executor.submit(process) if process else None
+        self.pending.append((key, future, finish))
+        if key is not None:
+            self.pending_keys[key] = self.pending_keys.get(key, 0) + 1
+
+        # finishing ready tasks and limiting memory used by processed data
+        self.flush(wait=len(self.pending) > self.max_pending)
+
+    def flush(self, wait=False):
+        """ Calls finish() of processed tasks in submission order """
+        while self.pending:
+            key, future, finish = self.pending[0]
+            if future and not future.done() and not wait:
+                break
+
+            self.pending.popleft()
+            if key is not None:
+                self.pending_keys[key] -= 1
+                if not self.pending_keys[key]:
+                    del self.pending_keys[key]
+
+            # finish() of deferred object isn't counted in profiled sync of currently synced object
+            with profiler.frame('pipeline.finish', detached=True):
+                finish(future.result() if future else None)
+
+            # only one task is waited for, others are finished if they are already done
+            wait = False
+
+    def finish(self):
+        """ Finishes all submitted tasks """
+        while self.pending:
+            self.flush(wait=True)
+
+    def close(self):
+        """ Cancels not finished tasks and stops worker threads """
+        for _, future, _ in self.pending:
+            if future:
+                future.cancel()
+
+        self.pending.clear()
+        self.pending_keys.clear()
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,254 @@
+#**********************************************************************
+# Copyright 2020 Advanced Micro Devices, Inc
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#********************************************************************
+"""
+Sync profiler.
+
+Export sync entry points and RPRContext.create_* methods are decorated by @profile(category).
+When profiling is enabled by config.sync_profiler, every call of them records wall time,
+number of bytes passed to core in numpy arrays and call count per category and per object.
+After sync the report is written as JSON and Chrome trace (chrome://tracing, Perfetto) files.
+When profiling is disabled decorated function costs one global variable check.
+"""
+import functools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+
+from rprblender import config
+
+from . import logging
+log = logging.Log(tag='utils.profiler')
+
+
+# current profiling session
+_session = None
+
+
+class Frame:
+    __slots__ = ('category', 'name', 'detached', 'start', 'child_time', 'detached_time', 'bytes')
+
+    def __init__(self, category, name, detached, nbytes):
+        self.category = category
+        self.name = name
+        self.detached = detached
+        self.start = time.perf_counter()
+        self.child_time = 0.0
+        self.detached_time = 0.0
+        self.bytes = nbytes
+
+
+class Session:
+    """ Profiling data of one sync """
+
+    def __init__(self, name):
+        self.name = name
+        self.thread_id = threading.get_ident()
+        self.start_time = time.perf_counter()
+        self.stop_time = None
+
+        self.stack = []
+
+        # category -> [calls, time, self_time, bytes]
+        self.categories = {}
+        # (category, name) -> [calls, time, self_time, bytes]
+        self.objects = {}
+
+        self.trace_events = []
+        self.dropped_trace_events = 0
+
+    def push(self, category, name, detached=False, nbytes=0):
+        frame = Frame(category, name, detached, nbytes)
+        self.stack.append(frame)
+        return frame
+
+    def pop(self):
+        frame = self.stack.pop()
+        duration = time.perf_counter() - frame.start
+        total_time = duration - frame.detached_time
+
+        if self.stack:
+            parent = self.stack[-1]
+            parent.child_time += duration
+            if frame.detached:
+                # detached frame, like deferred finishing of another object, isn't counted in parent
+                parent.detached_time += duration
+            else:
+                parent.bytes += frame.bytes
+
+        self_time = duration - frame.child_time
+        for stats, key in ((self.categories, frame.category), (self.objects, (frame.category, frame.name))):
+            data = stats.get(key, None)
+            if data is None:
+                stats[key] = [1, total_time, self_time, frame.bytes]
+            else:
+                data[0] += 1
+                data[1] += total_time
+                data[2] += self_time
+                data[3] += frame.bytes
+
+        if len(self.trace_events) < config.sync_profiler_max_trace_events:
+            event = {
+                'name': frame.category if frame.name is None else f"{frame.category}: {frame.name}",
+                'cat': frame.category,
+                'ph': 'X',
+                'ts': (frame.start - self.start_time) * 1e6,
+                'dur': duration * 1e6,
+                'pid': os.getpid(),
+                'tid': self.thread_id,
+            }
+            if frame.bytes:
+                event['args'] = {'bytes': frame.bytes}
+
+            self.trace_events.append(event)
+
+        else:
+            self.dropped_trace_events += 1
+
+    def call(self, category, detached, count_bytes, func, args, kwargs):
+        if threading.get_ident() != self.thread_id:
+            return func(*args, **kwargs)
+
+        self.push(category, get_name(args[1] if len(args) > 1 else None), detached,
+                  get_nbytes(args, kwargs) if count_bytes else 0)
+        try:
+            return func(*args, **kwargs)
+
+        finally:
+            self.pop()
+
+    def get_report(self):
+        def stats_dict(data):
+            calls, total_time, self_time, nbytes = data
+            return {'calls': calls, 'time': total_time, 'self_time': self_time, 'bytes': nbytes}
+
+        objects = sorted(self.objects.items(), key=lambda item: item[1][1], reverse=True)
+
+        return {
+            'name': self.name,
+            'sync_time': (self.stop_time or time.perf_counter()) - self.start_time,
+            'categories': {category: stats_dict(data) for category, data in
+                           sorted(self.categories.items(), key=lambda item: item[1][1], reverse=True)},
+            'objects': [{'category': category, 'name': name, **stats_dict(data)}
+                        for (category, name), data in objects],
+            'dropped_trace_events': self.dropped_trace_events,
+        }
+
+    def write_report(self):
+        """ Writes JSON report and Chrome trace files, returns path of JSON report """
+        report_dir = Path(config.sync_profiler_dir) if config.sync_profiler_dir else \
+            Path(tempfile.gettempdir()) / "rprblender_profiler"
+        report_dir.mkdir(parents=True, exist_ok=True)
+
+        file_name = f"{re.sub(r'[^-.0-9A-Za-z_]', '_', self.name)}_{time.strftime('%Y%m%d_%H%M%S')}"
+        report_path = report_dir / f"{file_name}.json"
+        trace_path = report_dir / f"{file_name}.trace.json"
+
+        report = self.get_report()
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+
+        with open(trace_path, 'w') as f:
+            json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': 'ms'}, f)
+
+        log.info(f"Sync profile '{self.name}': {report['sync_time']:.3f} sec, "
+                 f"report {report_path}, trace {trace_path}")
+        for category, data in tuple(report['categories'].items())[:10]:
+            log.info(f"  {category}: {data['calls']} calls, {data['time']:.3f} sec, "
+                     f"self {data['self_time']:.3f} sec, {data['bytes'] / 1024 ** 2:.1f} MB")
+
+        return report_path
+
+
+def get_name(obj):
+    if obj is None:
+        return None
+
+    name = getattr(obj, 'name_full', None)
+    if name is not None:
+        return name
+
+    return obj if isinstance(obj, str) else str(obj)
+
+
+def get_nbytes(args, kwargs):
+    """ Returns size of numpy arrays in args, including lists of arrays """
+    nbytes = 0
+    for arg in (*args, *kwargs.values()):
+        if isinstance(arg, np.ndarray):
+            nbytes += arg.nbytes
+        elif isinstance(arg, (list, tuple)):
+            nbytes += sum(a.nbytes for a in arg if isinstance(a, np.ndarray))
+
+    return nbytes
+
+
+def profile(category, detached=False, count_bytes=False):
+    """
+    Decorator of profiled function. Second positional argument of function is used as profiled
+    object: its name_full or str(). count_bytes=True counts size of numpy array arguments
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            session = _session
+            if session is None:
+                return func(*args, **kwargs)
+
+            return session.call(category, detached, count_bytes, func, args, kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def frame(category, name=None, detached=False):
+    """ Profiles code block """
+    session = _session
+    if session is None or threading.get_ident() != session.thread_id:
+        yield
+        return
+
+    session.push(category, name, detached)
+    try:
+        yield
+
+    finally:
+        session.pop()
+
+
+def start(name):
+    """ Starts profiling session if profiling is enabled """
+    global _session
+    _session = Session(name) if config.sync_profiler else None
+
+
+def stop():
+    """ Stops profiling and returns profiled session or None """
+    global _session
+    session = _session
+    _session = None
+
+    if session:
+        session.stop_time = time.perf_counter()
+
+    return session